@@ -0,0 +1,164 @@
+import os, sys
+import subprocess
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+try:
+    import numpy as np
+except ImportError:
+    subprocess.check_call([sys.executable, "-m", "pip", "install", "numpy"])
+    import numpy as np
+
+
+CHUNK_BITS = 16
+CHUNK = 1 << CHUNK_BITS # positions per container
+WORDS = CHUNK // 64
+ARRAY_MAX = 4096        # above this many positions a bitmap container is smaller than an array one
+
+def _is_array(container: np.ndarray) -> bool:
+    return container.dtype == np.uint16
+
+def _to_words(container: np.ndarray) -> np.ndarray:
+    if not _is_array(container):
+        return container
+    bits = np.zeros(CHUNK, dtype=bool)
+    bits[container] = True
+    return np.packbits(bits, bitorder="little").view(np.uint64)
+
+def _to_array(container: np.ndarray) -> np.ndarray:
+    if _is_array(container):
+        return container
+    return np.flatnonzero(np.unpackbits(container.view(np.uint8), bitorder="little")).astype(np.uint16)
+
+def _cardinality(container: np.ndarray) -> int:
+    if _is_array(container):
+        return len(container)
+    if hasattr(np, "bitwise_count"):
+        return int(np.bitwise_count(container).sum())
+    return int(np.unpackbits(container.view(np.uint8)).sum())
+
+def _contains(words: np.ndarray, lows: np.ndarray) -> np.ndarray:
+    """Mask of the lows set in a bitmap container"""
+    return ((words[lows >> 6] >> (lows & 63).astype(np.uint64)) & np.uint64(1)).astype(bool)
+
+def _normalize(container: np.ndarray):
+    """Smallest representation of a container, None when it is empty"""
+    if _is_array(container):
+        if len(container) > ARRAY_MAX:
+            return _to_words(container)
+        return container if len(container) else None
+    cardinality = _cardinality(container)
+    if cardinality > ARRAY_MAX:
+        return container
+    return _to_array(container) if cardinality else None
+
+def _and(a: np.ndarray, b: np.ndarray):
+    if _is_array(a) and _is_array(b):
+        return _normalize(np.intersect1d(a, b, assume_unique=True))
+    if _is_array(a):
+        return _normalize(a[_contains(b, a)])
+    if _is_array(b):
+        return _normalize(b[_contains(a, b)])
+    return _normalize(a & b)
+
+def _or(a: np.ndarray, b: np.ndarray):
+    if _is_array(a) and _is_array(b):
+        return _normalize(np.union1d(a, b).astype(np.uint16))
+    return _normalize(_to_words(a) | _to_words(b))
+
+def _andnot(a: np.ndarray, b: np.ndarray):
+    if _is_array(a) and _is_array(b):
+        return _normalize(np.setdiff1d(a, b, assume_unique=True))
+    if _is_array(a):
+        return _normalize(a[~_contains(b, a)])
+    return _normalize(a & ~_to_words(b))
+
+
+class RoaringBitmap:
+    """Compressed set of record positions of a table, roaring style: positions are split by their high 16 bits
+    into containers, a sorted uint16 array while it holds at most ARRAY_MAX positions and a 65536-bit bitmap
+    otherwise. The universe is the number of slots of the heap file (RecordFile.max_id); NOT complements
+    within it. Immutable, every operation returns a new bitmap."""
+
+    def __init__(self, universe: int, containers: dict = None):
+        self.universe = universe
+        self.containers = containers if containers != None else {} # high bits -> container
+
+    @classmethod
+    def from_positions(cls, positions, universe: int) -> "RoaringBitmap":
+        positions = np.unique(np.asarray(positions, dtype=np.int64))
+        containers = {}
+        if len(positions):
+            highs = positions >> CHUNK_BITS
+            keys, starts = np.unique(highs, return_index=True)
+            ends = list(starts[1:]) + [len(positions)]
+            for key, start, end in zip(keys.tolist(), starts.tolist(), ends):
+                containers[key] = _normalize((positions[start:end] & (CHUNK - 1)).astype(np.uint16))
+        return cls(max(universe, int(positions[-1]) + 1 if len(positions) else 0), containers)
+
+    @classmethod
+    def full(cls, universe: int) -> "RoaringBitmap":
+        containers = {}
+        for key in range((universe + CHUNK - 1) // CHUNK):
+            count = min(CHUNK, universe - key * CHUNK)
+            if count == CHUNK:
+                containers[key] = np.full(WORDS, np.iinfo(np.uint64).max, dtype=np.uint64)
+            else:
+                containers[key] = _normalize(np.arange(count, dtype=np.uint16))
+        return cls(universe, containers)
+
+    def __and__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        containers = {}
+        for key in self.containers.keys() & other.containers.keys():
+            container = _and(self.containers[key], other.containers[key])
+            if container is not None:
+                containers[key] = container
+        return RoaringBitmap(max(self.universe, other.universe), containers)
+
+    def __or__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        containers = dict(self.containers)
+        for key, container in other.containers.items():
+            containers[key] = _or(containers[key], container) if key in containers else container
+        return RoaringBitmap(max(self.universe, other.universe), containers)
+
+    def __sub__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        """AND NOT"""
+        containers = {}
+        for key, container in self.containers.items():
+            if key in other.containers:
+                container = _andnot(container, other.containers[key])
+            if container is not None:
+                containers[key] = container
+        return RoaringBitmap(max(self.universe, other.universe), containers)
+
+    def __invert__(self) -> "RoaringBitmap":
+        return RoaringBitmap.full(self.universe) - self
+
+    def __len__(self) -> int:
+        return sum(_cardinality(container) for container in self.containers.values())
+
+    def __contains__(self, position: int) -> bool:
+        container = self.containers.get(position >> CHUNK_BITS)
+        if container is None:
+            return False
+        low = position & (CHUNK - 1)
+        if _is_array(container):
+            i = np.searchsorted(container, low)
+            return i < len(container) and container[i] == low
+        return bool(_contains(container, np.array([low], dtype=np.uint16))[0])
+
+    def to_array(self) -> np.ndarray:
+        """Sorted positions as an int64 array"""
+        parts = [_to_array(self.containers[key]).astype(np.int64) + (key << CHUNK_BITS) for key in sorted(self.containers)]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+    def tolist(self) -> list[int]:
+        return self.to_array().tolist()
+
+    def __iter__(self):
+        for key in sorted(self.containers):
+            yield from (_to_array(self.containers[key]).astype(np.int64) + (key << CHUNK_BITS)).tolist()
+
+    def __repr__(self):
+        return f"RoaringBitmap({len(self)} of {self.universe})"
@@ -0,0 +1,264 @@
+import os, sys
+import mmap
+import threading
+from collections import OrderedDict
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+from core import stats
+import logger
+
+
+class BufferPool:
+    """LRU pool of fixed-size file pages shared by every heap file.
+
+    Each file is opened once and its handle is kept for the life of the pool.
+    Writes only touch the cached pages (marked dirty); they reach the disk on
+    eviction, flush() or close().
+
+    A file opened with use_mmap is served from a memory map instead: view()
+    returns zero-copy memoryviews over the mapping, which is re-created larger
+    when the file grows."""
+    PAGE_SIZE = 4096
+    DEFAULT_MEMORY_BUDGET = 32 * 1024 * 1024  # bytes
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(BufferPool, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, memory_budget: int = None):
+        if self._initialized:
+            if memory_budget is not None:
+                self.resize(memory_budget)
+            return
+        self.logger = logger.CustomLogger("BUFFERPOOL")
+        self.lock = threading.RLock()
+        self.pages = OrderedDict()  # (filename, page_no) -> bytearray, LRU first
+        self.dirty = set()          # keys of pages modified since last write-back
+        self.files = {}             # filename -> open handle
+        self.sizes = {}             # filename -> logical size in bytes
+        self.maps = {}              # filename -> mmap (None until first access) for mapped files
+        self.capacity = 0
+        self.resize(memory_budget if memory_budget is not None else self.DEFAULT_MEMORY_BUDGET)
+        self._initialized = True
+
+    def resize(self, memory_budget: int) -> None:
+        """Set the memory budget (bytes) of the pool, evicting pages if needed"""
+        with self.lock:
+            self.memory_budget = memory_budget
+            self.capacity = max(1, memory_budget // self.PAGE_SIZE)
+            self._evict()
+
+    # ----- Private methods -----
+
+    @staticmethod
+    def _key(filename: str) -> str:
+        return os.path.abspath(filename)
+
+    def _handle(self, filename: str):
+        file = self.files.get(filename)
+        if file is None:
+            file = open(filename, "r+b")
+            self.files[filename] = file
+            self.sizes[filename] = os.fstat(file.fileno()).st_size
+        return file
+
+    def _touch(self, key: tuple) -> bytearray:
+        page = self.pages[key]
+        self.pages.move_to_end(key)
+        return page
+
+    def _put(self, key: tuple, page: bytearray) -> None:
+        self.pages[key] = page
+        self.pages.move_to_end(key)
+
+    def _evict(self) -> None:
+        while len(self.pages) > self.capacity:
+            key, page = self.pages.popitem(last=False)
+            if key in self.dirty:
+                self._write_back(key, page)
+
+    def _write_back(self, key: tuple, page: bytearray) -> None:
+        filename, page_no = key
+        start = page_no * self.PAGE_SIZE
+        length = min(self.PAGE_SIZE, self.sizes[filename] - start)
+        if length > 0:
+            file = self._handle(filename)
+            file.seek(start)
+            file.write(page[:length])
+            stats.count_write()
+        self.dirty.discard(key)
+
+    def _load_pages(self, filename: str, first: int, last: int) -> None:
+        """Bring pages [first, last] of the file into the pool, one read per run of misses"""
+        file = self._handle(filename)
+        page_no = first
+        while page_no <= last:
+            if (filename, page_no) in self.pages:
+                page_no += 1
+                continue
+            run_end = page_no
+            while run_end + 1 <= last and (filename, run_end + 1) not in self.pages:
+                run_end += 1
+            file.seek(page_no * self.PAGE_SIZE)
+            data = file.read((run_end - page_no + 1) * self.PAGE_SIZE)
+            stats.count_read()
+            for i in range(run_end - page_no + 1):
+                chunk = data[i * self.PAGE_SIZE:(i + 1) * self.PAGE_SIZE]
+                page = bytearray(chunk)
+                if len(page) < self.PAGE_SIZE:
+                    page.extend(b"\x00" * (self.PAGE_SIZE - len(page)))
+                self._put((filename, page_no + i), page)
+            page_no = run_end + 1
+        self._evict()
+
+    def _mapping(self, filename: str, end: int):
+        """Memory map of a mapped file covering at least `end` bytes"""
+        current = self.maps[filename]
+        if current is None or len(current) < end:
+            self._release(current)
+            current = mmap.mmap(self.files[filename].fileno(), self.sizes[filename])
+            self.maps[filename] = current
+        return current
+
+    @staticmethod
+    def _release(mapping) -> None:
+        if mapping is None:
+            return
+        try:
+            mapping.close()
+        except BufferError:
+            pass # memoryviews over it are still alive, it is closed when they are collected
+
+    def _reload(self, key: tuple) -> bytearray:
+        # a read larger than the pool evicts its own first pages, load them again
+        self._load_pages(key[0], key[1], key[1])
+        return self.pages[key]
+
+    # ----- Public methods -----
+
+    def open(self, filename: str, use_mmap: bool = False) -> None:
+        """Register a file; with use_mmap it is served from a memory map from now on"""
+        with self.lock:
+            filename = self._key(filename)
+            self._handle(filename)
+            if use_mmap and filename not in self.maps:
+                # pages of a mapped file are not cached, write them back and drop them
+                self.flush(filename)
+                for key in [key for key in self.pages if key[0] == filename]:
+                    del self.pages[key]
+                self.maps[filename] = None
+
+    def size(self, filename: str) -> int:
+        with self.lock:
+            filename = self._key(filename)
+            self._handle(filename)
+            return self.sizes[filename]
+
+    def read(self, filename: str, offset: int, size: int) -> bytes:
+        """Read up to `size` bytes at `offset`; returns fewer bytes past the end of file"""
+        with self.lock:
+            filename = self._key(filename)
+            self._handle(filename)
+            size = min(size, self.sizes[filename] - offset)
+            if size <= 0:
+                return b""
+            if filename in self.maps:
+                return self._mapping(filename, offset + size)[offset:offset + size]
+            first = offset // self.PAGE_SIZE
+            last = (offset + size - 1) // self.PAGE_SIZE
+            if first == last and (filename, first) in self.pages:
+                start = offset - first * self.PAGE_SIZE
+                return bytes(self._touch((filename, first))[start:start + size])
+            self._load_pages(filename, first, last)
+            out = bytearray()
+            for page_no in range(first, last + 1):
+                key = (filename, page_no)
+                page = self._touch(key) if key in self.pages else self._reload(key)
+                start = max(offset, page_no * self.PAGE_SIZE) - page_no * self.PAGE_SIZE
+                end = min(offset + size, (page_no + 1) * self.PAGE_SIZE) - page_no * self.PAGE_SIZE
+                out += page[start:end]
+            return bytes(out)
+
+    def view(self, filename: str, offset: int, size: int) -> memoryview:
+        """Like read(), but zero-copy over the mapping when the file is mapped"""
+        with self.lock:
+            filename = self._key(filename)
+            self._handle(filename)
+            size = min(size, self.sizes[filename] - offset)
+            if size <= 0:
+                return memoryview(b"")
+            if filename in self.maps:
+                return memoryview(self._mapping(filename, offset + size))[offset:offset + size]
+            return memoryview(self.read(filename, offset, size))
+
+    def write(self, filename: str, offset: int, data: bytes) -> None:
+        with self.lock:
+            filename = self._key(filename)
+            file = self._handle(filename)
+            end = offset + len(data)
+            if filename in self.maps:
+                mapping = self.maps[filename]
+                if mapping is not None and end <= len(mapping):
+                    mapping[offset:end] = data
+                else: # growing the file, the mapping is extended on the next access past its end
+                    file.seek(offset)
+                    file.write(data)
+                    file.flush()
+                stats.count_write()
+                self.sizes[filename] = max(self.sizes[filename], end)
+                return
+            disk_pages = (self.sizes[filename] + self.PAGE_SIZE - 1) // self.PAGE_SIZE
+            page_no = offset // self.PAGE_SIZE
+            while page_no * self.PAGE_SIZE < end:
+                key = (filename, page_no)
+                if key not in self.pages:
+                    if page_no < disk_pages:
+                        self._load_pages(filename, page_no, page_no)
+                    else:
+                        self._put(key, bytearray(self.PAGE_SIZE))
+                page = self._touch(key)
+                page_start = page_no * self.PAGE_SIZE
+                start = max(offset, page_start)
+                stop = min(end, page_start + self.PAGE_SIZE)
+                page[start - page_start:stop - page_start] = data[start - offset:stop - offset]
+                self.dirty.add(key)
+                page_no += 1
+            self.sizes[filename] = max(self.sizes[filename], end)
+            self._evict()
+
+    def flush(self, filename: str = None) -> None:
+        """Write the dirty pages of a file (or of every file) back to disk"""
+        with self.lock:
+            target = self._key(filename) if filename else None
+            for key in sorted(self.dirty):
+                if target is None or key[0] == target:
+                    self._write_back(key, self.pages[key])
+            for name, file in self.files.items():
+                if target is None or name == target:
+                    file.flush()
+                    if self.maps.get(name) is not None:
+                        self.maps[name].flush()
+
+    def close(self, filename: str = None) -> None:
+        """Flush and release the pages and handle of a file (or of every file)"""
+        with self.lock:
+            self.flush(filename)
+            self.discard(filename)
+
+    def discard(self, filename: str = None) -> None:
+        """Drop the cached pages and handle of a file without writing them back"""
+        with self.lock:
+            target = self._key(filename) if filename else None
+            for key in [key for key in self.pages if target is None or key[0] == target]:
+                del self.pages[key]
+                self.dirty.discard(key)
+            for name in [name for name in self.files if target is None or name == target]:
+                self._release(self.maps.pop(name, None))
+                self.files.pop(name).close()
+                self.sizes.pop(name, None)
@@ -51,6 +51,29 @@ class ConditionValue(Condition):
         super().__init__()
         self.value = value
 
+class RangeCondition(Condition):
+    """left between lo and hi, a missing bound is unbounded (built by core.rewriter)"""
+    def __init__(self, left : Condition = None, lo : Condition = None, hi : Condition = None, lo_inclusive : bool = True, hi_inclusive : bool = True):
+        super().__init__()
+        self.left = left
+        self.lo = lo
+        self.hi = hi
+        self.lo_inclusive = lo_inclusive
+        self.hi_inclusive = hi_inclusive
+
+class InCondition(Condition):
+    """left equal to any of the values (built by core.rewriter)"""
+    def __init__(self, left : Condition = None, values : list[Condition] = None):
+        super().__init__()
+        self.left = left
+        self.values = values if values else []
+
+class ConstantCondition(Condition):
+    """Always true or always false (built by core.rewriter)"""
+    def __init__(self, value : bool = False):
+        super().__init__()
+        self.value = value
+
 class ConditionSchema:
     def __init__(self, condition : Condition = None):
         self.condition = condition
\ No newline at end of file
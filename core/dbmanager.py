@@ -1,13 +1,12 @@
 import os, sys, shutil, pickle
 from collections import Counter
-from bitarray import bitarray
-import heapq
+import itertools, functools
 root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if root_path not in sys.path:
     sys.path.append(root_path)
 
-from core.conditionschema import Condition, BinaryCondition, BetweenCondition, NotCondition, BooleanColumn, ConditionColumn, ConditionValue, ConditionSchema, BinaryOp
-from core.schema import DataType, TableSchema, IndexType, SelectSchema, DeleteSchema
+from core.conditionschema import Condition, BinaryCondition, BetweenCondition, NotCondition, BooleanColumn, ConditionColumn, ConditionValue, ConditionSchema, BinaryOp, RangeCondition, InCondition, ConstantCondition
+from core.schema import DataType, TableSchema, IndexType, SelectSchema, DeleteSchema, Aggregate, AggregateFunction, Column, IndexSchema
 from core import utils
 from indexes.bplustree import BPlusTree
 from indexes.avltree import AVLTree
@@ -15,14 +14,29 @@ from indexes.EHtree import ExtendibleHashTree
 from indexes.Rtree import RTreeIndex, MBR, Circle
 from indexes.ISAMtree import ISAMIndex, test_isam_integrity
 from indexes.noindex import NoIndex
+from indexes.composite import CompositeIndex
+from core.scan import VectorScan
+from core.bitmap import RoaringBitmap
+from core.external_sort import ExternalSort
+from core.hash_aggregate import HashAggregate
+from core.join import IndexNestedLoopJoin, GraceHashJoin, SortMergeJoin
+from core.planner import Planner, AccessPath, JoinPlanner, JoinMethod, CompositeProbe
+from core.rewriter import Rewriter
+from core import statistics
 
 import csv
 
 from core.record_file import Record, RecordFile
+from core.buffer_pool import BufferPool
+from core.index_cache import IndexCache
 import logger
 
 class DBManager:
     _instance = None  # Clase-level singleton reference
+    FETCH_BATCH = 4096  # record positions handed to RecordFile.read_many at once
+    SORT_MEMORY = ExternalSort.MEMORY_BUDGET # bytes an ORDER BY sort keeps in memory before spilling runs
+    GROUP_MEMORY = HashAggregate.MEMORY_BUDGET # bytes of groups a GROUP BY keeps in memory before spilling partitions
+    JOIN_MEMORY = GraceHashJoin.MEMORY_BUDGET # bytes of build rows a hash join keeps in memory before partitioning
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
@@ -81,80 +95,69 @@ class DBManager:
         self.indexes[index_name] = index
         return index
 
-    def list_to_bitmap(self, list : list[int]) -> bitarray:
-        if len(list) == 0:
-            bitmap = bitarray(1)
-        else:
-            max_id = max(list)
-            bitmap = bitarray(max_id + 1 + 1)
-        bitmap.setall(0)
+    def forget_indexes(self, table_name : str) -> None:
+        """Drop the index objects of a table from self.indexes, its files or schema changed"""
+        for index_name in [index_name for index_name in self.indexes if index_name.startswith(f"{table_name}.")]:
+            del self.indexes[index_name]
 
-        for id in list:
-            bitmap[id + 1] = 1
+    def get_composite_index(self, table_schema : TableSchema, index_schema : IndexSchema) -> CompositeIndex:
+        index_name = f"{table_schema.table_name}.{index_schema.key_name()}"
+        if index_name not in self.indexes:
+            self.indexes[index_name] = CompositeIndex(table_schema, index_schema)
+        return self.indexes[index_name]
 
-        return bitmap
-    
-    def bitmap_to_list(self, bitmap : bitarray) -> list[int]:
-        return [i for i, bit in enumerate(bitmap[1:]) if bit]
-    
-    def bitmap_or(self, a : bitarray, b : bitarray) -> bitarray:
-        len_diff = len(a) - len(b)
-        if len_diff > 0:
-            b.extend([b[0]] * len_diff)
-        else:
-            a.extend([a[0]] * (-len_diff))
+    def composite_scan(self, table_schema : TableSchema, probe : CompositeProbe):
+        """Lazy positions of the rows matching every conjunct of a composite probe"""
+        index = self.get_composite_index(table_schema, probe.index_schema)
+        lo, lo_inclusive, hi, hi_inclusive = probe.bounds if probe.bounds != None else (None, True, None, True)
+        return index.scan(probe.values, lo, hi, lo_inclusive, hi_inclusive)
 
-        return a | b
+    def scan_bitmap(self, table_schema : TableSchema, column_name : str, universe : int, lo = None, hi = None, lo_inclusive : bool = True, hi_inclusive : bool = True) -> RoaringBitmap:
+        """Bitmap of one bounded index scan, exclusive bounds are skipped by the index itself"""
+        index = self.get_index(table_schema, column_name)
+        return self.list_to_bitmap(list(index.scan(lo, hi, lo_inclusive, hi_inclusive)), universe)
 
-    def bitmap_and(self, a : bitarray, b : bitarray) -> bitarray:
-        len_diff = len(a) - len(b)
-        if len_diff > 0:
-            b.extend([b[0]] * len_diff)
-        else:
-            a.extend([a[0]] * (-len_diff))
+    def list_to_bitmap(self, positions : list[int], universe : int) -> RoaringBitmap:
+        return RoaringBitmap.from_positions(positions, universe)
 
-        return a & b
+    def retrieve_data(self, table_schema : TableSchema, bitmap : RoaringBitmap = None, limit = None) -> list[Record]:
+        return list(itertools.islice(self.stream_data(table_schema, bitmap), limit))
 
-    def bitmap_not(self, a : bitarray) -> bitarray:
-        return ~a
-    
-    def bitmap_difference(self, a : bitarray, b : bitarray) -> bitarray:
-        return self.bitmap_and(a, self.bitmap_not(b))
+    def stream_data(self, table_schema : TableSchema, bitmap : RoaringBitmap = None):
+        """Live records of the bitmap (every live record if None) in position order, read FETCH_BATCH positions at a time"""
+        record_file = RecordFile(table_schema, use_mmap=True)
+        if bitmap == None:
+            for _, record in record_file.scan():
+                yield record
+            return
+        ids = bitmap.tolist()
+        for start in range(0, len(ids), self.FETCH_BATCH):
+            yield from record_file.read_many(ids[start:start + self.FETCH_BATCH]).values()
     
-    def retrieve_data(self, table_schema : TableSchema, bitmap : bitarray, limit = None) -> list[Record]:
-        ids = self.bitmap_to_list(bitmap)
-        records = []
+    def live_records(self, table_schema : TableSchema):
+        """(position, record) of every live record, read FETCH_BATCH positions at a time"""
         record_file = RecordFile(table_schema)
-        count = 0
-        for id in ids:
-            if limit != None and count >= limit:
-                break
-            records.append(record_file.read(id))
-            count += 1
-        if bitmap[0]:
-            id = len(bitmap) -1
-            while id < record_file.max_id():
-                if limit != None and count >= limit:
-                    break
-                record = record_file.read(id)
-                records.append(record)
-                id += 1
-                count += 1
-        return records
-    
-    def retrieve_data_and_delete(self, table_schema : TableSchema, bitmap : bitarray) -> list[Record]:
-        ids = self.bitmap_to_list(bitmap)
-        records = []
+        max_pos = record_file.max_id()
+        for pos in range(0, max_pos, self.FETCH_BATCH):
+            yield from record_file.read_many(range(pos, min(pos + self.FETCH_BATCH, max_pos))).items()
+
+    def bulk_load(self, table_schema : TableSchema, tree : BPlusTree, entries) -> None:
+        """Builds an empty B+ tree from unsorted (key, position, payload) entries: one external sort
+        (within SORT_MEMORY, equal keys stay in position order) and one sequential write of the nodes"""
+        columns = [tree.column, Column("_pos", DataType.INT), Column("_payload", DataType.KEY, varchar_length=tree.payload_size)]
+        entry_schema = TableSchema(table_schema.table_name, columns)
+        records = (Record(entry_schema, list(entry)) for entry in entries)
+        external_sort = ExternalSort(entry_schema, tree.column.name, memory_budget=self.SORT_MEMORY)
+        tree.bulk_load(record.values for record in external_sort.sort(records))
+
+    def retrieve_data_and_delete(self, table_schema : TableSchema, bitmap : RoaringBitmap) -> dict[int, Record]:
+        """Deletes the live records of the bitmap (every one if None), returns them by position"""
         record_file = RecordFile(table_schema)
-        for id in ids:
-            records.append(record_file.read(id))
-            record_file.delete(id)
-        if bitmap[0]:
-            id = ids[-1] + 1
-            while id < record_file.max_id():
-                records.append(record_file.read(id))
-                record_file.delete(id)
-                id += 1
+        ids = bitmap.tolist() if bitmap != None else range(record_file.max_id())
+        records = record_file.read_many(ids) # only live records, a slot can't be freed twice
+        for pos in records:
+            record_file.delete(pos)
+        record_file.flush()
         return records
 
     def create_table(self, table_schema : TableSchema, if_not_exists : bool = False) -> None:
@@ -211,6 +214,11 @@ class DBManager:
     def drop_table(self, table_name : str, if_exists : bool = False) -> None:
         path = f"{self.tables_path}/{table_name}"
         if os.path.exists(path):
+            pool = BufferPool()
+            for filename in os.listdir(path):
+                pool.discard(f"{path}/{filename}")
+            IndexCache().invalidate_dir(path)
+            self.forget_indexes(table_name)
             shutil.rmtree(path)
         else:
             if not if_exists:
@@ -223,6 +231,12 @@ class DBManager:
 
     def select(self, select_schema : SelectSchema) -> dict[str, list]:
         table = self.get_table_schema(select_schema.table_name)
+        if select_schema.join != None:
+            return self.select_join(table, select_schema)
+        if select_schema.group_by:
+            return self.select_grouped(table, select_schema)
+        if select_schema.aggregates():
+            return self.select_aggregates(table, select_schema)
         column_names = [column.name for column in table.columns]
         if not select_schema.all:
             if select_schema.order_by != None and select_schema.order_by not in column_names:
@@ -235,36 +249,23 @@ class DBManager:
             if select_schema.limit <= 0:
                 self.error("limit must be positive")
 
-        if select_schema.condition_schema.condition:
-            bitmap = self.select_condition(table, select_schema.condition_schema.condition)
-        else:
-            bitmap = bitarray(1)
-            bitmap.setall(1)
-        if select_schema.order_by == None:
-            result = self.retrieve_data(table, bitmap, select_schema.limit)
-        else:
-            result = self.retrieve_data(table, bitmap)
-            for i, column in enumerate(column_names):
-                if select_schema.order_by == column:
-                    ordered_column_num = i
-                    break
-            if select_schema.limit != None:
-                if select_schema.limit > len(result) / 2:
-                    if select_schema.asc:
-                        result = sorted(result, key=lambda x : x.values[ordered_column_num])[:select_schema.limit]
-                    else:
-                        result = sorted(result, reverse=True, key=lambda x : x.values[ordered_column_num])[:select_schema.limit]
-                else:
-                    if select_schema.asc:
-                        result = heapq.nsmallest(select_schema.limit, result, key=lambda x : x.values[ordered_column_num])
-                    else:
-                        result = heapq.nlargest(select_schema.limit, result, key=lambda x : x.values[ordered_column_num])
+        result = self.select_covering(table, select_schema) # already projected on the selected columns
+        covered = result != None
+        if not covered and select_schema.order_by != None:
+            order_column = self.get_condition_column(table, select_schema.order_by)
+            result = self.select_ordered(table, select_schema.condition_schema.condition, order_column, select_schema.asc, select_schema.limit)
+        elif not covered and select_schema.limit != None and select_schema.condition_schema.condition:
+            result = self.select_limit(table, select_schema.condition_schema.condition, select_schema.limit)
+        if result == None:
+            bitmap = None # every record
+            if select_schema.condition_schema.condition:
+                bitmap = self.select_condition(table, select_schema.condition_schema.condition)
+            if select_schema.order_by == None:
+                result = self.retrieve_data(table, bitmap, select_schema.limit)
             else:
-                if select_schema.asc:
-                    result = sorted(result, key=lambda x : x.values[ordered_column_num])
-                else:
-                    result = sorted(result, reverse=True, key=lambda x : x.values[ordered_column_num])
-        if not select_schema.all:
+                external_sort = ExternalSort(table, select_schema.order_by, reverse=not select_schema.asc, memory_budget=self.SORT_MEMORY)
+                result = list(external_sort.sort(self.stream_data(table, bitmap), select_schema.limit))
+        if not select_schema.all and not covered:
             for record in result:
                 value_map = {col.name: val for col, val in zip(table.columns, record.values)}
                 record.values = [value_map[name] for name in select_schema.column_list]
@@ -280,16 +281,439 @@ class DBManager:
             'records': final_result
         }
 
-    def select_condition(self, table_schema : TableSchema, condition : Condition) -> bitarray:
+    def select_covering(self, table_schema : TableSchema, select_schema : SelectSchema) -> list[Record] | None:
+        """Index-only scan: records of the selected columns read from the entries of a B+ tree index whose
+        columns and INCLUDE columns cover the selected, ORDER BY and WHERE columns, the table is never read.
+        None if no index covers the query, its conditions give it no probe or the planner prefers the records"""
+        condition = select_schema.condition_schema.condition
+        if select_schema.all or not condition:
+            return None
+        condition = Rewriter(table_schema).rewrite(condition)
+        planner = Planner(table_schema)
+        if not planner.vectorizable(condition):
+            return None
+        needed = set(select_schema.column_list) | {planner.column(leaf).name for leaf in planner.leaves(condition) if type(leaf) != ConstantCondition}
+        if select_schema.order_by != None:
+            needed.add(select_schema.order_by)
+        planner.plan(condition)
+        for index_schema in table_schema.get_composite_indexes():
+            if index_schema.index_type != IndexType.BTREE or not needed <= set(index_schema.covered_columns()):
+                continue
+            probe = planner.composite_probe(planner.conjuncts(condition), [index_schema])
+            if probe != None and planner.index_only(condition, probe):
+                break
+        else:
+            return None
+
+        index = self.get_composite_index(table_schema, index_schema)
+        names = index_schema.covered_columns()
+        lo, lo_inclusive, hi, hi_inclusive = probe.bounds if probe.bounds != None else (None, True, None, True)
+        # equal on the probe prefix, entries come in the order of the next key column
+        in_order = select_schema.order_by in index_schema.column_names[:len(probe.values) + 1]
+        entries = index.entries(probe.values, lo, hi, lo_inclusive, hi_inclusive, reverse=in_order and not select_schema.asc)
+        covered_schema = TableSchema(table_schema.table_name, [table_schema.get_column_by_name(name) for name in names])
+        vector_scan = VectorScan(table_schema)
+        def matches():
+            while True:
+                chunk = [values for _, values in itertools.islice(entries, self.FETCH_BATCH)]
+                if not chunk:
+                    return
+                mask = vector_scan.mask(vector_scan.rows_from(names, chunk), condition)
+                for values, match in zip(chunk, mask):
+                    if match:
+                        yield Record(covered_schema, list(values))
+        records = matches()
+        if select_schema.order_by != None and not in_order:
+            records = ExternalSort(covered_schema, select_schema.order_by, reverse=not select_schema.asc, memory_budget=self.SORT_MEMORY).sort(records, select_schema.limit)
+        projection = [names.index(name) for name in select_schema.column_list]
+        return [Record(table_schema, [record.values[i] for i in projection]) for record in itertools.islice(records, select_schema.limit)]
+
+    def select_join(self, table_schema : TableSchema, select_schema : SelectSchema) -> dict[str, list]:
+        """Equi-join of the FROM table with the joined one. The WHERE conjuncts are pushed down to the table
+        of their columns and the planner picks an index nested-loop, grace hash or sort-merge join"""
+        tables = [table_schema, self.get_table_schema(select_schema.join.table_name)]
+        if tables[0].table_name == tables[1].table_name:
+            self.error("joining a table with itself is not supported")
+        if select_schema.group_by or select_schema.aggregates():
+            self.error("aggregates over a join are not supported")
+        if select_schema.limit != None and select_schema.limit <= 0:
+            self.error("limit must be positive")
+        columns = [None, None]
+        left_side, left_column = self.join_column(tables, select_schema.join.left_column)
+        right_side, right_column = self.join_column(tables, select_schema.join.right_column)
+        if left_side == right_side:
+            self.error("the ON clause must compare a column of each table")
+        columns[left_side], columns[right_side] = left_column, right_column
+        if columns[0].data_type != columns[1].data_type:
+            self.error(f"cannot join {columns[0].data_type} column '{columns[0].name}' with {columns[1].data_type} column '{columns[1].name}'")
+        if DataType.POINT in [column.data_type for column in columns]:
+            self.error("POINT columns can't be joined")
+        conditions = self.split_join_condition(tables, select_schema.condition_schema.condition)
+
+        # a joined row is the values of the left record followed by those of the right one
+        offsets = [0, len(tables[0].columns)]
+        def position(name):
+            side, column = self.join_column(tables, name)
+            return offsets[side] + tables[side].columns.index(column)
+        names = [f"{table.table_name}.{column.name}" for table in tables for column in table.columns]
+        items = names if select_schema.all else select_schema.column_list
+        projection = [position(item) for item in items]
+        rows = (left.values + right.values for left, right in self.join_pairs(tables, columns, conditions))
+        if select_schema.order_by != None:
+            order = position(select_schema.order_by)
+            joined = TableSchema(tables[0].table_name, [Column(name, column.data_type, varchar_length=column.varchar_length) for name, column in zip(names, tables[0].columns + tables[1].columns)])
+            external_sort = ExternalSort(joined, names[order], reverse=not select_schema.asc, memory_budget=self.SORT_MEMORY)
+            rows = (record.values for record in external_sort.sort((Record(joined, values) for values in rows), select_schema.limit))
+        records = []
+        for values in itertools.islice(rows, select_schema.limit):
+            row = [values[i] for i in projection]
+            records.append([str(value) if isinstance(value, tuple) else value for value in row])
+        return {
+            'columns': items,
+            'records': records
+        }
+
+    def join_column(self, tables : list[TableSchema], name : str):
+        """(side, Column) of a column of a join, qualified as table.column or unambiguous on its own"""
+        column_name = name
+        sides = [0, 1]
+        if "." in name:
+            table_name, column_name = name.split(".", 1)
+            sides = [side for side in sides if tables[side].table_name == table_name.lower()]
+            if not sides:
+                self.error(f"table '{table_name}' is not part of the query")
+        found = [(side, tables[side].get_column_by_name(column_name)) for side in sides if tables[side].get_column_by_name(column_name)]
+        if not found:
+            self.error(f"column '{name}' doesn't exist")
+        if len(found) > 1:
+            self.error(f"column '{name}' is ambiguous, qualify it with its table")
+        return found[0]
+
+    def split_join_condition(self, tables : list[TableSchema], condition : Condition) -> list[Condition]:
+        """WHERE condition of a join split into the conjuncts on each table, with their columns unqualified"""
+        parts = [[], []]
+        if condition == None:
+            return [None, None]
+        planner = Planner(tables[0])
+        for conjunct in planner.conjuncts(condition):
+            sides = set()
+            for leaf in planner.leaves(conjunct):
+                column_ref = leaf if type(leaf) == BooleanColumn else leaf.left
+                side, column = self.join_column(tables, column_ref.column_name)
+                column_ref.column_name = column.name
+                sides.add(side)
+            if len(sides) > 1:
+                self.error("conditions over columns of both tables are not supported, tables are only joined by the ON clause")
+            parts[sides.pop()].append(conjunct)
+        return [None if not part else part[0] if len(part) == 1 else functools.reduce(lambda a, b: BinaryCondition(a, BinaryOp.AND, b), part) for part in parts]
+
+    def join_pairs(self, tables : list[TableSchema], columns : list, conditions : list[Condition]):
+        """(left record, right record) of every match of the join, through the operator chosen by the JoinPlanner"""
+        planners = [Planner(table) for table in tables]
+        for side in [0, 1]:
+            if conditions[side] != None:
+                conditions[side] = Rewriter(tables[side]).rewrite(conditions[side])
+                planners[side].plan(conditions[side])
+        method, inner = JoinPlanner(planners, columns, conditions, self.JOIN_MEMORY).choose()
+        outer = 1 - inner
+        keys = [table.columns.index(column) for table, column in zip(tables, columns)]
+        match method:
+            case JoinMethod.INDEX_NESTED_LOOP:
+                condition, bitmap = self.join_filter(tables[inner], conditions[inner], planners[inner])
+                index = self.get_index(tables[inner], columns[inner].name)
+                operator = IndexNestedLoopJoin(tables[inner], columns[inner].name, index, condition, bitmap)
+                pairs = operator.join(self.join_input(tables[outer], conditions[outer], planners[outer]), keys[outer])
+            case JoinMethod.HASH:
+                operator = GraceHashJoin(tables[inner], columns[inner].name, tables[outer], columns[outer].name, memory_budget=self.JOIN_MEMORY)
+                pairs = operator.join(self.join_input(tables[inner], conditions[inner], planners[inner]), self.join_input(tables[outer], conditions[outer], planners[outer]))
+            case JoinMethod.SORT_MERGE:
+                inputs = []
+                for side in [outer, inner]:
+                    condition, bitmap = self.join_filter(tables[side], conditions[side], planners[side])
+                    entries = self.get_index(tables[side], columns[side].name).scan_items()
+                    inputs.append(self.ordered_records(tables[side], columns[side], entries, condition, bitmap))
+                pairs = SortMergeJoin(keys[outer], keys[inner]).join(*inputs)
+        # operators pair (outer, inner)
+        return pairs if inner == 1 else ((left, right) for right, left in pairs)
+
+    def join_input(self, table_schema : TableSchema, condition : Condition, planner : Planner):
+        """Records of one side of a join matching its own condition"""
+        bitmap = None
+        if condition != None:
+            self.shared_scan(table_schema, condition, planner)
+            bitmap = self.select_condition(table_schema, condition, planner)
+        return self.stream_data(table_schema, bitmap)
+
+    def join_filter(self, table_schema : TableSchema, condition : Condition, planner : Planner):
+        """(condition, bitmap) checking the rows of one side read through its index: the condition itself
+        when VectorScan can evaluate it on the candidates, otherwise its bitmap"""
+        if condition == None:
+            return None, None
+        if planner.vectorizable(condition):
+            return condition, None
+        self.shared_scan(table_schema, condition, planner)
+        return None, self.select_condition(table_schema, condition, planner)
+
+    def check_aggregates(self, table_schema : TableSchema, select_schema : SelectSchema) -> None:
+        """Columns in the select list must be grouped, aggregated columns must exist and suit the function"""
+        plain = [item for item in select_schema.column_list if not isinstance(item, Aggregate) and item not in select_schema.group_by]
+        if plain:
+            self.error(f"columns must be aggregated or grouped (non-aggregated columns: {','.join(plain)})")
+        for column_name in select_schema.group_by:
+            self.get_condition_column(table_schema, column_name)
+        for item in select_schema.aggregates():
+            if item.column_name == None:
+                continue
+            column = self.get_condition_column(table_schema, item.column_name)
+            if item.function in [AggregateFunction.SUM, AggregateFunction.AVG] and column.data_type not in [DataType.INT, DataType.FLOAT]:
+                self.error(f"{item.function} not supported for {column.data_type} column '{column.name}'")
+            if item.function in [AggregateFunction.MIN, AggregateFunction.MAX] and column.data_type == DataType.POINT:
+                self.error(f"{item.function} not supported for POINT column '{column.name}'")
+        if select_schema.limit != None and select_schema.limit <= 0:
+            self.error("limit must be positive")
+
+    def select_grouped(self, table_schema : TableSchema, select_schema : SelectSchema) -> dict[str, list]:
+        """One row per group of the GROUP BY columns. The records matching the condition are streamed from the
+        scan or index path into a hash aggregation that spills partitions to disk past its memory budget"""
+        self.check_aggregates(table_schema, select_schema)
+        items = select_schema.column_list if not select_schema.all else list(select_schema.group_by)
+        if select_schema.order_by != None and select_schema.order_by not in select_schema.group_by:
+            self.error(f"ordered by column '{select_schema.order_by}' must be in GROUP BY")
+        bitmap = None # every record
+        if select_schema.condition_schema.condition:
+            bitmap = self.select_condition(table_schema, select_schema.condition_schema.condition)
+        aggregates = select_schema.aggregates()
+        hash_aggregate = HashAggregate(table_schema, select_schema.group_by, aggregates, memory_budget=self.GROUP_MEMORY)
+        groups = hash_aggregate.aggregate(self.stream_data(table_schema, bitmap))
+        if select_schema.order_by != None:
+            i = select_schema.group_by.index(select_schema.order_by)
+            groups = sorted(groups, key=lambda group: group[0][i], reverse=not select_schema.asc)
+        records = []
+        for key, values in itertools.islice(groups, select_schema.limit):
+            row = []
+            for item in items:
+                if isinstance(item, Aggregate):
+                    row.append(values[aggregates.index(item)])
+                else:
+                    value = key[select_schema.group_by.index(item)]
+                    row.append(str(value) if isinstance(value, tuple) else value)
+            records.append(row)
+        return {
+            'columns': [str(item) for item in items],
+            'records': records
+        }
+
+    def select_aggregates(self, table_schema : TableSchema, select_schema : SelectSchema) -> dict[str, list]:
+        """One row of aggregates over the records matching the condition, computed without building Records:
+        COUNT counts the live rows of the scan mask or bitmap, MIN/MAX on an ordered index read its first
+        or last matching entry, and the rest are accumulated in one vectorized pass over the table"""
+        items = select_schema.column_list
+        self.check_aggregates(table_schema, select_schema)
+
+        condition = select_schema.condition_schema.condition
+        vector_scan = VectorScan(table_schema)
+        positions = None # rows to aggregate when the condition can't be evaluated as a scan
+        if condition:
+            condition = Rewriter(table_schema).rewrite(condition)
+            planner = Planner(table_schema)
+            planner.plan(condition)
+            if not planner.vectorizable(condition) or planner.scan_subtrees(condition) != [condition]:
+                self.shared_scan(table_schema, condition, planner)
+                positions = self.select_condition(table_schema, condition, planner).to_array()
+                condition = None
+
+        values = {}
+        for item in items:
+            if item.function != AggregateFunction.COUNT:
+                continue
+            values[str(item)] = vector_scan.count(condition, positions)
+        for item in items:
+            if item.function not in [AggregateFunction.MIN, AggregateFunction.MAX] or str(item) in values:
+                continue
+            column = table_schema.get_column_by_name(item.column_name)
+            if column.index_type not in Planner.ORDERED_INDEXES:
+                continue
+            records = self.select_ordered(table_schema, select_schema.condition_schema.condition, column, item.function == AggregateFunction.MIN, 1)
+            if records != None:
+                i = table_schema.columns.index(column)
+                values[str(item)] = records[0].values[i] if records else None
+        pending = [item for item in items if str(item) not in values]
+        totals = vector_scan.aggregate(sorted({item.column_name for item in pending}), condition, positions) if pending else {}
+        for item in pending:
+            count, total, low, high = totals[item.column_name]
+            match item.function:
+                case AggregateFunction.SUM:
+                    values[str(item)] = total if count else None
+                case AggregateFunction.AVG:
+                    values[str(item)] = total / count if count else None
+                case AggregateFunction.MIN:
+                    values[str(item)] = low
+                case AggregateFunction.MAX:
+                    values[str(item)] = high
+        return {
+            'columns': [str(item) for item in items],
+            'records': [[values[str(item)] for item in items]]
+        }
+
+    def get_condition_column(self, table_schema : TableSchema, column_name : str):
+        column = table_schema.get_column_by_name(column_name)
+        if not column:
+            self.error(f"column '{column_name}' doesn't exist in table '{table_schema.table_name}'")
+        return column
+
+    def shared_scan(self, table_schema : TableSchema, condition : Condition, planner : Planner) -> None:
+        """Evaluates every maximal subtree planned as a scan in one sequential pass over the table"""
+        subtrees = planner.scan_subtrees(condition)
+        if not subtrees:
+            return
+        results = VectorScan(table_schema).filter_many(subtrees)
+        for subtree, positions in zip(subtrees, results):
+            planner.scanned[id(subtree)] = self.list_to_bitmap(positions, planner.universe)
+
+    def select_limit(self, table_schema : TableSchema, condition : Condition, limit : int) -> list[Record]:
+        """First `limit` records matching the condition, without evaluating it on the whole table:
+        a condition planned as a scan stops the heap scan once it has enough matches, otherwise its most
+        selective indexed conjunct drives a lazy index scan whose candidates are checked in batches"""
+        condition = Rewriter(table_schema).rewrite(condition)
+        planner = Planner(table_schema)
+        planner.plan(condition)
+        if planner.vectorizable(condition):
+            record_file = RecordFile(table_schema, use_mmap=True)
+            vector_scan = VectorScan(table_schema)
+            if planner.scan_subtrees(condition) == [condition]:
+                return list(record_file.read_many(vector_scan.filter(condition, limit)).values())
+            for conjunct in planner.order(planner.conjuncts(condition)):
+                positions = self.index_scan(table_schema, conjunct, planner)
+                if positions != None:
+                    return self.retrieve_candidates(record_file, vector_scan, condition, positions, limit)
+        self.shared_scan(table_schema, condition, planner)
+        return self.retrieve_data(table_schema, self.select_condition(table_schema, condition, planner), limit)
+
+    def select_ordered(self, table_schema : TableSchema, condition : Condition, column, asc : bool, limit : int = None) -> list[Record] | None:
+        """Records matching the condition read in the order of the index on the ORDER BY column,
+        None if the planner prefers to filter and sort them. A range on that column bounds the index scan."""
+        rewriter = Rewriter(table_schema)
+        planner = Planner(table_schema)
+        if condition:
+            condition = rewriter.rewrite(condition)
+            planner.plan(condition)
+        if not planner.index_order(condition, column, limit):
+            return None
+        lo, hi, lo_inclusive, hi_inclusive = None, None, True, True
+        bitmap = None
+        if condition:
+            for conjunct in planner.conjuncts(condition):
+                bounds = rewriter.bounds(conjunct)
+                if bounds and bounds[0] and bounds[0].name == column.name:
+                    _, lo, lo_inclusive, hi, hi_inclusive = bounds
+                    break
+            if not planner.vectorizable(condition):
+                self.shared_scan(table_schema, condition, planner)
+                bitmap = self.select_condition(table_schema, condition, planner)
+                condition = None
+        entries = self.get_index(table_schema, column.name).scan_items(lo, hi, lo_inclusive, hi_inclusive, reverse=not asc)
+        records = self.ordered_records(table_schema, column, entries, condition, bitmap, min(limit or self.FETCH_BATCH, self.FETCH_BATCH))
+        return list(itertools.islice(records, limit))
+
+    def ordered_records(self, table_schema : TableSchema, column, entries, condition : Condition = None, bitmap : RoaringBitmap = None, batch : int = FETCH_BATCH):
+        """Live records of (key, position) index entries in index order, read in growing batches.
+        Records are checked against the condition or bitmap; entries whose record no longer has their key
+        (left behind by a delete) are skipped"""
+        record_file = RecordFile(table_schema, use_mmap=True)
+        vector_scan = VectorScan(table_schema) if condition != None else None
+        i = [col.name for col in table_schema.columns].index(column.name)
+        seen = set()
+        while True:
+            chunk = list(itertools.islice(entries, batch))
+            if not chunk:
+                return
+            positions = sorted({pos for _, pos in chunk if pos not in seen})
+            if condition != None:
+                positions = vector_scan.filter_positions(condition, positions)
+            elif bitmap != None:
+                positions = [pos for pos in positions if pos in bitmap]
+            records = record_file.read_many(positions)
+            for key, pos in chunk:
+                record = records.get(pos)
+                if record != None and pos not in seen and record.values[i] == key:
+                    seen.add(pos)
+                    yield record
+            batch = min(batch * 2, self.FETCH_BATCH)
+
+    def index_scan(self, table_schema : TableSchema, leaf : Condition, planner : Planner):
+        """Lazy positions of a predicate planned through an ordered or hash index, None for other predicates.
+        A predicate answered by a composite probe yields the matches of the whole probe."""
+        if planner.paths.get(id(leaf)) == AccessPath.INDEX_COMPOSITE:
+            return self.composite_scan(table_schema, planner.probes[id(leaf)])
+        if planner.paths.get(id(leaf)) not in [AccessPath.INDEX_LOOKUP, AccessPath.INDEX_RANGE]:
+            return None
+        index = self.get_index(table_schema, planner.column(leaf).name)
+        if type(leaf) == InCondition:
+            return itertools.chain.from_iterable(index.scan(value.value, value.value) for value in leaf.values)
+        bounds = Rewriter(table_schema).bounds(leaf)
+        if not bounds or not bounds[0]:
+            return None
+        _, lo, lo_inclusive, hi, hi_inclusive = bounds
+        return index.scan(lo, hi, lo_inclusive, hi_inclusive)
+
+    def retrieve_candidates(self, record_file : RecordFile, vector_scan : VectorScan, condition : Condition, positions, limit : int) -> list[Record]:
+        """Reads candidate positions in growing batches, keeping the live records matching the whole condition,
+        until `limit` of them are found; the rest of the index scan is never run"""
+        records = []
+        seen = set()
+        batch = limit
+        while len(records) < limit:
+            chunk = list(itertools.islice(positions, batch))
+            if not chunk:
+                break
+            candidates = {pos for pos in chunk if pos not in seen} # stale index entries may repeat a slot
+            seen.update(candidates)
+            matches = vector_scan.filter_positions(condition, sorted(candidates))
+            records.extend(record_file.read_many(matches[:limit - len(records)]).values())
+            batch *= 2
+        return records
+
+    def select_conjunction(self, table_schema : TableSchema, conjuncts : list[Condition], planner : Planner) -> RoaringBitmap:
+        """ANDs the conjuncts from the most selective one, or from the composite index probe answering several
+        of them; once few candidates are left, the remaining predicates are checked on those rows instead
+        of being evaluated on the whole table"""
+        probe = next((planner.probes[id(conjunct)] for conjunct in conjuncts if id(conjunct) in planner.probes), None)
+        if probe != None:
+            bitmap = self.list_to_bitmap(list(self.composite_scan(table_schema, probe)), planner.universe)
+            conjuncts = planner.order([conjunct for conjunct in conjuncts if id(conjunct) not in planner.probes])
+        else:
+            conjuncts = planner.order(conjuncts)
+            bitmap = self.select_condition(table_schema, conjuncts[0], planner)
+            conjuncts = conjuncts[1:]
+        for conjunct in conjuncts:
+            candidates = len(bitmap)
+            if candidates == 0:
+                break
+            if planner.residual(conjunct, candidates):
+                bitmap = self.list_to_bitmap(VectorScan(table_schema).filter_positions(conjunct, bitmap.to_array()), planner.universe)
+                continue
+            bitmap = bitmap & self.select_condition(table_schema, conjunct, planner)
+        return bitmap
+
+    def select_condition(self, table_schema : TableSchema, condition : Condition, planner : Planner = None) -> RoaringBitmap:
+        if planner == None:
+            condition = Rewriter(table_schema).rewrite(condition)
+            planner = Planner(table_schema)
+            planner.plan(condition)
+            self.shared_scan(table_schema, condition, planner)
+        if id(condition) in planner.scanned:
+            return planner.scanned[id(condition)]
+        if planner.paths.get(id(condition)) == AccessPath.INDEX_COMPOSITE: # probe of a single predicate, the others are taken by select_conjunction
+            return self.list_to_bitmap(list(self.composite_scan(table_schema, planner.probes[id(condition)])), planner.universe)
         condition_type = type(condition)
         if condition_type == BinaryCondition:
             op = condition.op
             if op in [BinaryOp.AND, BinaryOp.OR]:
                 match op:
                     case BinaryOp.AND:
-                        return self.bitmap_and(self.select_condition(table_schema, condition.left), self.select_condition(table_schema, condition.right))
+                        return self.select_conjunction(table_schema, planner.conjuncts(condition), planner)
                     case BinaryOp.OR:
-                        return self.bitmap_or(self.select_condition(table_schema, condition.left), self.select_condition(table_schema, condition.right))
+                        return self.select_condition(table_schema, condition.left, planner) | self.select_condition(table_schema, condition.right, planner)
             else:
                 column = None
                 for i in table_schema.columns:
@@ -307,7 +731,7 @@ class DBManager:
                                 self.error("min coordinates on rectangle definition must not be larger than max coordinates")
                             index = self.get_index(table_schema, condition.left.column_name)
                             mbr = MBR(condition.right.value[0], condition.right.value[1], condition.right.value[2], condition.right.value[3])
-                            return self.list_to_bitmap(index.rangeSearch(mbr))
+                            return self.list_to_bitmap(index.rangeSearch(mbr), planner.universe)
                         case BinaryOp.WC:
                             if utils.get_data_type(condition.right.value) != "circle":
                                 self.error(f"value '{condition.right.value}' is not a valid circle definition")
@@ -315,24 +739,24 @@ class DBManager:
                                 self.error("radius on circle definition must be positive")
                             index = self.get_index(table_schema, condition.left.column_name)
                             circle = Circle(condition.right.value[0], condition.right.value[1], condition.right.value[2])
-                            return self.list_to_bitmap(index.rangeSearch(circle))
+                            return self.list_to_bitmap(index.rangeSearch(circle), planner.universe)
                         case BinaryOp.KNN:
                             if utils.get_data_type(condition.right.value) != "knn":
                                 self.error(f"value '{condition.right.value}' is not a valid knn definition")
                             if condition.right.value[2] <= 0:
                                 self.error("k value on knn must be positive")
                             index = self.get_index(table_schema, condition.left.column_name)
-                            return self.list_to_bitmap(index.knnSearch(condition.right.value[0], condition.right.value[1], condition.right.value[2]))
+                            return self.list_to_bitmap(index.knnSearch(condition.right.value[0], condition.right.value[1], condition.right.value[2]), planner.universe)
                         case BinaryOp.EQ:
                             if utils.get_data_type(condition.right.value) != DataType.POINT:
                                 self.error(f"value '{condition.right.value}' is not of data type {column.data_type}")
                             index = self.get_index(table_schema, condition.left.column_name)
-                            return self.list_to_bitmap(index.search(condition.right.value))
+                            return self.list_to_bitmap(index.search(condition.right.value), planner.universe)
                         case BinaryOp.NEQ:
                             if utils.get_data_type(condition.right.value) != DataType.POINT:
                                 self.error(f"value '{condition.right.value}' is not of data type {column.data_type}")
                             index = self.get_index(table_schema, condition.left.column_name)
-                            return self.bitmap_not(self.list_to_bitmap(index.search(condition.right.value)))
+                            return ~self.list_to_bitmap(index.search(condition.right.value), planner.universe)
                         case _:
                             self.error("operation not supported for POINT type")
                 if column.data_type != utils.get_data_type(condition.right.value):
@@ -340,22 +764,18 @@ class DBManager:
                 match op:
                     case BinaryOp.EQ: # Usa indexes
                         index = self.get_index(table_schema, condition.left.column_name)
-                        return self.list_to_bitmap(index.search(condition.right.value))
+                        return self.list_to_bitmap(index.search(condition.right.value), planner.universe)
                     case BinaryOp.NEQ: # Usa indexes
                         index = self.get_index(table_schema, condition.left.column_name)
-                        return self.bitmap_not(self.list_to_bitmap(index.search(condition.right.value)))
-                    case BinaryOp.LT: # Usa indexes (menos hash)
-                        index = self.get_index(table_schema, condition.left.column_name)
-                        return self.bitmap_difference(self.list_to_bitmap(index.rangeSearch(None, condition.right.value)), self.list_to_bitmap(index.search(condition.right.value)))
-                    case BinaryOp.GT: # Usa indexes (menos hash)
-                        index = self.get_index(table_schema, condition.left.column_name)
-                        return self.bitmap_difference(self.list_to_bitmap(index.rangeSearch(condition.right.value, None)), self.list_to_bitmap(index.search(condition.right.value)))
-                    case BinaryOp.LE: # Usa indexes (menos hash)
-                        index = self.get_index(table_schema, condition.left.column_name)
-                        return self.list_to_bitmap(index.rangeSearch(None, condition.right.value))
-                    case BinaryOp.GE: # Usa indexes (menos hash)
-                        index = self.get_index(table_schema, condition.left.column_name)
-                        return self.list_to_bitmap(index.rangeSearch(condition.right.value, None))
+                        return ~self.list_to_bitmap(index.search(condition.right.value), planner.universe)
+                    case BinaryOp.LT: # Usa indexes, exclusive bound
+                        return self.scan_bitmap(table_schema, column.name, planner.universe, hi=condition.right.value, hi_inclusive=False)
+                    case BinaryOp.GT: # Usa indexes, exclusive bound
+                        return self.scan_bitmap(table_schema, column.name, planner.universe, lo=condition.right.value, lo_inclusive=False)
+                    case BinaryOp.LE: # Usa indexes
+                        return self.scan_bitmap(table_schema, column.name, planner.universe, hi=condition.right.value)
+                    case BinaryOp.GE: # Usa indexes
+                        return self.scan_bitmap(table_schema, column.name, planner.universe, lo=condition.right.value)
         elif condition_type == BetweenCondition: # Usa indexes (menos hash)
             column = None
             for i in table_schema.columns:
@@ -368,10 +788,23 @@ class DBManager:
                 self.error("operation not supported for POINT type")
             if column.data_type != utils.get_data_type(condition.mid.value) or column.data_type != utils.get_data_type(condition.right.value):
                 self.error(f"value '{condition.right.value}' is not of data type {column.data_type}")
-            index = self.get_index(table_schema, condition.left.column_name)
-            return self.list_to_bitmap(index.rangeSearch(condition.mid.value, condition.right.value))
+            return self.scan_bitmap(table_schema, column.name, planner.universe, condition.mid.value, condition.right.value)
+        elif condition_type == RangeCondition: # Usa indexes, one bounded scan for the merged predicates
+            column = self.get_condition_column(table_schema, condition.left.column_name)
+            lo = condition.lo.value if condition.lo else None
+            hi = condition.hi.value if condition.hi else None
+            return self.scan_bitmap(table_schema, column.name, planner.universe, lo, hi, condition.lo_inclusive, condition.hi_inclusive)
+        elif condition_type == InCondition: # Usa indexes, one lookup per value
+            column = self.get_condition_column(table_schema, condition.left.column_name)
+            index = self.get_index(table_schema, column.name)
+            positions = []
+            for value in condition.values:
+                positions.extend(index.search(value.value))
+            return self.list_to_bitmap(positions, planner.universe)
+        elif condition_type == ConstantCondition:
+            return RoaringBitmap.full(planner.universe) if condition.value else RoaringBitmap(planner.universe)
         elif condition_type == NotCondition:
-            return self.bitmap_not(self.select_condition(table_schema, condition.condition))
+            return ~self.select_condition(table_schema, condition.condition, planner)
         elif condition_type == BooleanColumn: # Usa indexes
             column = None
             for i in table_schema.columns:
@@ -385,7 +818,7 @@ class DBManager:
             if DataType.BOOL != utils.get_data_type(condition.right.value):
                 self.error(f"value '{condition.right.value}' is not of data type {DataType.BOOL}")
             index = self.get_index(table_schema, condition.column_name)
-            return self.list_to_bitmap(index.search(True))
+            return self.list_to_bitmap(index.search(True), planner.universe)
         else:
             self.error("invalid condition")
         
@@ -393,6 +826,14 @@ class DBManager:
 
     def insert(self, table_name:str, values: list, columns: list):
         tableSchema: TableSchema = self.get_table_schema(table_name)
+        record = self.make_record(tableSchema, values, columns)
+        record_file = RecordFile(tableSchema)
+        pos = record_file.append(record)
+        record_file.flush()
+        self.index_record(tableSchema, pos, record)
+
+    def make_record(self, tableSchema : TableSchema, values: list, columns: list) -> Record:
+        """Record of the values checked against the table, columns give their order if not the table's"""
         table_columns = [column.name for column in tableSchema.columns]
 
         if columns and sorted(columns) != sorted(table_columns):
@@ -414,28 +855,51 @@ class DBManager:
                 if len(value) > tableSchema.columns[i].varchar_length:
                     self.error(f"varchar value '{value}' exceeds column's varchar length")
 
-        record = Record(tableSchema, reordered_values)
-        record_file = RecordFile(tableSchema)
-        pos = record_file.append(record)
+        return Record(tableSchema, reordered_values)
 
-        #insertar los indexes
+    def index_record(self, tableSchema : TableSchema, pos : int, record : Record, skip_btree : bool = False) -> None:
+        """Inserts the record at pos in every index of the table, but the B+ trees if they are bulk loaded later"""
         for i, column in enumerate(tableSchema.columns):
+            if skip_btree and column.index_type == IndexType.BTREE:
+                continue
             index = self.get_index(tableSchema, column.name)
             if index:
                 index.insert(pos, record.values[i])
+        for index_schema in tableSchema.get_composite_indexes():
+            if skip_btree and index_schema.index_type == IndexType.BTREE:
+                continue
+            index = self.get_composite_index(tableSchema, index_schema)
+            index.insert(pos, index.values(record.values))
+
+    def bulk_load_btrees(self, table_schema : TableSchema) -> None:
+        """Builds every B+ tree index of the table from its live records"""
+        for i, column in enumerate(table_schema.columns):
+            if column.index_type == IndexType.BTREE:
+                tree = self.get_index(table_schema, column.name)
+                self.bulk_load(table_schema, tree, ((record.values[i], pos, b"") for pos, record in self.live_records(table_schema)))
+        for index_schema in table_schema.get_composite_indexes():
+            if index_schema.index_type == IndexType.BTREE:
+                index = self.get_composite_index(table_schema, index_schema)
+                self.bulk_load(table_schema, index.index, (index.entry(pos, index.values(record.values)) for pos, record in self.live_records(table_schema)))
 
     def delete(self, delete_schema : DeleteSchema) -> None:
         table = self.get_table_schema(delete_schema.table_name)
         bitmap = self.select_condition(table, delete_schema.condition_schema.condition)
         result = self.retrieve_data_and_delete(table, bitmap)
-        for record in result:
-            for pos, value in enumerate(record.values):
-                index = self.get_index(table, table.columns[pos].name)
-                index.delete(value)
+        for record_pos, record in result.items():
+            for i, value in enumerate(record.values):
+                index = self.get_index(table, table.columns[i].name)
+                if isinstance(index, (BPlusTree, ExtendibleHashTree)): # the entry of this record, not one of an equal key
+                    index.delete(value, record_pos)
+                else:
+                    index.delete(value)
+            for index_schema in table.get_composite_indexes():
+                index = self.get_composite_index(table, index_schema)
+                index.delete(index.values(record.values), record_pos)
 
-    def create_index(self, table_name : str, index_name : str, columns : list[str], index_type : IndexType = None):
-        if len(columns) > 1:
-            self.error(f"Index on more than one column not supported")
+    def create_index(self, table_name : str, index_name : str, columns : list[str], index_type : IndexType = None, include : list[str] = None):
+        if len(columns) > 1 or include:
+            return self.create_composite_index(table_name, index_name, columns, index_type, include or [])
         column_name = columns[0]
         table_schema = self.get_table_schema(table_name)
         column = None
@@ -462,15 +926,12 @@ class DBManager:
         column.index_type = index_type
         column.index_name = index_name
 
+        self.indexes.pop(f"{table_schema.table_name}.{column_name}", None) # the NoIndex of the column
         self.get_index(table_schema, column_name)
 
         path = f"{self.tables_path}/{table_name}"
         self.save_table_schema(table_schema, path)
 
-        record_file = RecordFile(table_schema)
-        pos = 0
-        max_pos = record_file.max_id()
-
         indexes = table_schema.get_indexes()
         column_index = table_schema.columns.index(column)  # posición de la columna en el esquema
         index_structure = indexes[column.name]  # estructura del índice recién creado
@@ -478,16 +939,59 @@ class DBManager:
         if index_type == IndexType.ISAM:
             index_structure.build_index()
             test_isam_integrity(index_structure)
+        elif index_type == IndexType.BTREE:
+            self.bulk_load(table_schema, index_structure, ((record.values[column_index], pos, b"") for pos, record in self.live_records(table_schema)))
         else:
-            while pos < max_pos:
-                record = record_file.read(pos)
-                if record is not None:  # Evita registros borrados si usas lista libre
-                    value = record.values[column_index]
-                    index_structure.insert(pos, value)
-                pos += 1
+            for pos, record in self.live_records(table_schema):  # los registros borrados no vienen
+                index_structure.insert(pos, record.values[column_index])
             
+    def create_composite_index(self, table_name : str, index_name : str, columns : list[str], index_type : IndexType = None, include : list[str] = []):
+        """B+ tree or hash index on a tuple of columns, built from the live records.
+        A B+ tree can also store the values of INCLUDE columns to answer queries on them without the records."""
+        table_schema = self.get_table_schema(table_name)
+        repeats = [name for name, count in Counter(columns + include).items() if count > 1]
+        if repeats:
+            self.error(f"the index can't have the same column more than once (repeated columns: {','.join(repeats)})")
+        for column_name in columns + include:
+            column = table_schema.get_column_by_name(column_name)
+            if not column:
+                self.error(f"column with name '{column_name}' doesn't exist")
+            if column.data_type == DataType.POINT:
+                self.error(f"POINT column '{column_name}' can't be part of an index on more than one column")
+        if index_type == None:
+            index_type = IndexType.BTREE
+        if include and index_type != IndexType.BTREE:
+            self.error("INCLUDE columns are only supported by BTREE indexes")
+        if index_type not in [IndexType.BTREE, IndexType.HASH]:
+            self.error(f"{index_type} index not supported on more than one column")
+        composite_indexes = table_schema.get_composite_indexes()
+        if any(index.column_names == columns for index in composite_indexes):
+            self.error(f"columns already have an index")
+        if any(index.index_name == index_name for index in composite_indexes) or any(column.index_name == index_name for column in table_schema.columns):
+            self.error(f"Index with name '{index_name}' on table '{table_name}' already exists")
+
+        index_schema = IndexSchema(index_name, list(columns), index_type, list(include))
+        table_schema.composite_indexes = composite_indexes + [index_schema]
+        path = f"{self.tables_path}/{table_name}"
+        self.save_table_schema(table_schema, path)
+
+        index = self.get_composite_index(table_schema, index_schema)
+        if index.ORDERED:
+            self.bulk_load(table_schema, index.index, (index.entry(pos, index.values(record.values)) for pos, record in self.live_records(table_schema)))
+        else:
+            for pos, record in self.live_records(table_schema):
+                index.insert(pos, index.values(record.values))
+
     def drop_index(self, table_name : str, index_name : str) -> None:
         table_schema = self.get_table_schema(table_name)
+        for index_schema in table_schema.get_composite_indexes():
+            if index_schema.index_name == index_name:
+                self.get_composite_index(table_schema, index_schema).clear()
+                self.indexes.pop(f"{table_schema.table_name}.{index_schema.key_name()}", None)
+                table_schema.composite_indexes = [index for index in table_schema.composite_indexes if index is not index_schema]
+                path = f"{self.tables_path}/{table_schema.table_name}"
+                self.save_table_schema(table_schema, path)
+                return
         for column in table_schema.columns:
             if column.index_name == index_name:
                 index = self.get_index(table_schema, column.name)
@@ -496,6 +1000,7 @@ class DBManager:
                 if column.is_primary:
                     self.error("Cannot drop the primary key's index")
                 index.clear()
+                self.indexes.pop(f"{table_schema.table_name}.{column.name}", None)
                 column.index_type = IndexType.NONE
                 column.index_name = None
                 path = f"{self.tables_path}/{table_schema.table_name}"
@@ -503,6 +1008,13 @@ class DBManager:
                 return
         self.error(f"Index with name '{index_name}' on table '{table_name}' doesn't exist")
 
+    def analyze(self, table_name : str) -> None:
+        """Collects the statistics the planner uses to choose between indexes and scans"""
+        table_schema = self.get_table_schema(table_name)
+        table_schema.statistics = statistics.analyze(table_schema)
+        path = f"{self.tables_path}/{table_schema.table_name}"
+        self.save_table_schema(table_schema, path)
+
     def import_csv(self, table_name: str, csv_path: str):
         # Obtener el esquema de la tabla
         table_schema: TableSchema = self.get_table_schema(table_name)
@@ -521,16 +1033,29 @@ class DBManager:
                 table_schema.get_column_by_name(col_name).data_type for col_name in header
             ]
 
-            for row_num, row in enumerate(reader, start=2):
-                if not row or all(cell.strip() == '' for cell in row):
-                    continue  # Saltar filas vacías
-
-                try:
-                    # Convertir tipos según el esquema
-                    converted = [
-                        utils.convert_value(value, col_type)
-                        for value, col_type in zip(row, column_types)
-                    ]
-                    self.insert(table_name, converted, header)
-                except Exception as e:
-                    raise RuntimeError(f"Error en fila {row_num}: {e}")
+            # into an empty table the rows are appended first and its B+ trees bulk loaded at the end
+            record_file = RecordFile(table_schema)
+            bulk = record_file.max_id() == 0
+
+            try:
+                for row_num, row in enumerate(reader, start=2):
+                    if not row or all(cell.strip() == '' for cell in row):
+                        continue  # Saltar filas vacías
+
+                    try:
+                        # Convertir tipos según el esquema
+                        converted = [
+                            utils.convert_value(value, col_type)
+                            for value, col_type in zip(row, column_types)
+                        ]
+                        if not bulk:
+                            self.insert(table_name, converted, header)
+                            continue
+                        record = self.make_record(table_schema, converted, header)
+                        self.index_record(table_schema, record_file.append(record), record, skip_btree=True)
+                    except Exception as e:
+                        raise RuntimeError(f"Error en fila {row_num}: {e}")
+            finally:
+                if bulk: # the rows before a failing one are indexed too, as with one insert per row
+                    record_file.flush()
+                    self.bulk_load_btrees(table_schema)
@@ -0,0 +1,100 @@
+import os, sys, heapq, tempfile, itertools
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+from core.schema import TableSchema
+from core.record_file import Record, RecordCodec
+from core import utils
+
+
+class ExternalSort:
+    """Sorts the records of a table by one column within a memory budget.
+    Records are sorted in memory in runs of at most run_rows; when there is more than one run, every run is
+    spilled as encoded rows to a temp file under the table directory and the runs are k-way merged lazily.
+    With a LIMIT of at most run_rows the sort is a bounded top-k heap and nothing is spilled."""
+    MEMORY_BUDGET = 64 * 1024 * 1024 # bytes
+    ROW_OVERHEAD = 256               # python objects of a decoded Record, on top of its encoded size
+    BLOCK_SIZE = 64 * 1024           # read buffer of every run being merged
+
+    def __init__(self, table_schema : TableSchema, column_name : str, reverse : bool = False, memory_budget : int = None):
+        self.table_schema = table_schema
+        self.codec = RecordCodec.get(table_schema)
+        self.column = [col.name for col in table_schema.columns].index(column_name)
+        self.reverse = reverse
+        self.memory_budget = memory_budget or self.MEMORY_BUDGET
+        self.run_rows = max(1, self.memory_budget // (self.codec.size + self.ROW_OVERHEAD))
+        self.fan_in = max(2, self.memory_budget // self.BLOCK_SIZE)
+        self.directory = os.path.dirname(utils.get_record_file_path(table_schema.table_name))
+        self.runs = [] # run files written so far, removed once merged
+
+    def key(self, record : Record):
+        return record.values[self.column]
+
+    def sort(self, records, limit : int = None):
+        """Iterator over the records in order, the first `limit` of them if given"""
+        if limit != None and limit <= self.run_rows:
+            select = heapq.nlargest if self.reverse else heapq.nsmallest
+            return iter(select(limit, records, key=self.key))
+        records = iter(records)
+        run = self.sorted_run(records, limit)
+        following = next(records, None)
+        if following == None: # fits in memory
+            return iter(run)
+        return self.merge_runs(run, itertools.chain([following], records), limit)
+
+    def sorted_run(self, records, limit : int = None) -> list[Record]:
+        run = sorted(itertools.islice(records, self.run_rows), key=self.key, reverse=self.reverse)
+        return run[:limit] # later rows of a run can't be among the first `limit`
+
+    def merge_runs(self, run : list[Record], records, limit : int = None):
+        try:
+            paths = [self.spill(run)]
+            while True:
+                run = self.sorted_run(records, limit)
+                if not run:
+                    break
+                paths.append(self.spill(run))
+            # merge passes until the runs can be merged at once
+            while len(paths) > self.fan_in:
+                merged = []
+                for i in range(0, len(paths), self.fan_in):
+                    group = paths[i:i + self.fan_in]
+                    merged.append(self.spill(self.merge(group, limit)))
+                    for path in group:
+                        os.remove(path)
+                paths = merged
+            yield from self.merge(paths, limit)
+        finally:
+            for path in self.runs:
+                if os.path.exists(path):
+                    os.remove(path)
+            self.runs = []
+
+    def merge(self, paths : list[str], limit : int = None):
+        return itertools.islice(heapq.merge(*[self.read_run(path) for path in paths], key=self.key, reverse=self.reverse), limit)
+
+    def spill(self, records) -> str:
+        """Writes records as encoded rows to a new run file"""
+        fd, path = tempfile.mkstemp(prefix="sort_", suffix=".run", dir=self.directory)
+        self.runs.append(path)
+        with os.fdopen(fd, "wb") as file:
+            buffer = bytearray()
+            for record in records:
+                buffer += self.codec.pack(record.values)
+                if len(buffer) >= self.BLOCK_SIZE:
+                    file.write(buffer)
+                    buffer.clear()
+            file.write(buffer)
+        return path
+
+    def read_run(self, path : str):
+        size = self.codec.size
+        block = max(1, self.BLOCK_SIZE // size) * size
+        with open(path, "rb") as file:
+            while True:
+                data = file.read(block)
+                if not data:
+                    return
+                for offset in range(0, len(data), size):
+                    yield Record(self.table_schema, self.codec.unpack_from(data, offset))
@@ -0,0 +1,122 @@
+import os, sys, pickle, tempfile
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+from core.schema import TableSchema, Aggregate, AggregateFunction
+from core import utils
+
+
+# partial state of every aggregate for one row, and how two partial states combine
+def _state(function : AggregateFunction, value):
+    match function:
+        case AggregateFunction.COUNT:
+            return 1
+        case AggregateFunction.AVG:
+            return (value, 1)
+    return value
+
+def _merge(function : AggregateFunction, a, b):
+    match function:
+        case AggregateFunction.COUNT | AggregateFunction.SUM:
+            return a + b
+        case AggregateFunction.AVG:
+            return (a[0] + b[0], a[1] + b[1])
+        case AggregateFunction.MIN:
+            return min(a, b)
+        case AggregateFunction.MAX:
+            return max(a, b)
+
+def _final(function : AggregateFunction, state):
+    if function == AggregateFunction.AVG:
+        return state[0] / state[1]
+    return state
+
+
+class HashAggregate:
+    """Groups the records of a table by some columns and computes aggregates of every group within a memory budget.
+    Groups are kept in a hash table of partial states, at most max_groups of them. Once it is full, rows of new
+    groups are hash partitioned into temp files under the table directory, as single-row partial states,
+    while the groups in memory keep being updated. After the input ends the groups in memory are emitted
+    and every partition is aggregated the same way, partitioning again on overflow."""
+    MEMORY_BUDGET = 64 * 1024 * 1024 # bytes
+    GROUP_OVERHEAD = 256             # dict entry, key tuple and state list of a group
+    STATE_SIZE = 64                  # python objects of the partial state of one aggregate
+    BLOCK_ROWS = 4096                # (key, state) pairs buffered per partition before being written
+    MAX_PARTITIONS = 64
+    MAX_DEPTH = 8                    # past this many partitioning levels a partition is aggregated in memory
+
+    def __init__(self, table_schema : TableSchema, group_by : list[str], aggregates : list[Aggregate], memory_budget : int = None):
+        self.table_schema = table_schema
+        column_names = [col.name for col in table_schema.columns]
+        self.keys = [column_names.index(name) for name in group_by]
+        self.functions = [aggregate.function for aggregate in aggregates]
+        self.arguments = [column_names.index(aggregate.column_name) if aggregate.column_name != None else None for aggregate in aggregates]
+        self.memory_budget = memory_budget or self.MEMORY_BUDGET
+        self.max_groups = max(1, self.memory_budget // (self.GROUP_OVERHEAD + self.STATE_SIZE * len(aggregates)))
+        self.fan_out = min(self.MAX_PARTITIONS, max(2, self.memory_budget // (self.BLOCK_ROWS * self.GROUP_OVERHEAD)))
+        self.directory = os.path.dirname(utils.get_record_file_path(table_schema.table_name))
+        self.partitions = [] # partition files written so far, removed once aggregated
+
+    def aggregate(self, records):
+        """Iterator over (group key, aggregate values) of every group, in no particular order"""
+        try:
+            yield from self.run(self.states(records), 0)
+        finally:
+            for path in self.partitions:
+                if os.path.exists(path):
+                    os.remove(path)
+            self.partitions = []
+
+    def states(self, records):
+        """(group key, partial states) of every record"""
+        for record in records:
+            values = record.values
+            key = tuple(values[i] for i in self.keys)
+            yield key, [_state(function, values[i] if i != None else None) for function, i in zip(self.functions, self.arguments)]
+
+    def run(self, pairs, depth : int):
+        groups = {}
+        files = None
+        buffers = None
+        for key, states in pairs:
+            group = groups.get(key)
+            if group != None:
+                for i, function in enumerate(self.functions):
+                    group[i] = _merge(function, group[i], states[i])
+            elif len(groups) < self.max_groups or depth >= self.MAX_DEPTH:
+                groups[key] = states
+            else:
+                if files == None:
+                    files = [self.partition_file() for _ in range(self.fan_out)]
+                    buffers = [[] for _ in range(self.fan_out)]
+                p = hash((depth, key)) % self.fan_out
+                buffers[p].append((key, states))
+                if len(buffers[p]) >= self.BLOCK_ROWS:
+                    pickle.dump(buffers[p], files[p][1])
+                    buffers[p] = []
+        for key, group in groups.items():
+            yield key, [_final(function, state) for function, state in zip(self.functions, group)]
+        groups = None
+        if files == None:
+            return
+        for (path, file), buffer in zip(files, buffers):
+            if buffer:
+                pickle.dump(buffer, file)
+            file.close()
+        for path, _ in files:
+            yield from self.run(self.read_partition(path), depth + 1)
+            os.remove(path)
+
+    def partition_file(self):
+        fd, path = tempfile.mkstemp(prefix="group_", suffix=".part", dir=self.directory)
+        self.partitions.append(path)
+        return path, os.fdopen(fd, "wb")
+
+    def read_partition(self, path : str):
+        with open(path, "rb") as file:
+            while True:
+                try:
+                    yield from pickle.load(file)
+                except EOFError:
+                    return
@@ -0,0 +1,59 @@
+import os, sys
+import threading
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+
+class IndexCache:
+    """Metadata of the index files pinned in memory, shared by every index object.
+
+    Index files keep under a name the few values read by every lookup: headers,
+    the B+ tree root and its node, the ISAM root and level-1 pages. Writers update
+    the file and the cache together (write-through), so a cached value is never
+    stale while the file is changed through the index classes. Opening an index
+    file reloads its entries from the disk; removing or rebuilding one must
+    invalidate() them."""
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(IndexCache, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self.lock = threading.RLock()
+        self.files = {}  # filename -> {name: value}
+        self._initialized = True
+
+    @staticmethod
+    def _key(filename: str) -> str:
+        return os.path.abspath(filename)
+
+    def get(self, filename: str, name: str, default=None):
+        with self.lock:
+            return self.files.get(self._key(filename), {}).get(name, default)
+
+    def put(self, filename: str, name: str, value) -> None:
+        with self.lock:
+            self.files.setdefault(self._key(filename), {})[name] = value
+
+    def discard(self, filename: str, name: str) -> None:
+        with self.lock:
+            self.files.get(self._key(filename), {}).pop(name, None)
+
+    def invalidate(self, filename: str) -> None:
+        """Drop every entry of the file"""
+        with self.lock:
+            self.files.pop(self._key(filename), None)
+
+    def invalidate_dir(self, path: str) -> None:
+        """Drop the entries of every file under path"""
+        path = os.path.join(self._key(path), "")
+        with self.lock:
+            for filename in [filename for filename in self.files if filename.startswith(path)]:
+                del self.files[filename]
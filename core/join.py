@@ -0,0 +1,176 @@
+import os, sys, tempfile, itertools
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+from core.schema import TableSchema
+from core.conditionschema import Condition
+from core.record_file import Record, RecordFile, RecordCodec
+from core.scan import VectorScan
+from core.bitmap import RoaringBitmap
+from core import utils
+
+
+class IndexNestedLoopJoin:
+    """Joins every outer record with the inner records sharing its key, found by probing the index on the join column
+    of the inner table. Outer records are taken in batches; every distinct key of a batch is probed once and the
+    candidates of the whole batch are checked against the inner condition or bitmap and read together."""
+    BATCH = 4096
+
+    def __init__(self, inner_schema : TableSchema, inner_column : str, index, condition : Condition = None, bitmap : RoaringBitmap = None):
+        self.inner_schema = inner_schema
+        self.key = [col.name for col in inner_schema.columns].index(inner_column)
+        self.index = index
+        self.condition = condition
+        self.bitmap = bitmap
+        self.record_file = RecordFile(inner_schema, use_mmap=True)
+        self.vector_scan = VectorScan(inner_schema) if condition != None else None
+
+    def join(self, outer_records, outer_key : int):
+        """Iterator over (outer record, inner record) pairs, in the order of the outer records"""
+        outer_records = iter(outer_records)
+        while True:
+            batch = list(itertools.islice(outer_records, self.BATCH))
+            if not batch:
+                return
+            matches = self.probe({record.values[outer_key] for record in batch})
+            for outer in batch:
+                for inner in matches.get(outer.values[outer_key], ()):
+                    yield outer, inner
+
+    def probe(self, keys : set) -> dict:
+        """key -> live inner records with that key matching the condition"""
+        candidates = {key: set(self.index.scan(key, key)) for key in keys}
+        positions = sorted(set().union(*candidates.values()))
+        if self.condition != None:
+            positions = self.vector_scan.filter_positions(self.condition, positions)
+        elif self.bitmap != None:
+            positions = [pos for pos in positions if pos in self.bitmap]
+        records = self.record_file.read_many(positions)
+        matches = {}
+        for key, slots in candidates.items():
+            found = [records[pos] for pos in sorted(slots) if pos in records and records[pos].values[self.key] == key] # stale entries are skipped
+            if found:
+                matches[key] = found
+        return matches
+
+
+class GraceHashJoin:
+    """Hash join within a memory budget. The build input is loaded into a hash table on its join column and the probe
+    input streamed against it. When the build input holds more than build_rows records, both inputs are hash
+    partitioned on the key into temp files under the table directory, and every pair of partitions is joined the
+    same way, partitioning again on overflow."""
+    MEMORY_BUDGET = 64 * 1024 * 1024 # bytes
+    ROW_OVERHEAD = 256               # python objects of a decoded Record, on top of its encoded size
+    BLOCK_SIZE = 64 * 1024           # write buffer of every partition
+    MAX_PARTITIONS = 64
+    MAX_DEPTH = 8                    # past this many partitioning levels a partition is joined in memory
+
+    def __init__(self, build_schema : TableSchema, build_column : str, probe_schema : TableSchema, probe_column : str, memory_budget : int = None):
+        self.schemas = [build_schema, probe_schema]
+        self.codecs = [RecordCodec.get(build_schema), RecordCodec.get(probe_schema)]
+        self.keys = [[col.name for col in build_schema.columns].index(build_column), [col.name for col in probe_schema.columns].index(probe_column)]
+        self.memory_budget = memory_budget or self.MEMORY_BUDGET
+        self.build_rows = max(1, self.memory_budget // (self.codecs[0].size + self.ROW_OVERHEAD))
+        self.fan_out = self.partitions_for(self.memory_budget)
+        self.directory = os.path.dirname(utils.get_record_file_path(probe_schema.table_name))
+        self.partitions = [] # partition files written so far, removed once joined
+
+    @classmethod
+    def partitions_for(cls, memory_budget : int) -> int:
+        """Partitions an input is split into per level, one write buffer of each fits in the budget"""
+        return min(cls.MAX_PARTITIONS, max(2, memory_budget // cls.BLOCK_SIZE))
+
+    def join(self, build_records, probe_records):
+        """Iterator over (probe record, build record) pairs"""
+        try:
+            yield from self.run(build_records, probe_records, 0)
+        finally:
+            for path in self.partitions:
+                if os.path.exists(path):
+                    os.remove(path)
+            self.partitions = []
+
+    def run(self, build_records, probe_records, depth : int):
+        build_key, probe_key = self.keys
+        build_records = iter(build_records)
+        table = {}
+        loaded = list(itertools.islice(build_records, self.build_rows))
+        following = next(build_records, None) if depth < self.MAX_DEPTH else None
+        if following == None: # fits in memory
+            for record in itertools.chain(loaded, build_records):
+                table.setdefault(record.values[build_key], []).append(record)
+            for probe in probe_records:
+                for build in table.get(probe.values[probe_key], ()):
+                    yield probe, build
+            return
+        build_paths = self.partition(0, itertools.chain(loaded, [following], build_records), depth)
+        loaded = None
+        probe_paths = self.partition(1, probe_records, depth)
+        for build_path, probe_path in zip(build_paths, probe_paths):
+            if os.path.getsize(build_path) and os.path.getsize(probe_path):
+                yield from self.run(self.read_partition(0, build_path), self.read_partition(1, probe_path), depth + 1)
+            os.remove(build_path)
+            os.remove(probe_path)
+
+    def partition(self, side : int, records, depth : int) -> list[str]:
+        """Writes the records of one input as encoded rows to fan_out partition files by the hash of their key"""
+        codec, key = self.codecs[side], self.keys[side]
+        files = []
+        for _ in range(self.fan_out):
+            fd, path = tempfile.mkstemp(prefix="join_", suffix=".part", dir=self.directory)
+            self.partitions.append(path)
+            files.append((path, os.fdopen(fd, "wb")))
+        buffers = [bytearray() for _ in files]
+        for record in records:
+            p = hash((depth, record.values[key])) % self.fan_out
+            buffers[p] += codec.pack(record.values)
+            if len(buffers[p]) >= self.BLOCK_SIZE:
+                files[p][1].write(buffers[p])
+                buffers[p].clear()
+        for (_, file), buffer in zip(files, buffers):
+            file.write(buffer)
+            file.close()
+        return [path for path, _ in files]
+
+    def read_partition(self, side : int, path : str):
+        codec, schema = self.codecs[side], self.schemas[side]
+        size = codec.size
+        block = max(1, self.BLOCK_SIZE // size) * size
+        with open(path, "rb") as file:
+            while True:
+                data = file.read(block)
+                if not data:
+                    return
+                for offset in range(0, len(data), size):
+                    yield Record(schema, codec.unpack_from(data, offset))
+
+
+class SortMergeJoin:
+    """Merges two inputs already in ascending order of their join columns; every run of equal keys on the right
+    is held in memory while the left records with that key go by"""
+
+    def __init__(self, left_key : int, right_key : int):
+        self.left_key = left_key
+        self.right_key = right_key
+
+    def join(self, left_records, right_records):
+        """Iterator over (left record, right record) pairs, in key order"""
+        left_records, right_records = iter(left_records), iter(right_records)
+        left, right = next(left_records, None), next(right_records, None)
+        while left != None and right != None:
+            left_value, right_value = left.values[self.left_key], right.values[self.right_key]
+            if left_value < right_value:
+                left = next(left_records, None)
+            elif left_value > right_value:
+                right = next(right_records, None)
+            else:
+                run = [right]
+                right = next(right_records, None)
+                while right != None and right.values[self.right_key] == left_value:
+                    run.append(right)
+                    right = next(right_records, None)
+                while left != None and left.values[self.left_key] == left_value:
+                    for match in run:
+                        yield left, match
+                    left = next(left_records, None)
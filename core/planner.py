@@ -0,0 +1,411 @@
+import os, sys, math
+from enum import Enum, auto
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+from core.conditionschema import Condition, BinaryCondition, BetweenCondition, NotCondition, BooleanColumn, BinaryOp, RangeCondition, InCondition, ConstantCondition
+from core.schema import DataType, TableSchema, IndexType, IndexSchema
+from core.record_file import RecordFile, RecordCodec
+from core.join import GraceHashJoin
+from core.rewriter import Rewriter
+from core.buffer_pool import BufferPool
+from core import utils
+
+
+class AccessPath(Enum):
+    SCAN = auto()          # VectorScan over the heap file
+    INDEX_LOOKUP = auto()  # index.search
+    INDEX_RANGE = auto()   # index.scan over a key range
+    INDEX_COMPOSITE = auto() # one scan of a composite index for several conjuncts, see CompositeProbe
+
+    def __str__(self):
+        return self.name
+
+
+class CompositeProbe:
+    """Conjuncts of an AND-chain answered by one scan of a composite index: equalities on a prefix of its
+    columns (values) and at most one range on the next column (bounds)"""
+    def __init__(self, index_schema : IndexSchema, leaves : list[Condition], values : list, bounds : tuple = None):
+        self.index_schema = index_schema
+        self.leaves = leaves
+        self.values = values
+        self.bounds = bounds # (lo, lo_inclusive, hi, hi_inclusive)
+
+
+class Planner:
+    """Chooses the access path of every predicate of a WHERE clause.
+    With statistics (ANALYZE) an index is only used when it is cheaper than a sequential scan;
+    without them every indexed predicate goes through its index."""
+    SEQ_PAGE_COST = 1.0
+    RANDOM_PAGE_COST = 4.0
+    SCAN_ROW_COST = 0.001    # numpy work per row of a scan
+    RESIDUAL_ROW_COST = 0.01 # checking one candidate row of an AND-chain against a predicate
+    ENTRY_COST = {           # per matching entry of an index, AVL reads one node per entry
+        IndexType.AVL: RANDOM_PAGE_COST,
+        IndexType.BTREE: 0.05,
+        IndexType.ISAM: 0.05,
+        IndexType.HASH: 0.05,
+        IndexType.RTREE: 0.05,
+    }
+    FANOUT = 64
+    ORDERED_INDEXES = [IndexType.BTREE, IndexType.AVL, IndexType.ISAM] # scan in key order
+    DEFAULT_SELECTIVITY = {BinaryOp.EQ: 0.005, BinaryOp.NEQ: 0.995}
+    DEFAULT_RANGE_SELECTIVITY = 1 / 3
+    DEFAULT_BETWEEN_SELECTIVITY = 1 / 4
+
+    def __init__(self, table_schema : TableSchema):
+        self.table_schema = table_schema
+        self.statistics = getattr(table_schema, "statistics", None) # schemas saved before ANALYZE existed have none
+        self.paths = {}   # id(leaf) -> AccessPath
+        self.scanned = {} # id(condition) -> bitmap evaluated by the shared scan
+        self.probes = {}  # id(leaf) -> CompositeProbe of the leaves planned as INDEX_COMPOSITE
+        self.universe = RecordFile(table_schema).max_id() # slots of the heap file, the universe of the bitmaps
+        self.rows = self.statistics.row_count if self.statistics != None else self.universe
+        self.pages = math.ceil(self.rows * RecordCodec.get(table_schema).node_size / BufferPool.PAGE_SIZE)
+
+    # ----- Condition helpers -----
+
+    def column(self, condition : Condition):
+        if type(condition) == ConstantCondition:
+            return None
+        name = condition.column_name if type(condition) == BooleanColumn else condition.left.column_name
+        return self.table_schema.get_column_by_name(name)
+
+    @staticmethod
+    def is_leaf(condition : Condition) -> bool:
+        if type(condition) == BinaryCondition:
+            return condition.op not in [BinaryOp.AND, BinaryOp.OR]
+        return type(condition) in [BetweenCondition, BooleanColumn, RangeCondition, InCondition, ConstantCondition]
+
+    @staticmethod
+    def children(condition : Condition) -> list[Condition]:
+        if type(condition) == NotCondition:
+            return [condition.condition]
+        if type(condition) == BinaryCondition and condition.op in [BinaryOp.AND, BinaryOp.OR]:
+            return [condition.left, condition.right]
+        return []
+
+    def leaves(self, condition : Condition) -> list[Condition]:
+        if self.is_leaf(condition):
+            return [condition]
+        return [leaf for child in self.children(condition) for leaf in self.leaves(child)]
+
+    def conjuncts(self, condition : Condition) -> list[Condition]:
+        """Flattens a chain of ANDs"""
+        if type(condition) == BinaryCondition and condition.op == BinaryOp.AND:
+            return self.conjuncts(condition.left) + self.conjuncts(condition.right)
+        return [condition]
+
+    @staticmethod
+    def values(leaf : Condition) -> list:
+        """Values a leaf compares its column with"""
+        match leaf:
+            case BetweenCondition():
+                return [leaf.mid.value, leaf.right.value]
+            case RangeCondition():
+                return [bound.value for bound in [leaf.lo, leaf.hi] if bound != None]
+            case InCondition():
+                return [value.value for value in leaf.values]
+        return [leaf.right.value]
+
+    def vectorizable(self, condition : Condition) -> bool:
+        """True if VectorScan can evaluate the condition; invalid columns and values are left
+        to select_condition, which reports them"""
+        if not self.is_leaf(condition):
+            children = self.children(condition)
+            return bool(children) and all(self.vectorizable(child) for child in children)
+        if type(condition) == ConstantCondition:
+            return True
+        column = self.column(condition)
+        if column == None or column.data_type == DataType.POINT:
+            return False
+        if type(condition) == BooleanColumn:
+            return column.data_type == DataType.BOOL
+        return all(column.data_type == utils.get_data_type(value) for value in self.values(condition))
+
+    # ----- Estimates -----
+
+    def selectivity(self, condition : Condition) -> float:
+        """Estimated fraction of the table matching the condition"""
+        condition_type = type(condition)
+        if condition_type == NotCondition:
+            return 1.0 - self.selectivity(condition.condition)
+        if condition_type == BinaryCondition and condition.op == BinaryOp.AND:
+            return self.selectivity(condition.left) * self.selectivity(condition.right)
+        if condition_type == BinaryCondition and condition.op == BinaryOp.OR:
+            left, right = self.selectivity(condition.left), self.selectivity(condition.right)
+            return left + right - left * right
+        if condition_type == ConstantCondition:
+            return 1.0 if condition.value else 0.0
+        if condition_type == InCondition:
+            return min(1.0, sum(self.selectivity(BinaryCondition(condition.left, BinaryOp.EQ, value)) for value in condition.values))
+        estimate = None
+        if self.statistics != None and self.vectorizable(condition):
+            column = self.column(condition)
+            if condition_type == BetweenCondition:
+                estimate = self.statistics.range_selectivity(column.name, condition.mid.value, condition.right.value)
+            elif condition_type == RangeCondition:
+                estimate = self.statistics.range_selectivity(column.name, condition.lo.value if condition.lo else None,
+                    condition.hi.value if condition.hi else None, condition.lo_inclusive, condition.hi_inclusive)
+            elif condition_type == BooleanColumn:
+                estimate = self.statistics.selectivity(column.name, BinaryOp.EQ, True)
+            else:
+                estimate = self.statistics.selectivity(column.name, condition.op, condition.right.value)
+        if estimate != None:
+            return estimate
+        if condition_type == BetweenCondition or (condition_type == RangeCondition and condition.lo and condition.hi):
+            return self.DEFAULT_BETWEEN_SELECTIVITY
+        if condition_type == BinaryCondition:
+            return self.DEFAULT_SELECTIVITY.get(condition.op, self.DEFAULT_RANGE_SELECTIVITY)
+        return 0.5
+
+    def scan_cost(self, shared : bool = False) -> float:
+        """Cost of evaluating a predicate with a sequential scan, only the row work if the scan is already done"""
+        cost = self.rows * self.SCAN_ROW_COST
+        return cost if shared else cost + self.pages * self.SEQ_PAGE_COST
+
+    def index_cost(self, leaf : Condition, path : AccessPath) -> float:
+        index_type = self.column(leaf).index_type
+        entries = self.selectivity(leaf) * self.rows
+        if type(leaf) == BinaryCondition and leaf.op == BinaryOp.NEQ: # read as a lookup of the equal value
+            entries = self.rows - entries
+        if path == AccessPath.INDEX_RANGE and index_type == IndexType.HASH: # hash has no order, it reads every bucket
+            entries = self.rows
+        descent = math.log(max(self.rows, 2), self.FANOUT) + 1
+        if type(leaf) == InCondition: # one lookup per value
+            descent *= len(leaf.values)
+        return descent * self.RANDOM_PAGE_COST + entries * self.ENTRY_COST.get(index_type, 1.0)
+
+    def index_path(self, leaf : Condition) -> AccessPath:
+        if type(leaf) == BinaryCondition and leaf.op in [BinaryOp.EQ, BinaryOp.NEQ]:
+            return AccessPath.INDEX_LOOKUP
+        if type(leaf) in [BooleanColumn, InCondition]:
+            return AccessPath.INDEX_LOOKUP
+        return AccessPath.INDEX_RANGE
+
+    def cost(self, condition : Condition) -> float:
+        """Estimated cost of evaluating the condition with the chosen access paths"""
+        if id(condition) in self.scanned:
+            return 0.0
+        if not self.is_leaf(condition):
+            return sum(self.cost(child) for child in self.children(condition))
+        if type(condition) == ConstantCondition:
+            return 0.0
+        path = self.paths.get(id(condition), self.index_path(condition))
+        if path == AccessPath.SCAN:
+            return self.scan_cost()
+        if path == AccessPath.INDEX_COMPOSITE: # the probe is shared by its leaves
+            probe = self.probes[id(condition)]
+            return self.composite_cost(probe) / len(probe.leaves)
+        return self.index_cost(condition, path)
+
+    def composite_cost(self, probe : CompositeProbe) -> float:
+        """One descent of the composite index and the entries matching all of its conjuncts"""
+        entries = self.rows
+        for leaf in probe.leaves:
+            entries *= self.selectivity(leaf)
+        descent = math.log(max(self.rows, 2), self.FANOUT) + 1
+        return descent * self.RANDOM_PAGE_COST + entries * self.ENTRY_COST[probe.index_schema.index_type]
+
+    # ----- Planning -----
+
+    def plan(self, condition : Condition) -> None:
+        """Chooses the access path of every leaf of the condition"""
+        leaves = self.leaves(condition)
+        for leaf in leaves:
+            self.paths[id(leaf)] = self.choose(leaf, shared=False)
+        for conjuncts in self.chains(condition):
+            probe = self.composite_probe(conjuncts)
+            if probe != None and len(probe.leaves) == 1 and self.column(probe.leaves[0]).index_type != IndexType.NONE:
+                continue # a single predicate is only worth it on a column without an index
+            if probe != None and (self.statistics == None or self.composite_cost(probe) < sum(self.cost(leaf) for leaf in probe.leaves)):
+                for leaf in probe.leaves:
+                    self.paths[id(leaf)] = AccessPath.INDEX_COMPOSITE
+                    self.probes[id(leaf)] = probe
+        # once some predicate scans the table, the others can share that pass for the row work only
+        if any(path == AccessPath.SCAN for path in self.paths.values()):
+            for leaf in leaves:
+                if id(leaf) not in self.probes:
+                    self.paths[id(leaf)] = self.choose(leaf, shared=True)
+
+    def chains(self, condition : Condition) -> list[list[Condition]]:
+        """Conjuncts of every AND-chain of the condition, a predicate outside of any is a chain of its own"""
+        if type(condition) == BinaryCondition and condition.op == BinaryOp.AND:
+            conjuncts = self.conjuncts(condition)
+            return [conjuncts] + [chain for conjunct in conjuncts for child in self.children(conjunct) for chain in self.chains(child)]
+        if self.is_leaf(condition):
+            return [[condition]]
+        return [chain for child in self.children(condition) for chain in self.chains(child)]
+
+    def composite_probe(self, conjuncts : list[Condition], indexes : list[IndexSchema] = None) -> CompositeProbe | None:
+        """Probe of the composite index (of the given ones, all by default) answering the most conjuncts
+        of an AND-chain. A hash index needs equalities on all of its columns."""
+        rewriter = Rewriter(self.table_schema)
+        ranges = {} # column -> (conjunct, bounds) of its range predicates
+        for conjunct in conjuncts:
+            bounds = rewriter.bounds(conjunct)
+            if bounds and bounds[0]:
+                ranges.setdefault(bounds[0].name, []).append((conjunct, bounds[1:]))
+        best = None
+        for index_schema in self.table_schema.get_composite_indexes() if indexes == None else indexes:
+            leaves, values, last = [], [], None
+            for name in index_schema.column_names:
+                candidates = ranges.get(name, [])
+                equal = next(((c, b) for c, b in candidates if b[0] != None and b[0] == b[2] and b[1] and b[3]), None)
+                if equal:
+                    leaves.append(equal[0])
+                    values.append(equal[1][0])
+                    continue
+                if candidates:
+                    leaves.append(candidates[0][0])
+                    last = candidates[0][1]
+                break
+            if not leaves:
+                continue
+            if index_schema.index_type == IndexType.HASH and (last != None or len(values) < len(index_schema.column_names)):
+                continue
+            if best == None or len(leaves) > len(best.leaves):
+                best = CompositeProbe(index_schema, leaves, values, last)
+        return best
+
+    def choose(self, leaf : Condition, shared : bool) -> AccessPath:
+        if type(leaf) == ConstantCondition: # needs no access at all
+            return None
+        column = self.column(leaf)
+        vectorizable = self.vectorizable(leaf)
+        if column != None and column.index_type == IndexType.NONE:
+            return AccessPath.SCAN if vectorizable else self.index_path(leaf)
+        path = self.index_path(leaf)
+        if self.statistics == None or not vectorizable:
+            return path
+        return AccessPath.SCAN if self.scan_cost(shared) < self.index_cost(leaf, path) else path
+
+    def scan_subtrees(self, condition : Condition) -> list[Condition]:
+        """Maximal subtrees whose predicates are all planned as scans"""
+        if self.vectorizable(condition) and all(self.paths.get(id(leaf)) == AccessPath.SCAN for leaf in self.leaves(condition)):
+            return [condition]
+        return [subtree for child in self.children(condition) for subtree in self.scan_subtrees(child)]
+
+    def order(self, conjuncts : list[Condition]) -> list[Condition]:
+        """Conjuncts already evaluated by the shared scan first, then by estimated selectivity"""
+        return sorted(conjuncts, key=lambda condition: (id(condition) not in self.scanned, self.selectivity(condition)))
+
+    def residual(self, condition : Condition, candidates : int) -> bool:
+        """True if checking the candidate rows of an AND-chain is cheaper than evaluating the condition"""
+        return self.vectorizable(condition) and candidates * self.RESIDUAL_ROW_COST < self.cost(condition)
+
+    def index_only(self, condition : Condition, probe : CompositeProbe) -> bool:
+        """True if reading the entries of the probe of a covering index and checking the condition on them is
+        cheaper than evaluating the condition and fetching the matching records"""
+        if self.statistics == None:
+            return True
+        matches = self.selectivity(condition) * self.rows
+        fetch = min(matches * self.RANDOM_PAGE_COST, self.pages * self.SEQ_PAGE_COST)
+        return self.composite_cost(probe) <= self.cost(condition) + fetch
+
+    def index_order(self, condition : Condition, column, limit : int = None) -> bool:
+        """True if ORDER BY column is cheaper read in the order of its index, checking the condition on the way,
+        than evaluating the condition and sorting the matches. Without a condition the index is always used,
+        so the rows stream in order instead of being sorted in memory."""
+        if column.index_type not in self.ORDERED_INDEXES:
+            return False
+        if condition == None:
+            return True
+        matches = max(self.selectivity(condition) * self.rows, 1.0)
+        walked = self.rows if limit == None else min(self.rows, limit * self.rows / matches)
+        walk = walked * (self.ENTRY_COST[column.index_type] + self.RESIDUAL_ROW_COST)
+        sort = self.cost(condition) + matches * math.log2(matches + 1) * self.SCAN_ROW_COST
+        return walk <= sort
+
+
+class JoinMethod(Enum):
+    INDEX_NESTED_LOOP = auto() # probes the index on the join column of the inner table for every outer row
+    HASH = auto()              # grace hash join, builds on the smaller input
+    SORT_MERGE = auto()        # merges both inputs read in the order of their join column indexes
+
+    def __str__(self):
+        return self.name
+
+
+class JoinPlanner:
+    """Chooses the operator of an equi-join from the estimated size of both inputs, after their own WHERE
+    predicates, and the indexes on the join columns. Every side is a Planner already planned for its condition."""
+    HASH_ROW_COST = 0.01  # hashing and probing one row in memory, or encoding or decoding it in a partition
+    PROBE_INDEXES = [IndexType.BTREE, IndexType.AVL, IndexType.ISAM, IndexType.HASH]
+
+    def __init__(self, planners : list[Planner], columns : list, conditions : list[Condition], memory_budget : int):
+        self.planners = planners
+        self.columns = columns
+        self.conditions = conditions
+        self.memory_budget = memory_budget
+
+    def rows(self, side : int) -> float:
+        """Estimated rows of one input"""
+        planner, condition = self.planners[side], self.conditions[side]
+        if condition == None:
+            return max(planner.rows, 1.0)
+        return max(planner.selectivity(condition) * planner.rows, 1.0)
+
+    def input_cost(self, side : int) -> float:
+        """Reading one input on its own: evaluating its condition and fetching the matching rows"""
+        planner, condition = self.planners[side], self.conditions[side]
+        if condition == None:
+            return planner.pages * Planner.SEQ_PAGE_COST
+        return planner.cost(condition) + min(self.rows(side) * Planner.RANDOM_PAGE_COST, planner.pages * Planner.SEQ_PAGE_COST)
+
+    def matches_per_key(self, side : int) -> float:
+        """Estimated rows of one table sharing a value of its join column"""
+        column, planner = self.columns[side], self.planners[side]
+        if column.is_primary:
+            return 1.0
+        statistics = planner.statistics.columns.get(column.name) if planner.statistics != None else None
+        if statistics != None and statistics.distinct:
+            return max(planner.rows / statistics.distinct, 1.0)
+        return max(Planner.DEFAULT_SELECTIVITY[BinaryOp.EQ] * planner.rows, 1.0)
+
+    def index_nested_loop_cost(self, inner : int) -> float:
+        """Outer input once, then per outer row one index lookup and a random read per matching inner row"""
+        column = self.columns[inner]
+        if column.index_type not in self.PROBE_INDEXES:
+            return math.inf
+        planner = self.planners[inner]
+        matches = self.matches_per_key(inner)
+        descent = math.log(max(planner.rows, 2), Planner.FANOUT) + 1
+        probe = descent * Planner.ENTRY_COST[column.index_type] + Planner.RANDOM_PAGE_COST + matches * (Planner.ENTRY_COST[column.index_type] + Planner.RANDOM_PAGE_COST)
+        return self.input_cost(1 - inner) + self.rows(1 - inner) * probe
+
+    def hash_cost(self, build : int) -> float:
+        """Both inputs once; when the build side exceeds the memory budget both inputs are written to partitions
+        and read back once per partitioning level"""
+        cost = self.input_cost(0) + self.input_cost(1) + (self.rows(0) + self.rows(1)) * self.HASH_ROW_COST
+        build_bytes = self.rows(build) * (RecordCodec.get(self.planners[build].table_schema).size + GraceHashJoin.ROW_OVERHEAD)
+        if build_bytes > self.memory_budget:
+            levels = math.ceil(math.log(build_bytes / self.memory_budget, GraceHashJoin.partitions_for(self.memory_budget)))
+            pages = sum(self.rows(side) * RecordCodec.get(self.planners[side].table_schema).size / BufferPool.PAGE_SIZE for side in [0, 1])
+            cost += max(levels, 1) * (2 * pages * Planner.SEQ_PAGE_COST + 2 * (self.rows(0) + self.rows(1)) * self.HASH_ROW_COST)
+        return cost
+
+    def sort_merge_cost(self) -> float:
+        """Both join column indexes walked in key order, the condition checked on the rows read"""
+        if any(column.index_type not in Planner.ORDERED_INDEXES for column in self.columns):
+            return math.inf
+        cost = 0.0
+        for side in [0, 1]:
+            planner = self.planners[side]
+            cost += planner.rows * (Planner.ENTRY_COST[self.columns[side].index_type] + Planner.RESIDUAL_ROW_COST)
+            if self.conditions[side] != None and not planner.vectorizable(self.conditions[side]):
+                cost += planner.cost(self.conditions[side])
+        return cost
+
+    def choose(self) -> tuple[JoinMethod, int]:
+        """Cheapest operator and its inner side: the indexed side probed, the hash build side, 1 for a merge"""
+        build = 0 if self.rows(0) <= self.rows(1) else 1
+        candidates = [
+            (self.hash_cost(build), JoinMethod.HASH, build),
+            (self.sort_merge_cost(), JoinMethod.SORT_MERGE, 1),
+            (self.index_nested_loop_cost(1), JoinMethod.INDEX_NESTED_LOOP, 1),
+            (self.index_nested_loop_cost(0), JoinMethod.INDEX_NESTED_LOOP, 0),
+        ]
+        _, method, inner = min(candidates, key=lambda candidate: candidate[0])
+        return method, inner
@@ -1,17 +1,108 @@
 import struct
+import operator
+import weakref
 from core.schema import TableSchema, DataType
 from core import utils
+from core.buffer_pool import BufferPool
 import logger
 import os
 
+class RecordCodec:
+	"""Compiled record layout of a table: one struct.Struct plus a decode step per column.
+	Built once per schema and cached, see RecordCodec.get"""
+	NEXT_DEL = struct.Struct("i") # trailing next_del of a FreeListNode, packed on its own
+	_by_schema = weakref.WeakKeyDictionary() # TableSchema -> codec
+	_by_layout = {} # (table, columns layout) -> codec, schemas are unpickled again on every query
+
+	def __init__(self, schema: TableSchema):
+		self.format = utils.calculate_record_format(schema.columns)
+		self.struct = struct.Struct(self.format)
+		self.size = self.struct.size
+		self.node_size = self.size + self.NEXT_DEL.size
+		self.columns = schema.columns
+		self.steps = []
+		i = 0
+		for col in schema.columns:
+			if col.data_type == DataType.VARCHAR:
+				self.steps.append(lambda raw, i=i: raw[i].decode().strip("\x00"))
+			elif col.data_type == DataType.FLOAT:
+				self.steps.append(lambda raw, i=i: round(raw[i], 6))
+			elif col.data_type == DataType.POINT:
+				self.steps.append(lambda raw, i=i: (round(raw[i], 6), round(raw[i + 1], 6)))
+				i += 1
+			else:
+				self.steps.append(operator.itemgetter(i))
+			i += 1
+		# INT/BOOL only tables need no per-column work
+		self.plain = all(col.data_type in (DataType.INT, DataType.BOOL) for col in schema.columns)
+
+	@classmethod
+	def get(cls, schema: TableSchema) -> "RecordCodec":
+		codec = cls._by_schema.get(schema)
+		if codec is None:
+			layout = (schema.table_name, tuple((col.name, col.data_type, col.varchar_length) for col in schema.columns))
+			codec = cls._by_layout.get(layout)
+			if codec is None:
+				codec = cls._by_layout[layout] = cls(schema)
+			cls._by_schema[schema] = codec
+		return codec
+
+	def decode(self, raw: tuple) -> list:
+		if self.plain:
+			return list(raw)
+		return [step(raw) for step in self.steps]
+
+	def pack(self, values: list) -> bytes:
+		packed = []
+		for col, val in zip(self.columns, values):
+			if col.data_type == DataType.POINT:
+				packed.append(val[0])
+				packed.append(val[1])
+			elif col.data_type == DataType.VARCHAR:
+				packed.append(utils.pad_str(val, col.varchar_length))
+			else:
+				packed.append(val)
+		return self.struct.pack(*packed)
+
+	def unpack(self, raw_bytes) -> list:
+		return self.decode(self.struct.unpack(raw_bytes))
+
+	def unpack_from(self, buffer, offset: int = 0) -> list:
+		return self.decode(self.struct.unpack_from(buffer, offset))
+
+	def unpack_many(self, buffer, offsets) -> list[list]:
+		"""Decode the records stored at many offsets of one buffer"""
+		unpack_from, decode = self.struct.unpack_from, self.decode
+		return [decode(unpack_from(buffer, offset)) for offset in offsets]
+
+	def next_del_from(self, buffer, offset: int = 0) -> int:
+		"""next_del of the FreeListNode starting at offset (-2 means live record)"""
+		return self.NEXT_DEL.unpack_from(buffer, offset + self.size)[0]
+
+
+_loggers = {}
+
+def _get_logger(name: str) -> logger.CustomLogger:
+	if name not in _loggers:
+		_loggers[name] = logger.CustomLogger(name)
+	return _loggers[name]
+
+
 class Record:
+	__slots__ = ("schema", "values", "id")
+
 	def __init__(self, schema: TableSchema, values: list):
 		self.schema = schema
 		self.values = values
 		self.id = values[0] # no deberia estar esto
-		self.format = utils.calculate_record_format(schema.columns)
-		self.size = struct.calcsize(self.format)
-		self.logger = logger.CustomLogger(f"RECORD-{schema.table_name}".upper())
+
+	@property
+	def format(self):
+		return RecordCodec.get(self.schema).format
+
+	@property
+	def size(self):
+		return RecordCodec.get(self.schema).size
 
 	def debug(self):
 		attrs = [
@@ -19,46 +110,14 @@ class Record:
 			for col, val in zip(self.schema.columns, self.values)
 		]
 		debug_msg = f"Record [{', '.join(attrs)}]"
-		self.logger.debug(debug_msg)
+		_get_logger(f"RECORD-{self.schema.table_name}".upper()).debug(debug_msg)
 
 	def pack(self):
-		packed = []
-		for col, val in zip(self.schema.columns, self.values):
-			if col.data_type == DataType.POINT:
-				packed.append(val[0])
-				packed.append(val[1])
-			elif col.data_type == DataType.VARCHAR:
-				packed.append(utils.pad_str(val, col.varchar_length))
-			else:
-				packed.append(val)
-		return struct.pack(self.format, *packed)
+		return RecordCodec.get(self.schema).pack(self.values)
 
 	@classmethod
 	def unpack(cls, schema:TableSchema, raw_bytes):
-		format = utils.calculate_record_format(schema.columns)
-		values = list(struct.unpack(format, raw_bytes))
-		final_values = []
-		i = 0
-		col_idx = 0
-		while col_idx < len(schema.columns):
-			col = schema.columns[col_idx]
-			if col.data_type == DataType.VARCHAR:
-				final_values.append(values[i].decode().strip("\x00"))
-				i += 1
-			elif col.data_type == DataType.FLOAT:
-				final_values.append(round(float(values[i]), 6))
-				i += 1
-			elif col.data_type == DataType.POINT:
-				x = round(float(values[i]), 6)
-				y = round(float(values[i+1]), 6)
-				final_values.append((x, y))
-				i += 2
-			else:
-				final_values.append(values[i])
-				i += 1
-			col_idx += 1
-
-		return cls(schema, final_values)
+		return cls(schema, RecordCodec.get(schema).unpack(raw_bytes))
 
 	def __str__(self):
 		attrs = [
@@ -69,29 +128,27 @@ class Record:
 
 
 class FreeListNode:
+	__slots__ = ("record", "next_del")
+
 	def __init__(self, record: Record, next_del=-2):
 		self.record = record
 		self.next_del = next_del
-		self.logger = logger.CustomLogger(f"FREELIST-NODE-{record.schema.table_name}".upper())
 
 	def debug(self):
-		self.logger.debug(f"FreeListNode: {self.record.id} -> {self.next_del}")
+		_get_logger(f"FREELIST-NODE-{self.record.schema.table_name}".upper()).debug(f"FreeListNode: {self.record.id} -> {self.next_del}")
 
 	@classmethod
 	def get_node_size(cls, schema:TableSchema):
 		"""Calculate the size of a FreeListNode"""
-		return struct.calcsize(utils.calculate_record_format(schema.columns)) + 4
+		return RecordCodec.get(schema).node_size
 
 	def pack(self):
-		return self.record.pack() + struct.pack("i", self.next_del)
+		return self.record.pack() + RecordCodec.NEXT_DEL.pack(self.next_del)
 
 	@classmethod
 	def unpack(cls, schema:TableSchema, raw_bytes):
-		record = Record.unpack(schema, raw_bytes[:-4])
-		# Unpack the last 4 bytes as the next_del
-		# struct.calcsize("i") = 4 bytes
-		next_del = struct.unpack("i", raw_bytes[-4:])[0]
-		return cls(record, next_del)
+		codec = RecordCodec.get(schema)
+		return cls(Record(schema, codec.unpack_from(raw_bytes)), codec.next_del_from(raw_bytes))
 
 
 
@@ -101,79 +158,75 @@ class RecordFile:
 	HEADER_FORMAT = "i"  # 4 bytes for the header (pointer to the first free record)
 	HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
 	HEADER:int # persisted header, the first free record
+	MAX_RUN_BYTES = 1 << 20  # largest single read issued by read_many
+	MAX_GAP_BYTES = BufferPool.PAGE_SIZE  # holes up to this size are read through instead of split
 
-	def __init__(self, schema: TableSchema):
+	def __init__(self, schema: TableSchema, use_mmap: bool = False):
 		self.filename = utils.get_record_file_path(schema.table_name)
 		self.schema = schema
-		self.node_size = FreeListNode.get_node_size(schema)
+		self.codec = RecordCodec.get(schema)
+		self.node_size = self.codec.node_size
 		self.logger = logger.CustomLogger(f"RECORDFILE-{schema.table_name}".upper())
 		#self.logger.logger.setLevel(logging.WARNING)
 		
 		if not os.path.exists(self.filename):
 			self.logger.fileNotFound(self.filename)
 			open(self.filename, "wb").close() # create empty file
+		self.pool = BufferPool() # shared pages and open handles, see core/buffer_pool.py
+		self.pool.open(self.filename, use_mmap) # once mapped, every RecordFile of the table reads the mapping
 		self._initialize_file()
 
 	# ----- Private methods -----
 
 	def _initialize_file(self):
-		with open(self.filename, "rb+") as file:
-			header = file.read(self.HEADER_SIZE)
-			if not header:
-				self.logger.fileIsEmpty(self.filename)
-				self.HEADER = -1
-				file.write(struct.pack(self.HEADER_FORMAT, self.HEADER))
-			else:
-				self.HEADER = struct.unpack(self.HEADER_FORMAT, header)[0]
+		header = self.pool.read(self.filename, 0, self.HEADER_SIZE)
+		if not header:
+			self.logger.fileIsEmpty(self.filename)
+			self.HEADER = -1
+			self.pool.write(self.filename, 0, struct.pack(self.HEADER_FORMAT, self.HEADER))
+		else:
+			self.HEADER = struct.unpack(self.HEADER_FORMAT, header)[0]
 
 	def _get_header(self):
+		# read through the pool: other RecordFile instances of the table may have moved it
+		self.HEADER = struct.unpack(self.HEADER_FORMAT, self.pool.read(self.filename, 0, self.HEADER_SIZE))[0]
 		return self.HEADER
 
 	def _set_header(self, header:int):
 		self.HEADER = header
-		with open(self.filename, "r+b") as file:
-			file.seek(0)
-			file.write(struct.pack(self.HEADER_FORMAT, self.HEADER))
-			self.logger.writingHeader(self.filename, header)
+		self.pool.write(self.filename, 0, struct.pack(self.HEADER_FORMAT, self.HEADER))
+		self.logger.writingHeader(self.filename, header)
 
 	def _append_node(self, record: Record) -> int:
 		"""Append a record to the end of the file and return its position"""
-		with open(self.filename, "ab") as file:
-			offset = file.tell() // self.node_size
-			node = FreeListNode(record)
-			file.write(node.pack())
-			self.logger.writingRecord(self.filename, offset, record.values[0], node.next_del)  # should be the first an id
-			return offset
+		offset = self.max_id()
+		node = FreeListNode(record)
+		self.pool.write(self.filename, self.HEADER_SIZE + offset * self.node_size, node.pack())
+		self.logger.writingRecord(self.filename, offset, record.values[0], node.next_del)  # should be the first an id
+		return offset
 
 	def _read_node(self, pos: int) -> FreeListNode:
-		with open(self.filename, "rb") as file:
-			self.logger.readingNode(self.filename, pos)
-			file.seek(self.HEADER_SIZE + (pos * self.node_size))
-			data = file.read(self.node_size)
-			if not data:
-				self.logger.invalidPosition(self.filename, pos)
-				raise Exception(f"Invalid record position: {pos}")
-			node = FreeListNode.unpack(self.schema, data)
-			node.debug()
-			return node
+		self.logger.readingNode(self.filename, pos)
+		data = self.pool.view(self.filename, self.HEADER_SIZE + (pos * self.node_size), self.node_size) if pos >= 0 else b""
+		if len(data) < self.node_size:
+			self.logger.invalidPosition(self.filename, pos)
+			raise Exception(f"Invalid record position: {pos}")
+		node = FreeListNode.unpack(self.schema, data)
+		node.debug()
+		return node
 
 	def _patch_node(self, pos: int, node: FreeListNode):
-		with open(self.filename, "rb+") as file:
-			offset = self.HEADER_SIZE + pos * self.node_size
-			file.seek(offset)
-			if file.tell() != offset:
-				self.logger.invalidPosition(self.filename, pos)
-				raise Exception(f"Invalid record position: {pos}")
-			file.write(node.pack())
-			self.logger.writingRecord(self.filename, pos, node.record.values[0], node.next_del)
+		if pos < 0 or pos >= self.max_id():
+			self.logger.invalidPosition(self.filename, pos)
+			raise Exception(f"Invalid record position: {pos}")
+		self.pool.write(self.filename, self.HEADER_SIZE + pos * self.node_size, node.pack())
+		self.logger.writingRecord(self.filename, pos, node.record.values[0], node.next_del)
 
 	def max_id(self):
-		with open(self.filename, "rb") as file:
-			file.seek(0, os.SEEK_END)
-			size = file.tell()
-			if size == 0:
-				return 0
-			return (size - self.HEADER_SIZE) // self.node_size
+		size = self.pool.size(self.filename)
+		if size == 0:
+			return 0
+		return (size - self.HEADER_SIZE) // self.node_size
 		
 	# ----- Public methods -----
 
@@ -198,6 +251,52 @@ class RecordFile:
 			self.logger.notFoundRecord(self.filename, pos)
 			return None # todo: handle this case
 	
+	def read_many(self, positions) -> dict[int, Record]:
+		"""Read the records at the given positions with a few large reads.
+		Positions are sorted and neighbours merged into contiguous runs, every run
+		is decoded from one buffer. Returns {pos: record} in position order,
+		deleted records are left out"""
+		positions = sorted(set(positions))
+		if not positions:
+			return {}
+		max_id = self.max_id()
+		if positions[0] < 0 or positions[-1] >= max_id:
+			bad = positions[0] if positions[0] < 0 else positions[-1]
+			self.logger.invalidPosition(self.filename, bad)
+			raise Exception(f"Invalid record position: {bad}")
+		max_gap = self.MAX_GAP_BYTES // self.node_size
+		max_run = max(1, self.MAX_RUN_BYTES // self.node_size)
+		result = {}
+		i = 0
+		while i < len(positions):
+			start = positions[i]
+			j = i
+			while j + 1 < len(positions) and positions[j + 1] - positions[j] - 1 <= max_gap and positions[j + 1] - start < max_run:
+				j += 1
+			end = positions[j]
+			buffer = self.pool.view(self.filename, self.HEADER_SIZE + start * self.node_size, (end - start + 1) * self.node_size)
+			for pos in positions[i:j + 1]:
+				offset = (pos - start) * self.node_size
+				if self.codec.next_del_from(buffer, offset) == -2:
+					result[pos] = Record(self.schema, self.codec.unpack_from(buffer, offset))
+			i = j + 1
+		return result
+
+	def scan(self, start: int = 0):
+		"""Sequential scan yielding (pos, record) for the live records from `start`.
+		Nodes are decoded in place from views of MAX_RUN_BYTES, over the mapping
+		when the file is memory mapped"""
+		run = max(1, self.MAX_RUN_BYTES // self.node_size)
+		pos = start
+		while pos < self.max_id():
+			count = min(run, self.max_id() - pos)
+			buffer = self.pool.view(self.filename, self.HEADER_SIZE + pos * self.node_size, count * self.node_size)
+			for i in range(count):
+				offset = i * self.node_size
+				if self.codec.next_del_from(buffer, offset) == -2:
+					yield pos + i, Record(self.schema, self.codec.unpack_from(buffer, offset))
+			pos += count
+
 	def delete(self, pos: int)-> Record:
 		"""Delete a record at the given position and add it to the free list"""
 		self.logger.warning(f"DELETING Record at pos {pos}")
@@ -207,8 +306,17 @@ class RecordFile:
 		self._patch_node(pos, tdel_node)
 		return tdel_node.record
 
+	def flush(self):
+		"""Write the dirty pages of this file back to disk"""
+		self.pool.flush(self.filename)
+
+	def close(self):
+		"""Flush and release the pages and the handle of this file"""
+		self.pool.close(self.filename)
+
 	def clear(self):
 		self.logger.info("Cleaning data, removing files")
+		self.pool.discard(self.filename)
 		os.remove(self.filename)
 
 	def __str__(self):
@@ -0,0 +1,212 @@
+import os, sys
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+from core.conditionschema import Condition, BinaryCondition, BetweenCondition, NotCondition, ConditionColumn, ConditionValue, BinaryOp, RangeCondition, InCondition, ConstantCondition
+from core.schema import DataType, TableSchema
+from core import utils
+
+
+class Rewriter:
+    """Normalizes a WHERE condition before it is planned:
+    NOT is pushed down to the comparisons, the range predicates of an AND-chain on the same column
+    are merged into one RangeCondition, contradictions fold to a ConstantCondition and ORs of
+    equalities on a column become an InCondition.
+    Predicates with unknown columns or values of the wrong type are left untouched, select_condition
+    reports them."""
+    NEGATED = {
+        BinaryOp.EQ: BinaryOp.NEQ,
+        BinaryOp.NEQ: BinaryOp.EQ,
+        BinaryOp.LT: BinaryOp.GE,
+        BinaryOp.GE: BinaryOp.LT,
+        BinaryOp.GT: BinaryOp.LE,
+        BinaryOp.LE: BinaryOp.GT,
+    }
+
+    def __init__(self, table_schema : TableSchema):
+        self.table_schema = table_schema
+
+    def rewrite(self, condition : Condition) -> Condition:
+        return self.simplify(self.push_not(condition, False))
+
+    # ----- Helpers -----
+
+    def valid_column(self, column_name : str, values : list):
+        """Column if it exists, is not POINT and every value has its type, None otherwise"""
+        column = self.table_schema.get_column_by_name(column_name)
+        if column == None or column.data_type == DataType.POINT:
+            return None
+        if any(column.data_type != utils.get_data_type(value) for value in values):
+            return None
+        return column
+
+    @staticmethod
+    def chain(op : BinaryOp, conditions : list[Condition]) -> Condition:
+        condition = conditions[0]
+        for other in conditions[1:]:
+            condition = BinaryCondition(condition, op, other)
+        return condition
+
+    @staticmethod
+    def flatten(op : BinaryOp, condition : Condition) -> list[Condition]:
+        if type(condition) == BinaryCondition and condition.op == op:
+            return Rewriter.flatten(op, condition.left) + Rewriter.flatten(op, condition.right)
+        return [condition]
+
+    # ----- NOT pushdown -----
+
+    def push_not(self, condition : Condition, negate : bool) -> Condition:
+        condition_type = type(condition)
+        if condition_type == NotCondition:
+            return self.push_not(condition.condition, not negate)
+        if condition_type == BinaryCondition and condition.op in [BinaryOp.AND, BinaryOp.OR]:
+            op = condition.op
+            if negate: # De Morgan
+                op = BinaryOp.OR if op == BinaryOp.AND else BinaryOp.AND
+            return BinaryCondition(self.push_not(condition.left, negate), op, self.push_not(condition.right, negate))
+        if not negate:
+            return condition
+        if condition_type == ConstantCondition:
+            return ConstantCondition(not condition.value)
+        if condition_type == BinaryCondition and condition.op in self.NEGATED:
+            if self.valid_column(condition.left.column_name, [condition.right.value]):
+                return BinaryCondition(condition.left, self.NEGATED[condition.op], condition.right)
+        if condition_type == BetweenCondition:
+            if self.valid_column(condition.left.column_name, [condition.mid.value, condition.right.value]):
+                return BinaryCondition(
+                    BinaryCondition(condition.left, BinaryOp.LT, condition.mid), BinaryOp.OR,
+                    BinaryCondition(condition.left, BinaryOp.GT, condition.right))
+        return NotCondition(condition)
+
+    # ----- Folding and merging -----
+
+    def simplify(self, condition : Condition) -> Condition:
+        condition_type = type(condition)
+        if condition_type == NotCondition:
+            inner = self.simplify(condition.condition)
+            if type(inner) == ConstantCondition:
+                return ConstantCondition(not inner.value)
+            return NotCondition(inner)
+        if condition_type == BinaryCondition and condition.op == BinaryOp.AND:
+            return self.simplify_and([self.simplify(child) for child in self.flatten(BinaryOp.AND, condition)])
+        if condition_type == BinaryCondition and condition.op == BinaryOp.OR:
+            return self.simplify_or([self.simplify(child) for child in self.flatten(BinaryOp.OR, condition)])
+        return condition
+
+    def bounds(self, condition : Condition):
+        """(column, lo, lo_inclusive, hi, hi_inclusive) of a range predicate, None for other predicates"""
+        condition_type = type(condition)
+        if condition_type == BinaryCondition and condition.op in [BinaryOp.EQ, BinaryOp.LT, BinaryOp.LE, BinaryOp.GT, BinaryOp.GE]:
+            column = self.valid_column(condition.left.column_name, [condition.right.value])
+            value = condition.right.value
+            match condition.op:
+                case BinaryOp.EQ:
+                    return column, value, True, value, True
+                case BinaryOp.LT:
+                    return column, None, True, value, False
+                case BinaryOp.LE:
+                    return column, None, True, value, True
+                case BinaryOp.GT:
+                    return column, value, False, None, True
+                case BinaryOp.GE:
+                    return column, value, True, None, True
+        elif condition_type == BetweenCondition:
+            column = self.valid_column(condition.left.column_name, [condition.mid.value, condition.right.value])
+            return column, condition.mid.value, True, condition.right.value, True
+        elif condition_type == RangeCondition:
+            lo = condition.lo.value if condition.lo else None
+            hi = condition.hi.value if condition.hi else None
+            column = self.valid_column(condition.left.column_name, [value for value in [lo, hi] if value != None])
+            return column, lo, condition.lo_inclusive, hi, condition.hi_inclusive
+        return None
+
+    @staticmethod
+    def merge(group : list) -> tuple:
+        """Tightest (lo, lo_inclusive, hi, hi_inclusive) of the bounds of several range predicates"""
+        lo, lo_inclusive, hi, hi_inclusive = None, True, None, True
+        for _, c_lo, c_lo_inclusive, c_hi, c_hi_inclusive in group:
+            if c_lo != None and (lo == None or c_lo > lo or (c_lo == lo and not c_lo_inclusive)):
+                lo, lo_inclusive = c_lo, c_lo_inclusive
+            if c_hi != None and (hi == None or c_hi < hi or (c_hi == hi and not c_hi_inclusive)):
+                hi, hi_inclusive = c_hi, c_hi_inclusive
+        return lo, lo_inclusive, hi, hi_inclusive
+
+    def simplify_and(self, conjuncts : list[Condition]) -> Condition:
+        if any(type(c) == ConstantCondition and not c.value for c in conjuncts):
+            return ConstantCondition(False)
+        conjuncts = [c for c in conjuncts if type(c) != ConstantCondition]
+        ranges = {} # column -> bounds of its range predicates
+        for c in conjuncts:
+            bounds = self.bounds(c)
+            if bounds and bounds[0]:
+                ranges.setdefault(bounds[0].name, []).append(bounds)
+        merged = {name: self.merge(group) for name, group in ranges.items()}
+        for lo, lo_inclusive, hi, hi_inclusive in merged.values():
+            if lo != None and hi != None and (lo > hi or (lo == hi and not (lo_inclusive and hi_inclusive))):
+                return ConstantCondition(False)
+        result = []
+        emitted = set()
+        for c in conjuncts:
+            bounds = self.bounds(c)
+            if bounds and bounds[0] and len(ranges[bounds[0].name]) > 1:
+                name = bounds[0].name
+                if name not in emitted: # the merged range takes the place of the first predicate on the column
+                    result.append(self.range_condition(name, *merged[name]))
+                    emitted.add(name)
+                continue
+            if type(c) == BinaryCondition and c.op == BinaryOp.NEQ and c.left.column_name in merged and \
+                    self.valid_column(c.left.column_name, [c.right.value]):
+                value = c.right.value
+                lo, lo_inclusive, hi, hi_inclusive = merged[c.left.column_name]
+                if lo != None and lo == hi and value == lo:
+                    return ConstantCondition(False)
+                if (lo != None and (value < lo or (value == lo and not lo_inclusive))) or \
+                        (hi != None and (value > hi or (value == hi and not hi_inclusive))):
+                    continue # already excluded by the range
+            result.append(c)
+        if not result:
+            return ConstantCondition(True)
+        return self.chain(BinaryOp.AND, result)
+
+    def range_condition(self, column_name : str, lo, lo_inclusive : bool, hi, hi_inclusive : bool) -> Condition:
+        column = ConditionColumn(column_name)
+        if lo != None and lo == hi:
+            return BinaryCondition(column, BinaryOp.EQ, ConditionValue(lo))
+        return RangeCondition(column, ConditionValue(lo) if lo != None else None, ConditionValue(hi) if hi != None else None, lo_inclusive, hi_inclusive)
+
+    def simplify_or(self, disjuncts : list[Condition]) -> Condition:
+        if any(type(c) == ConstantCondition and c.value for c in disjuncts):
+            return ConstantCondition(True)
+        disjuncts = [c for c in disjuncts if type(c) != ConstantCondition]
+        if not disjuncts:
+            return ConstantCondition(False)
+        # equalities per column, in order of first appearance
+        points = {}
+        for c in disjuncts:
+            values = self.points(c)
+            if values != None:
+                points.setdefault(c.left.column_name, []).extend(values)
+        result = []
+        for c in disjuncts:
+            values = self.points(c)
+            if values != None and c.left.column_name in points:
+                name = c.left.column_name
+                values = list(dict.fromkeys(points.pop(name)))
+                if len(values) == 1:
+                    result.append(BinaryCondition(ConditionColumn(name), BinaryOp.EQ, ConditionValue(values[0])))
+                else:
+                    result.append(InCondition(ConditionColumn(name), [ConditionValue(value) for value in values]))
+            elif values == None:
+                result.append(c)
+        return self.chain(BinaryOp.OR, result)
+
+    def points(self, condition : Condition) -> list | None:
+        """Values of an equality or IN predicate on a valid column, None for other predicates"""
+        if type(condition) == BinaryCondition and condition.op == BinaryOp.EQ:
+            values = [condition.right.value]
+        elif type(condition) == InCondition:
+            values = [value.value for value in condition.values]
+        else:
+            return None
+        return values if self.valid_column(condition.left.column_name, values) else None
@@ -0,0 +1,290 @@
+import os, sys
+import struct
+import weakref
+import subprocess
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+try:
+    import numpy as np
+except ImportError:
+    subprocess.check_call([sys.executable, "-m", "pip", "install", "numpy"])
+    import numpy as np
+
+from core.conditionschema import Condition, BinaryCondition, BetweenCondition, NotCondition, BooleanColumn, BinaryOp, RangeCondition, InCondition, ConstantCondition
+from core.schema import DataType, TableSchema
+from core.record_file import RecordFile, RecordCodec
+from core import utils
+
+_dtypes = weakref.WeakKeyDictionary()  # RecordCodec -> numpy dtype of a FreeListNode
+
+def record_dtype(schema: TableSchema) -> np.dtype:
+    """Structured dtype of a FreeListNode of the table: field c<i> per column and the trailing next_del.
+    Offsets follow the native alignment of calculate_record_format."""
+    codec = RecordCodec.get(schema)
+    dtype = _dtypes.get(codec)
+    if dtype is None:
+        names, formats, offsets = [], [], []
+        prefix = ""
+        for i, col in enumerate(schema.columns):
+            fmt = utils.calculate_record_format([col])
+            offsets.append(struct.calcsize(prefix + fmt) - struct.calcsize(fmt))
+            prefix += fmt
+            names.append(f"c{i}")
+            match col.data_type:
+                case DataType.INT:
+                    formats.append(np.dtype("=i4"))
+                case DataType.FLOAT:
+                    formats.append(np.dtype("=f4"))
+                case DataType.BOOL:
+                    formats.append(np.dtype("?"))
+                case DataType.VARCHAR:
+                    formats.append(np.dtype(f"S{col.varchar_length}"))
+                case DataType.POINT:
+                    formats.append(np.dtype(("=f4", (2,))))
+        names.append("next_del")
+        formats.append(np.dtype("=i4"))
+        offsets.append(codec.size)
+        dtype = np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": codec.node_size})
+        _dtypes[codec] = dtype
+    return dtype
+
+
+class VectorScan:
+    """Evaluates whole condition trees over the heap file of a table as numpy boolean masks.
+    The file is viewed through its memory map as an array of FreeListNode, CHUNK_ROWS rows at a time."""
+    CHUNK_ROWS = 1 << 16
+    INT_MIN, INT_MAX = np.iinfo(np.int64).min, np.iinfo(np.int64).max
+
+    def __init__(self, schema: TableSchema):
+        self.schema = schema
+        self.record_file = RecordFile(schema, use_mmap=True)
+        self.dtype = record_dtype(schema)
+        self.fields = {col.name: (f"c{i}", col) for i, col in enumerate(schema.columns)}
+
+    def error(self, error : str):
+        raise RuntimeError(error)
+
+    def chunks(self):
+        """Yields (first position, structured array) over the whole file, zero-copy"""
+        rf = self.record_file
+        total = rf.max_id()
+        for start in range(0, total, self.CHUNK_ROWS):
+            count = min(self.CHUNK_ROWS, total - start)
+            buffer = rf.pool.view(rf.filename, rf.HEADER_SIZE + start * rf.node_size, count * rf.node_size)
+            yield start, np.frombuffer(buffer, dtype=self.dtype, count=count)
+
+    def filter(self, condition: Condition, limit: int = None) -> list[int]:
+        """Positions of the live records matching the condition, in one sequential pass"""
+        return self.filter_many([condition], limit)[0]
+
+    def filter_many(self, conditions: list[Condition], limit: int = None) -> list[list[int]]:
+        """Positions matching each condition, all of them evaluated in the same sequential pass.
+        With a limit only the first matches of each condition are kept and the pass stops once all have them."""
+        positions = [[] for _ in conditions]
+        for start, rows in self.chunks():
+            live = rows["next_del"] == -2
+            for i, condition in enumerate(conditions):
+                if limit != None and len(positions[i]) >= limit:
+                    continue
+                mask = self.mask(rows, condition) & live
+                positions[i].extend((np.flatnonzero(mask)[:limit] + start).tolist())
+            if limit != None and all(len(p) >= limit for p in positions):
+                break
+        return [p[:limit] for p in positions]
+
+    def filter_positions(self, condition: Condition, positions: list[int]) -> list[int]:
+        """The given positions (sorted, in range) whose live records match the condition"""
+        if len(positions) == 0:
+            return []
+        positions = np.asarray(positions, dtype=np.int64)
+        rows = self.rows_at(positions)
+        mask = self.mask(rows, condition) & (rows["next_del"] == -2)
+        return positions[mask].tolist()
+
+    def sort_positions(self, column_name: str, positions: list[int], reverse: bool = False) -> list[int]:
+        """The given positions (in range) ordered by the value of a column, ties in position order"""
+        if not positions:
+            return []
+        positions = np.asarray(positions, dtype=np.int64)
+        values, _ = self._column(self.rows_at(positions), column_name)
+        order = np.argsort(values, kind="stable")
+        return positions[order[::-1] if reverse else order].tolist()
+
+    def rows_at(self, positions: np.ndarray) -> np.ndarray:
+        """Copy of the rows at the given positions (in range), gathered from the memory map"""
+        rf = self.record_file
+        total = rf.max_id()
+        rows = np.frombuffer(rf.pool.view(rf.filename, rf.HEADER_SIZE, total * rf.node_size), dtype=self.dtype, count=total)
+        return rows[positions]
+
+    def rows_from(self, column_names: list[str], tuples: list[tuple]) -> np.ndarray:
+        """Live rows holding the given values of some columns (the covered values of index entries) and zeros
+        in the others, so conditions on those columns can be evaluated without the heap file"""
+        rows = np.zeros(len(tuples), dtype=self.dtype)
+        rows["next_del"] = -2
+        for j, name in enumerate(column_names):
+            field, col = self.fields[name]
+            values = [values[j] for values in tuples]
+            rows[field] = [value.encode() for value in values] if col.data_type == DataType.VARCHAR else values
+        return rows
+
+    def count(self, condition: Condition = None, positions = None) -> int:
+        """Number of live records matching the condition (all of them if None), or live records among the given
+        positions (sorted, in range); no position list or Record is built"""
+        total = 0
+        for rows in self._parts(positions):
+            mask = rows["next_del"] == -2
+            if condition != None:
+                mask &= self.mask(rows, condition)
+            total += int(np.count_nonzero(mask))
+        return total
+
+    def aggregate(self, column_names: list[str], condition: Condition = None, positions = None) -> dict[str, list]:
+        """[count, sum, min, max] of each column over the live records matching the condition, or over the given
+        positions (sorted, in range). Accumulated chunk by chunk on the numpy columns, no Record is built."""
+        totals = {name: [0, 0, None, None] for name in column_names}
+        for rows in self._parts(positions):
+            mask = rows["next_del"] == -2
+            if condition != None:
+                mask &= self.mask(rows, condition)
+            rows = rows[mask]
+            if len(rows) == 0:
+                continue
+            for name in column_names:
+                values, col = self._column(rows, name)
+                total = totals[name]
+                total[0] += len(values)
+                if col.data_type in (DataType.INT, DataType.FLOAT):
+                    total[1] += values.sum().item()
+                if col.data_type == DataType.VARCHAR: # no min/max ufunc for bytes
+                    values = np.sort(values)
+                    low, high = values[0], values[-1]
+                else:
+                    low, high = values.min(), values.max()
+                total[2] = low if total[2] is None else min(total[2], low)
+                total[3] = high if total[3] is None else max(total[3], high)
+        for name, total in totals.items():
+            _, col = self.fields[name]
+            total[2:] = [self.python_value(col, value) for value in total[2:]]
+        return totals
+
+    def _parts(self, positions = None):
+        """Row arrays of the given positions, or of the whole file chunk by chunk if None"""
+        if positions is None:
+            return (rows for _, rows in self.chunks())
+        return [self.rows_at(np.asarray(positions, dtype=np.int64))] if len(positions) else []
+
+    @staticmethod
+    def python_value(col, value):
+        """A value of _column as the records decode it"""
+        if value is None:
+            return None
+        match col.data_type:
+            case DataType.VARCHAR:
+                return value.decode().strip("\x00")
+            case DataType.FLOAT:
+                return round(float(value), 6)
+        return value.item() if hasattr(value, "item") else value
+
+    def values(self, column_name: str) -> np.ndarray:
+        """Column of every live record, converted as for comparisons (VARCHAR as utf-8 bytes)"""
+        parts = []
+        for _, rows in self.chunks():
+            values, _ = self._column(rows, column_name)
+            parts.append(values[rows["next_del"] == -2])
+        if not parts:
+            return self._column(np.zeros(0, dtype=self.dtype), column_name)[0]
+        return np.concatenate(parts)
+
+    # ----- Mask evaluation -----
+
+    def mask(self, rows: np.ndarray, condition: Condition) -> np.ndarray:
+        condition_type = type(condition)
+        if condition_type == BinaryCondition:
+            match condition.op:
+                case BinaryOp.AND:
+                    return self.mask(rows, condition.left) & self.mask(rows, condition.right)
+                case BinaryOp.OR:
+                    return self.mask(rows, condition.left) | self.mask(rows, condition.right)
+            return self._compare(rows, condition.left.column_name, condition.op, condition.right.value)
+        elif condition_type == BetweenCondition:
+            values, col = self._column(rows, condition.left.column_name)
+            return (values >= self._value(col, condition.mid.value)) & (values <= self._value(col, condition.right.value))
+        elif condition_type == RangeCondition:
+            values, col = self._column(rows, condition.left.column_name)
+            mask = np.ones(len(rows), dtype=bool)
+            if condition.lo != None:
+                lo = self._value(col, condition.lo.value)
+                mask &= (values >= lo) if condition.lo_inclusive else (values > lo)
+            if condition.hi != None:
+                hi = self._value(col, condition.hi.value)
+                mask &= (values <= hi) if condition.hi_inclusive else (values < hi)
+            return mask
+        elif condition_type == InCondition:
+            values, col = self._column(rows, condition.left.column_name)
+            return np.isin(values, [self._value(col, value.value) for value in condition.values])
+        elif condition_type == ConstantCondition:
+            return np.full(len(rows), condition.value, dtype=bool)
+        elif condition_type == NotCondition:
+            return ~self.mask(rows, condition.condition)
+        elif condition_type == BooleanColumn:
+            values, _ = self._column(rows, condition.column_name)
+            return values.copy()
+        self.error("invalid condition")
+
+    def _column(self, rows: np.ndarray, column_name: str):
+        """Column of the chunk converted so numpy compares it like the decoded records, and its Column"""
+        if column_name not in self.fields:
+            self.error(f"column '{column_name}' doesn't exist in table '{self.schema.table_name}'")
+        field, col = self.fields[column_name]
+        match col.data_type:
+            case DataType.INT:
+                return rows[field].astype(np.int64), col
+            case DataType.FLOAT | DataType.POINT:
+                return np.round(rows[field].astype(np.float64), 6), col
+            case _:
+                return rows[field], col
+
+    def _value(self, col, value):
+        """Query value converted to the representation of _column"""
+        match col.data_type:
+            case DataType.INT:
+                return min(max(value, self.INT_MIN), self.INT_MAX)
+            case DataType.FLOAT:
+                return float(value)
+            case DataType.VARCHAR: # utf-8 keeps the code point order of str
+                return value.encode()
+        return value
+
+    def _compare(self, rows: np.ndarray, column_name: str, op: BinaryOp, value) -> np.ndarray:
+        values, col = self._column(rows, column_name)
+        value = self._value(col, value)
+        if col.data_type == DataType.POINT:
+            x, y = values[:, 0], values[:, 1]
+            match op:
+                case BinaryOp.EQ:
+                    return (x == value[0]) & (y == value[1])
+                case BinaryOp.NEQ:
+                    return (x != value[0]) | (y != value[1])
+                case BinaryOp.WR:
+                    return (x >= value[0]) & (y >= value[1]) & (x <= value[2]) & (y <= value[3])
+                case BinaryOp.WC:
+                    return (x - value[0]) ** 2 + (y - value[1]) ** 2 <= value[2] ** 2
+                case _:
+                    self.error("operation not supported for POINT type")
+        match op:
+            case BinaryOp.EQ:
+                return values == value
+            case BinaryOp.NEQ:
+                return values != value
+            case BinaryOp.LT:
+                return values < value
+            case BinaryOp.GT:
+                return values > value
+            case BinaryOp.LE:
+                return values <= value
+            case BinaryOp.GE:
+                return values >= value
+        self.error(f"operation {op} not supported on scans")
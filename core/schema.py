@@ -12,6 +12,7 @@ class DataType(Enum):
     DATE = auto()
     BOOL = auto()
     POINT = auto()
+    KEY = auto() # encoded key of a composite index, never the type of a table column
 
     def __str__(self):
         return self.name
@@ -37,10 +38,29 @@ class Column:
         self.index_name = index_name
         self.varchar_length = varchar_length
 
+class IndexSchema:
+    # index on a tuple of columns, keyed by the order-preserving encoding of their values (indexes.composite),
+    # include columns are carried in the leaf entries so queries on them never read the records
+    def __init__(self, index_name : str = None, column_names : list[str] = None, index_type : IndexType = IndexType.BTREE, include : list[str] = None):
+        self.index_name = index_name
+        self.column_names = column_names if column_names else []
+        self.index_type = index_type
+        self.include = include if include else []
+
+    def key_name(self) -> str:
+        # '-' and '+' can't be part of a column name, the key never clashes with a column
+        include = getattr(self, "include", [])
+        return "-".join(self.column_names) + ("+" + "-".join(include) if include else "")
+
+    def covered_columns(self) -> list[str]:
+        return self.column_names + getattr(self, "include", []) # indexes saved before INCLUDE existed have none
+
 class TableSchema:
     def __init__(self, table_name: str = None, columns: list[Column] = None):
         self.table_name = table_name.lower() if table_name else None
         self.columns = columns if columns else []
+        self.statistics = None # TableStatistics of the last ANALYZE
+        self.composite_indexes = [] # IndexSchema of every index on more than one column or with INCLUDE columns
 
     def error(self, error : str):
         raise RuntimeError(error)
@@ -53,6 +73,9 @@ class TableSchema:
 
     def get_column_by_name(self, name: str):
         return next((col for col in self.columns if col.name == name), None)
+
+    def get_composite_indexes(self):
+        return getattr(self, "composite_indexes", []) # schemas saved before composite indexes existed have none
     
     def get_indexes(self):
         indexes = {}
@@ -101,8 +124,34 @@ class TableSchema:
         # Para asegurarnos de que la serialización sea adecuada
         return f"TableSchema(table_name={self.table_name}, columns={self.columns})"
 
+class AggregateFunction(Enum):
+    COUNT = auto()
+    SUM = auto()
+    AVG = auto()
+    MIN = auto()
+    MAX = auto()
+
+    def __str__(self):
+        return self.name
+
+class Aggregate:
+    def __init__(self, function : AggregateFunction, column_name : str = None):
+        self.function = function
+        self.column_name = column_name # None for COUNT(*)
+
+    def __str__(self):
+        return f"{self.function}({self.column_name if self.column_name != None else '*'})"
+
+class JoinSchema:
+    # equi-join of the FROM table with table_name on left_column = right_column, columns may be qualified as table.column
+    def __init__(self, table_name : str = None, left_column : str = None, right_column : str = None):
+        self.table_name = table_name
+        self.left_column = left_column
+        self.right_column = right_column
+
 class SelectSchema:
-    def __init__(self, table_name: str = None, condition_schema: ConditionSchema = None, all : bool = None, column_list: list[str] = None, order_by : str = None, asc : bool = True, limit : int = None):
+    # column_list holds column names and Aggregate items, in the order of the select list
+    def __init__(self, table_name: str = None, condition_schema: ConditionSchema = None, all : bool = None, column_list: list = None, order_by : str = None, asc : bool = True, limit : int = None, group_by : list[str] = None, join : JoinSchema = None):
         self.table_name = table_name
         self.condition_schema = condition_schema
         self.all = all
@@ -110,6 +159,11 @@ class SelectSchema:
         self.order_by = order_by
         self.asc = asc
         self.limit = limit
+        self.group_by = group_by if group_by else []
+        self.join = join
+
+    def aggregates(self) -> list[Aggregate]:
+        return [item for item in self.column_list if isinstance(item, Aggregate)]
 
 class DeleteSchema:
     def __init__(self, table_name : str = None, condition_schema : ConditionSchema = None):
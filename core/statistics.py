@@ -0,0 +1,108 @@
+import os, sys
+from bisect import bisect_left, bisect_right
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+from core.schema import DataType, TableSchema
+from core.conditionschema import BinaryOp
+from core.scan import VectorScan
+import numpy as np
+
+
+class ColumnStatistics:
+    """Distinct count, min/max and equi-depth histogram of one column.
+    bounds holds BUCKETS + 1 values: bucket i covers [bounds[i], bounds[i + 1]] with the same number of rows."""
+    BUCKETS = 32
+
+    def __init__(self, distinct : int = 0, min = None, max = None, bounds : list = None):
+        self.distinct = distinct
+        self.min = min
+        self.max = max
+        self.bounds = bounds if bounds else []
+
+    @staticmethod
+    def _plain(value):
+        if isinstance(value, bytes):
+            return value.decode()
+        return value.item() if hasattr(value, "item") else value
+
+    @classmethod
+    def from_values(cls, values : np.ndarray) -> "ColumnStatistics":
+        if len(values) == 0:
+            return cls()
+        values = np.sort(values)
+        quantiles = np.linspace(0, len(values) - 1, cls.BUCKETS + 1).round().astype(np.int64)
+        return cls(len(np.unique(values)), cls._plain(values[0]), cls._plain(values[-1]), [cls._plain(values[i]) for i in quantiles])
+
+    def fraction_below(self, value, inclusive : bool) -> float:
+        """Estimated fraction of rows with column < value (<= if inclusive)"""
+        if not self.bounds:
+            return 0.0
+        if value < self.min or (value == self.min and not inclusive):
+            return 0.0
+        if value > self.max or (value == self.max and inclusive):
+            return 1.0
+        buckets = len(self.bounds) - 1
+        i = bisect_right(self.bounds, value) if inclusive else bisect_left(self.bounds, value)
+        i = min(max(i, 1), buckets)
+        lo, hi = self.bounds[i - 1], self.bounds[i]
+        inside = 0.5
+        if isinstance(value, (int, float)) and hi != lo: # numeric columns interpolate inside the bucket
+            inside = min(max((value - lo) / (hi - lo), 0.0), 1.0)
+        return (i - 1 + inside) / buckets
+
+    def equal_fraction(self, value) -> float:
+        if not self.bounds or value < self.min or value > self.max:
+            return 0.0
+        # a value covering several bounds is a frequent one, the histogram tells how frequent
+        repeated = bisect_right(self.bounds, value) - bisect_left(self.bounds, value)
+        return max(1.0 / max(self.distinct, 1), (repeated - 1) / (len(self.bounds) - 1))
+
+
+class TableStatistics:
+    """Statistics gathered by ANALYZE, stored with the table schema in metadata.dat"""
+    def __init__(self, row_count : int = 0, columns : dict[str, ColumnStatistics] = None):
+        self.row_count = row_count
+        self.columns = columns if columns else {}
+
+    def selectivity(self, column_name : str, op : BinaryOp, value) -> float | None:
+        """Estimated fraction of rows matching `column op value`, None if unknown"""
+        stats = self.columns.get(column_name)
+        if stats == None or self.row_count == 0:
+            return None
+        match op:
+            case BinaryOp.EQ:
+                return stats.equal_fraction(value)
+            case BinaryOp.NEQ:
+                return 1.0 - stats.equal_fraction(value)
+            case BinaryOp.LT:
+                return stats.fraction_below(value, False)
+            case BinaryOp.LE:
+                return stats.fraction_below(value, True)
+            case BinaryOp.GT:
+                return 1.0 - stats.fraction_below(value, True)
+            case BinaryOp.GE:
+                return 1.0 - stats.fraction_below(value, False)
+        return None
+
+    def range_selectivity(self, column_name : str, lo, hi, lo_inclusive : bool = True, hi_inclusive : bool = True) -> float | None:
+        """Estimated fraction of rows with lo <= column <= hi (strict on exclusive bounds, None bounds are open)"""
+        stats = self.columns.get(column_name)
+        if stats == None or self.row_count == 0:
+            return None
+        below_hi = stats.fraction_below(hi, hi_inclusive) if hi != None else 1.0
+        below_lo = stats.fraction_below(lo, not lo_inclusive) if lo != None else 0.0
+        return max(0.0, below_hi - below_lo)
+
+
+def analyze(table_schema : TableSchema) -> TableStatistics:
+    """Collect the statistics of every column in one pass per column over the heap file"""
+    scan = VectorScan(table_schema)
+    statistics = TableStatistics()
+    for column in table_schema.columns:
+        values = scan.values(column.name)
+        statistics.row_count = len(values)
+        if column.data_type != DataType.POINT:
+            statistics.columns[column.name] = ColumnStatistics.from_values(values)
+    return statistics
@@ -17,6 +17,8 @@ def calculate_record_format(columns: list[Column]):
             fmt += "?"
         elif col.data_type == DataType.POINT:
             fmt += "ff"
+        elif col.data_type == DataType.KEY:
+            fmt += f"{col.varchar_length}s"
         else:
             raise NotImplementedError(f"Unsupported type {col.data_type}")
     return fmt
@@ -50,6 +52,8 @@ def get_empty_value(column: Column):
         return ""  # representamos vacío como string vacío
     elif column.data_type == DataType.BOOL:
         return False
+    elif column.data_type == DataType.KEY:
+        return b""
     else:
         raise NotImplementedError(f"Unsupported type {column.data_type}")
 
@@ -89,9 +93,19 @@ def calculate_column_format(column: Column)->str:
         return "?"
     elif column.data_type == DataType.POINT:
             fmt += "ff"
+    elif column.data_type == DataType.KEY:
+        return f"{column.varchar_length}s"
     else:
         raise NotImplementedError(f"Unsupported type {column.data_type}")
 
+def before_range(key, lo, lo_inclusive: bool = True) -> bool:
+    """True if key is below the lower bound of a scan (None is unbounded)"""
+    return lo is not None and (key < lo or (key == lo and not lo_inclusive))
+
+def after_range(key, hi, hi_inclusive: bool = True) -> bool:
+    """True if key is above the upper bound of a scan (None is unbounded)"""
+    return hi is not None and (key > hi or (key == hi and not hi_inclusive))
+
 def pad_str(s:str, length:int):
     return s.encode().ljust(length, b'\x00')
 
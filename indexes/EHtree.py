@@ -96,18 +96,20 @@ class Bucket:
             return self.fm.load_bucket(self.next_bucket_id).search(key)
         return None
 
-    def delete(self, key) -> bool:
+    def delete(self, key, pointer=None) -> bool:
+        """Borra el Record de key (el que apunta a pointer, si se indica)"""
         self.load()
         for i, r in enumerate(self.records):
-            if r.key == key:
+            if r.key == key and (pointer is None or r.pointer == pointer):
                 del self.records[i]
                 self.save()
                 return True
         if self.next_bucket_id != -1:
-            deleted = self.fm.load_bucket(self.next_bucket_id).delete(key)
+            deleted = self.fm.load_bucket(self.next_bucket_id).delete(key, pointer)
             if deleted:
                 # si el overflow quedó vacío, enlazamos su siguiente y reciclamos
                 ov = self.fm.load_bucket(self.next_bucket_id)
+                ov.load()
                 if not ov.records:
                     self.next_bucket_id = ov.next_bucket_id
                     self.fm.delete_bucket(ov.bucket_id)
@@ -211,6 +213,7 @@ class FileManager:
 # exporta DBManager
 # -----------------------
 class ExtendibleHashTree:
+    ORDERED = False # scan has to sort ranges in memory
 
     def __init__(self,
                  schema: TableSchema,
@@ -259,6 +262,8 @@ class ExtendibleHashTree:
     def _hash_bits(self, key) -> str:
         if isinstance(key, str):
             idx = int.from_bytes(hashlib.sha256(key.encode()).digest(), byteorder='little') % self.M
+        elif isinstance(key, bytes): # composite keys, hash() of bytes changes between processes
+            idx = int.from_bytes(hashlib.sha256(key).digest(), byteorder='little') % self.M
         else:
             idx = hash(key) % self.M
         return format(idx, f'0{self.max_depth}b')
@@ -283,16 +288,30 @@ class ExtendibleHashTree:
         if b.insert(rec):
             return
         # overflow o split
-        if leaf.level >= self.max_depth:
+        if self._unsplittable(leaf, b.get_all() + [rec]):
             # encadenamos overflow
-            ov = self.fm.create_bucket()
-            b.load()
-            b.next_bucket_id = ov.bucket_id
-            b.save()
-            ov.insert(rec)
+            self._append(b, rec)
             return
         self._split_leaf(leaf, new_rec=rec)
 
+    def _unsplittable(self, leaf: TreeNode, recs: list[Record]) -> bool:
+        # a split can't separate records with the same key, they go to overflow buckets
+        return leaf.level >= self.max_depth or len({r.key for r in recs}) <= 1
+
+    def _append(self, bucket: Bucket, rec: Record):
+        # inserta al final de la cadena, enlazando un bucket de overflow si todos están llenos
+        if bucket.insert(rec):
+            return
+        last = bucket
+        last.load()
+        while last.next_bucket_id != -1:
+            last = self.fm.load_bucket(last.next_bucket_id)
+            last.load()
+        ov = self.fm.create_bucket()
+        last.next_bucket_id = ov.bucket_id
+        last.save()
+        ov.insert(rec)
+
     def _split_leaf(self, leaf: TreeNode, new_rec: Record=None, recs_list=None):
         # recolección
         if recs_list is None:
@@ -319,13 +338,13 @@ class ExtendibleHashTree:
         rc.bucket_id = b1.bucket_id
 
         # rellenar o resplit recursivamente
-        if len(r0) <= self.bucket_capacity:
-            for x in r0: b0.insert(x)
+        if len(r0) <= self.bucket_capacity or self._unsplittable(lc, r0):
+            for x in r0: self._append(b0, x)
         else:
             self._split_leaf(lc, recs_list=r0)
 
-        if len(r1) <= self.bucket_capacity:
-            for x in r1: b1.insert(x)
+        if len(r1) <= self.bucket_capacity or self._unsplittable(rc, r1):
+            for x in r1: self._append(b1, x)
         else:
             self._split_leaf(rc, recs_list=r1)
 
@@ -333,41 +352,44 @@ class ExtendibleHashTree:
 
     def search(self, key) -> list[int]:
         """
-        Igualdad exacta; devuelve lista (vacía o con un solo ptr).
+        Igualdad exacta; devuelve todos los punteros con esa clave.
         """
         self.logger.warning(f"SEARCHING: {key}")
-        bits = self._hash_bits(key)
-        leaf = self._find_leaf_node(bits)
-        cosa = self.fm.load_bucket(leaf.bucket_id)
-        r    = cosa.search(key)
-        return [] if r is None else [r.pointer]
+        return list(self.scan(key, key))
 
     def rangeSearch(self, lo, hi) -> list[int]:
         """
         Busca todos los registros con lo <= key <= hi.
         """
-
-        if(lo == None):
-            lo = utils.get_min_value(self.column)
-        if(hi == None):
-            hi = utils.get_max_value(self.column)
         self.logger.warning(f"RANGE-SEARCH: {lo}, {hi}")
-        out = []
-        # recorro todos y filtro en memoria:
-        for rec in self.get_all():
-            if lo <= rec.key <= hi:
-                out.append(rec.pointer)
-        return out
+        return list(self.scan(lo, hi))
+
+    def scan(self, lo=None, hi=None, lo_inclusive: bool = True, hi_inclusive: bool = True,
+             reverse: bool = False, limit: int = None):
+        """
+        Punteros con clave entre lo y hi (None = sin límite) en orden de clave.
+        La igualdad lee un solo bucket; los rangos recorren todos los buckets y ordenan en memoria.
+        """
+        if lo is not None and lo == hi and lo_inclusive and hi_inclusive:
+            leaf = self._find_leaf_node(self._hash_bits(lo))
+            recs = [r for r in self.fm.load_bucket(leaf.bucket_id).get_all() if r.key == lo]
+        else:
+            recs = [r for r in self.get_all()
+                    if not utils.before_range(r.key, lo, lo_inclusive) and not utils.after_range(r.key, hi, hi_inclusive)]
+            recs.sort(key=lambda r: r.key, reverse=reverse)
+        for r in recs[:limit]:
+            yield r.pointer
 
-    def delete(self, key) -> None:
+    def delete(self, key, pointer=None) -> None:
         """
-        Elimina (key) si existe. No reequilibra profundidad de árbol.
+        Elimina (key) si existe; con pointer, la entrada de ese registro y no
+        la de otro con la misma key. No reequilibra profundidad de árbol.
         """
         self.logger.warning(f"DELETING: {key}")
         bits = self._hash_bits(key)
         leaf = self._find_leaf_node(bits)
         b    = self.fm.load_bucket(leaf.bucket_id)
-        if b.delete(key):
+        if b.delete(key, pointer):
             # opcional: podríamos colapsar hojas vacías (_merge_leaf)
             self._save_tree()
             return
@@ -1,9 +1,10 @@
 # indices/isam.py
 
-import os, struct, math, re
+import os, struct, math, re, bisect
 from core.schema import TableSchema, Column, IndexType
 from core import utils
 from core import stats
+from core.index_cache import IndexCache
 from core.record_file import RecordFile
 import logger
 
@@ -146,9 +147,10 @@ class IndexPage:
         return self.STRUCT.pack(*data)
 
     def find_child_ptr(self, key):
-        for rec in self.records:
-            if key < rec.key:
-                return rec.left
+        # records are in key order: left of the first record with a greater key
+        i = bisect.bisect_right(self.records, key, key=lambda rec: rec.key)
+        if i < len(self.records):
+            return self.records[i].left
         return self.records[-1].right
 
 
@@ -177,6 +179,9 @@ class ISAMFile:
                                 column.name,
                                 IndexType.ISAM)
         self.step = None
+        # cabecera, root y páginas de nivel 1 fijadas en memoria, compartidas por los índices del archivo
+        self.cache = IndexCache()
+        self.cache.invalidate(self.filename)
 
         # asegurarnos de que existe y escribir cabecera
         # asegurarnos de que existe
@@ -187,6 +192,7 @@ class ISAMFile:
                 f.seek(0)
                 f.write(self.HEADER_STRUCT.pack(leaf_factor, index_factor))
                 stats.count_write()
+            self.cache.put(self.filename, "header", (leaf_factor, index_factor))
         else:
             # -- archivo existente: leer la cabecera y asignar leaf_factor/index_factor
             lf, ix = self.read_header()
@@ -194,10 +200,22 @@ class ISAMFile:
             self.index_factor = ix
 
     def read_header(self):
-        with open(self.filename, "rb") as f:
-            lf, ix = self.HEADER_STRUCT.unpack(f.read(self.HEADER_SIZE))
-            stats.count_read()
-        return lf, ix
+        header = self.cache.get(self.filename, "header")
+        if header is None:
+            with open(self.filename, "rb") as f:
+                header = self.HEADER_STRUCT.unpack(f.read(self.HEADER_SIZE))
+                stats.count_read()
+            self.cache.put(self.filename, "header", header)
+        return header
+
+    def write_header(self, leaf_factor: int, index_factor: int):
+        """Los factores cambian el formato de las páginas: las fijadas en memoria se descartan"""
+        with open(self.filename, "r+b") as f:
+            f.seek(0)
+            f.write(self.HEADER_STRUCT.pack(leaf_factor, index_factor))
+            stats.count_write()
+        self.cache.invalidate(self.filename)
+        self.cache.put(self.filename, "header", (leaf_factor, index_factor))
 
     def _fmt_root(self):
         # 'i' + index_factor * (clave FMT + 'ii')
@@ -211,6 +229,13 @@ class ISAMFile:
         return self.HEADER_SIZE
 
     def read_root_page(self):
+        page = self.cache.get(self.filename, "root")
+        if page is None:
+            page = self._read_root_page()
+            self.cache.put(self.filename, "root", page)
+        return page
+
+    def _read_root_page(self):
         buf = None
         size = self._size_root()
         with open(self.filename, "rb") as f:
@@ -222,10 +247,10 @@ class ISAMFile:
         page_num = struct.unpack(IndexPage.HEADER_FMT, hdr)[0]
         records = []
         off = IndexPage.HSIZE
+        rec_size = IndexRecord(self.column, 0, 0, 0).STRUCT.size
         for _ in range(self.index_factor):
-            chunk = buf[off:off+IndexRecord(column=self.column, key=0, left=0, right=0).STRUCT.size]
-            records.append(IndexRecord.unpack(self.column, chunk))
-            off += IndexRecord( self.column,0,0,0).STRUCT.size
+            records.append(IndexRecord.unpack(self.column, buf[off:off+rec_size]))
+            off += rec_size
         return IndexPage(page_num, records, self.index_factor)
 
     def write_root_page(self, page: 'IndexPage'):
@@ -233,11 +258,21 @@ class ISAMFile:
             f.seek(self._offset_root())
             f.write(page.pack())
             stats.count_write()
+        self.cache.discard(self.filename, "root") # se relee completa, con el relleno de registros vacíos
 
     def _offset_level1(self):
         return self.HEADER_SIZE + self._size_root()
 
     def read_level1_page(self, page_idx: int) -> 'IndexPage':
+        pages = self.cache.get(self.filename, "level1")
+        if pages is None:
+            pages = {}
+            self.cache.put(self.filename, "level1", pages)
+        if page_idx not in pages:
+            pages[page_idx] = self._read_level1_page(page_idx)
+        return pages[page_idx]
+
+    def _read_level1_page(self, page_idx: int) -> 'IndexPage':
         lvl_size = self._size_root()  # mismo formato que root
         off = self._offset_level1() + page_idx * lvl_size
         with open(self.filename, "rb") as f:
@@ -249,10 +284,10 @@ class ISAMFile:
         page_num = struct.unpack(IndexPage.HEADER_FMT, hdr)[0]
         recs = []
         ptr = IndexPage.HSIZE
+        rec_size = IndexRecord(self.column, 0, 0, 0).STRUCT.size
         for _ in range(self.index_factor):
-            chunk = buf[ptr:ptr+IndexRecord(self.column,0,0,0).STRUCT.size]
-            recs.append(IndexRecord.unpack(self.column, chunk))
-            ptr += IndexRecord(self.column,0,0,0).STRUCT.size
+            recs.append(IndexRecord.unpack(self.column, buf[ptr:ptr+rec_size]))
+            ptr += rec_size
         return IndexPage(page_num, recs, self.index_factor)
 
     def write_level1_page(self, page: 'IndexPage'):
@@ -262,6 +297,7 @@ class ISAMFile:
             f.seek(off)
             f.write(page.pack())
             stats.count_write()
+        self.cache.get(self.filename, "level1", {}).pop(page.page_num, None)
 
     def _offset_leaves(self):
         # después de ROOT + (index_factor) páginas nivel1
@@ -392,13 +428,7 @@ class ISAMFile:
             return
 
         # 1) Carga y ordena registros según el valor de self.column
-        leafrecs = []
-        for pos in range(max_pos):
-            rec = rf.read(pos)
-            if rec is None:
-                continue
-            key = rec.values[col_idx]
-            leafrecs.append((key, pos))
+        leafrecs = [(rec.values[col_idx], pos) for pos, rec in rf.read_many(range(max_pos)).items()]
         leafrecs.sort(key=lambda x: x[0])
 
         with open(self.filename, "r+b") as f:
@@ -789,6 +819,8 @@ class ISAMFile:
 # --------------------------------------------------------------------
 
 class ISAMIndex:
+    ORDERED = True # scan yields in key order
+
     def __init__(self,
                  schema: TableSchema,
                  column: Column,
@@ -851,9 +883,7 @@ class ISAMIndex:
         self.file.leaf_factor = l
         self.file.index_factor = i
 
-        with open(self.file.filename, "r+b") as fh:
-            fh.seek(0)
-            fh.write(self.file.HEADER_STRUCT.pack(l, i))
+        self.file.write_header(l, i)
 
     def build_index(self):
         # 0) calcular leaf e index factor al 50% de ocupación
@@ -873,58 +903,68 @@ class ISAMIndex:
     def rangeSearch(self, ini, end) -> list[int]:
         """
         Devuelve la lista de datapos de todos los registros con key entre
-        ini y end (inclusive), recorriendo hoja tras hoja y saltando valores nulos.
+        ini y end (inclusive).
         """
-        if ini is None:
-            ini = utils.get_min_value(self.column)
-        if end is None:
-            end = utils.get_max_value(self.column)
         self.logger.warning(f"RANGE-SEARCH: {ini}, {end}")
+        return list(self.scan(ini, end))
 
-        empty_key = utils.get_empty_value(self.column)
-        results = []
-        if end < ini:
-            return results
+    def search(self, key) -> list[int]:
+        self.logger.warning(f"SEARCHING: {key}")
+        """
+        Búsqueda puntual: sólo devuelve los datapos de los registros con key == key.
+        """
+        return list(self.scan(key, key))
 
-        # 1) bajar desde la raíz hasta nivel 1
-        root = self.file.read_root_page()
-        lvl1_num = root.find_child_ptr(ini)
+    def scan(self, lo=None, hi=None, lo_inclusive: bool = True, hi_inclusive: bool = True,
+             reverse: bool = False, limit: int = None):
+        """
+        Datapos de los registros con key entre lo y hi (None = sin límite) en orden de clave.
+        """
+        for _, datapos in self.scan_items(lo, hi, lo_inclusive, hi_inclusive, reverse, limit):
+            yield datapos
 
-        # 2) elegir la página de nivel 1 adecuada
-        lvl1 = self.file.read_level1_page(lvl1_num)
+    def scan_items(self, lo=None, hi=None, lo_inclusive: bool = True, hi_inclusive: bool = True,
+                   reverse: bool = False, limit: int = None):
+        """
+        Como scan, devolviendo pares (key, datapos).
+        Las hojas sólo se enlazan hacia adelante: el orden descendente guarda el rango y lo invierte.
+        """
+        if limit is not None and limit <= 0:
+            return
+        entries = self._scan_leaves(lo, hi, lo_inclusive, hi_inclusive)
+        if reverse:
+            entries = reversed(list(entries))
+        for count, entry in enumerate(entries, 1):
+            yield entry
+            if count == limit:
+                return
+
+    def _scan_leaves(self, lo, hi, lo_inclusive: bool, hi_inclusive: bool):
+        """
+        Baja ROOT → nivel1 → hoja base y barre hoja a hoja hasta pasarse de hi,
+        saltando valores nulos.
+        """
+        empty_key = utils.get_empty_value(self.column)
+        start = lo if lo is not None else utils.get_min_value(self.column)
 
-        # 3) desde ahí, el puntero a la hoja “base”
-        leaf_num = lvl1.find_child_ptr(ini)
-        lp: LeafPage = self.file.read_leaf_page(leaf_num)
+        root = self.file.read_root_page()
+        lvl1 = self.file.read_level1_page(root.find_child_ptr(start))
+        lp: LeafPage = self.file.read_leaf_page(lvl1.find_child_ptr(start))
 
-        # 4) barrer hoja a hoja hasta pasarnos de max_key
         while lp is not None:
             for rec in lp.records:
-                # ignorar registros nulos
                 if rec.key == empty_key:
                     continue
-                # si está por debajo del inicio, seguimos
-                if rec.key < ini:
+                if utils.before_range(rec.key, lo, lo_inclusive):
                     continue
-                # si nos pasamos del rango, terminamos
-                if rec.key > end:
-                    return results
-                results.append(rec.datapos)
+                if utils.after_range(rec.key, hi, hi_inclusive):
+                    return
+                # claves float redondeadas como al leer los registros
+                yield (round(rec.key, 6) if self.column.data_type == utils.DataType.FLOAT else rec.key), rec.datapos
             if lp.next_page < 1:
-                print(self)
                 break
             lp = self.file.read_leaf_page(lp.next_page)
 
-        return results
-
-    def search(self, key) -> list[int]:
-        self.logger.warning(f"SEARCHING: {key}")
-        """
-        Búsqueda puntual: sólo devuelve los datapos de los registros con key == key.
-        Internamente llama a range_search(key, key).
-        """
-        return self.rangeSearch(key, key)
-
     def insert(self, pos: int, key: any):
         """
         1) Persistir en RecordFile.
@@ -1221,15 +1261,10 @@ class ISAMIndex:
     def clear(self):
         self.logger.info("Cleaning data, removing files")
         os.remove(self.rf.filename)
+        IndexCache().invalidate(self.file.filename)
 
 def count_records_in_rf(rf):
-    max_pos = rf.max_id()
-    count = 0
-    for pos in range(max_pos):
-        rec = rf.read(pos)
-        if rec is not None:
-            count += 1
-    return count
+    return len(rf.read_many(range(rf.max_id())))
 
 def test_isam_integrity(isam: ISAMIndex):
     dbg = []  # Acumulador de mensajes de depuración
@@ -149,10 +149,8 @@ class RTreeIndex:
             xmin, ymin, xmax, ymax = b
             if xmin > xmax or ymin > ymax:
                 return
-            for pos in self.idx.intersection((xmin, ymin, xmax, ymax)):
-                rec = self.rf.read(pos)
-                if rec is None:
-                    continue
+            positions = list(self.idx.intersection((xmin, ymin, xmax, ymax)))
+            for pos, rec in self.rf.read_many(positions).items():
                 key = rec.values[self.col_idx]
                 self._key_to_pos[key] = pos
         except Exception:
@@ -210,8 +208,7 @@ class RTreeIndex:
             # Filtrado circular
             cand = list(self.idx.intersection(region.mbr()))
             res = []
-            for pos in cand:
-                rec = self.rf.read(pos)
+            for pos, rec in self.rf.read_many(cand).items():
                 x, y = self._parse_key(rec.values[self.col_idx])
                 if region.contains(x, y):
                     res.append(pos)
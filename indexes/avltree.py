@@ -7,6 +7,7 @@ import logger
 from core.schema import TableSchema, Column, IndexType, DataType
 from core import utils
 from core import stats
+from core.index_cache import IndexCache
 
 class AVLNode:
     def __init__(self, column: Column, val, pointer: int = -1, left: int = -1, right: int = -1, height: int = 0):
@@ -51,7 +52,7 @@ class AVLFile:
             raise Exception("column index type doesn't match with AVL")
         self.filename = utils.get_index_file_path(schema.table_name, column.name, IndexType.AVL)
         self.logger = logger.CustomLogger(f"AVLFIlE-{schema.table_name}-{column.name}".upper())
-        self.root = -1
+        self.cache = IndexCache() # root position, shared with the other trees on the file
         self.NODE_SIZE = struct.calcsize(utils.calculate_column_format(column) + "iiii")
         if not os.path.exists(self.filename):
             self.logger.fileNotFound(self.filename)
@@ -64,12 +65,11 @@ class AVLFile:
             stats.count_read()
             if not header:
                 self.logger.fileIsEmpty(self.filename)
-                self.root = -1
-                header = struct.pack(self.HEADER_FORMAT, self.root)
+                header = struct.pack(self.HEADER_FORMAT, -1)
                 file.write(header)
                 stats.count_write()
-            else:
-                self.root = struct.unpack(self.HEADER_FORMAT, header)[0]
+        self.cache.invalidate(self.filename)
+        self.cache.put(self.filename, "root", struct.unpack(self.HEADER_FORMAT, header)[0])
 
     def read(self,pos:int) -> AVLNode | None:
 
@@ -105,27 +105,28 @@ class AVLFile:
         self.write(node, pos)
 
     def get_header(self) -> int:
-        if self.root != -1:
-            return self.root
-        else :
+        root = self.cache.get(self.filename, "root")
+        if root is None: # also an empty tree is cached, as -1
             with open(self.filename, "rb") as file:
                 file.seek(0)
                 data = file.read(self.HEADER_SIZE)
                 stats.count_read()
-                self.root = struct.unpack("i", data)[0]
-                self.logger.readingHeader(self.filename, self.root)
-                return self.root
+            root = struct.unpack("i", data)[0]
+            self.cache.put(self.filename, "root", root)
+            self.logger.readingHeader(self.filename, root)
+        return root
 
     def write_header(self, root_pos: int):
-        self.root = root_pos
         with open(self.filename, "rb+") as file:
             file.seek(0)
-            file.write(struct.pack("i", self.root))
+            file.write(struct.pack("i", root_pos))
             stats.count_write()
-            self.logger.writingHeader(self.filename, self.root)
+        self.cache.put(self.filename, "root", root_pos)
+        self.logger.writingHeader(self.filename, root_pos)
 
 class AVLTree:
     indexFile: AVLFile
+    ORDERED = True # scan yields in key order
     def __init__(self, schema: TableSchema, column: Column):
         self.column = column
         self.indexFile = AVLFile(schema, column)
@@ -135,6 +136,7 @@ class AVLTree:
     def clear(self):
         self.logger.info("Cleaning data, removing files")
         os.remove(self.indexFile.filename)
+        IndexCache().invalidate(self.indexFile.filename)
 
     # --- Funciones auxiliares ---
 
@@ -272,18 +274,19 @@ class AVLTree:
 
         return self._balance(point, pos)
 
-    def _range_search_aux(self, r: list[int], i, j, pos:int = -2):
-        if pos == -2:
-            pos = self.indexFile.get_header()
-        if pos == -1:  # no hay ningun registro
+    def _scan_aux(self, lo, hi, lo_inclusive: bool, hi_inclusive: bool, reverse: bool, pos: int):
+        if pos == -1:
             return
         punt = self.indexFile.read(pos)
-        if i <= punt.val <= j:
-            r.append(punt.pointer)
-        if i < punt.val:
-            self._range_search_aux(r, i, j, punt.left)
-        if j > punt.val:
-            self._range_search_aux(r, i, j, punt.right)
+        below = utils.before_range(punt.val, lo, lo_inclusive)
+        above = utils.after_range(punt.val, hi, hi_inclusive)
+        first, second = (punt.right, punt.left) if reverse else (punt.left, punt.right)
+        if not (below if not reverse else above):
+            yield from self._scan_aux(lo, hi, lo_inclusive, hi_inclusive, reverse, first)
+        if not below and not above:
+            yield punt.val, punt.pointer
+        if not (above if not reverse else below):
+            yield from self._scan_aux(lo, hi, lo_inclusive, hi_inclusive, reverse, second)
 
     def _load_ord(self, r:list[int], pos:int = -2):
         if pos == -2:
@@ -354,24 +357,27 @@ class AVLTree:
 
     def rangeSearch(self, i, j) -> list[int]:
         self.logger.warning(f"RANGE-SEARCH: {i}, {j}")
-        if(i == None):
-            i = utils.get_min_value(self.column)
-        if(j == None):
-            j = utils.get_max_value(self.column)
-        print(i, j)
-        
-        r = []
-        self._range_search_aux(r, i, j)
-        return r
+        return list(self.scan(i, j))
 
     # list enteros que son posiciones
     def search(self, key) -> list[int]:
         self.logger.warning(f"SEARCHING: {key}")
-        pos = self._seek(key)
-        if pos == -1:
-            self.logger.warning("The id is not on the tree")
-            return []
-        return self.rangeSearch(key, key)
+        return list(self.scan(key, key))
+
+    def scan(self, lo=None, hi=None, lo_inclusive: bool = True, hi_inclusive: bool = True, reverse: bool = False, limit: int = None):
+        """Posiciones con clave entre lo y hi (None = sin limite), en orden de clave"""
+        for _, pointer in self.scan_items(lo, hi, lo_inclusive, hi_inclusive, reverse, limit):
+            yield pointer
+
+    def scan_items(self, lo=None, hi=None, lo_inclusive: bool = True, hi_inclusive: bool = True, reverse: bool = False, limit: int = None):
+        """Como scan, devolviendo pares (clave, posicion)"""
+        if limit is not None and limit <= 0:
+            return
+        entries = self._scan_aux(lo, hi, lo_inclusive, hi_inclusive, reverse, self.indexFile.get_header())
+        for count, entry in enumerate(entries, 1):
+            yield entry
+            if count == limit:
+                return
 
     def getAll(self) -> list[int]:
         r = []
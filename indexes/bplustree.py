@@ -1,6 +1,9 @@
 import struct
 import os
 import sys
+import itertools
+import bisect
+import functools
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
@@ -8,17 +11,25 @@ import logger
 from core.schema import TableSchema, Column, DataType, IndexType
 from core import utils
 from core import stats
+from core.index_cache import IndexCache
 
 class NodeBPlus:
-	BLOCK_FACTOR = 3
-	def __init__(self, column: Column, keys=None, pointers=None, isLeaf:bool = False, size:int = 0, nextNode:int = -1):
+	BLOCK_FACTOR = 3 # of index files written before the block factor was kept in their header
+	logger = logger.CustomLogger("NODEBPLUS")
+	def __init__(self, column: Column, keys=None, pointers=None, isLeaf:bool = False, size:int = 0, nextNode:int = -1, payloads=None, payload_size:int = 0, block_factor:int = BLOCK_FACTOR, prevNode:int = -1, prev_link:bool = True):
 		if pointers is None:
 			pointers = []
 		if keys is None:
 			keys = []
+		if payloads is None:
+			payloads = []
 		self.column = column
-		self.FORMAT = "<" + str(utils.calculate_column_format(column) * self.BLOCK_FACTOR) + str("i" * (self.BLOCK_FACTOR + 1)) + "iii" # num keys + 1 = num pointers, + isLeaf, size, nextNode
-		self.NODE_SIZE = struct.calcsize(self.FORMAT)
+		self.payload_size = payload_size
+		self.BLOCK_FACTOR = block_factor
+		self.prev_link = prev_link # nodes of files older than the prev links don't store prevNode
+		self.STRUCT = NodeBPlus.node_struct(column.data_type, column.varchar_length, payload_size, block_factor, prev_link)
+		self.FORMAT = self.STRUCT.format
+		self.NODE_SIZE = self.STRUCT.size
 		if isLeaf:
 			if len(pointers) != len(keys):
 				raise Exception("Creating leaf node, number of keys and pointers must be equal")
@@ -27,20 +38,39 @@ class NodeBPlus:
 				raise Exception("Creating internal node, number of pointers must be one more than number of keys")
 		
 
-		empty_key = utils.get_empty_value(self.column)
-		while len(keys) < self.BLOCK_FACTOR:
-			keys.append(empty_key)
-		while len(pointers) < self.BLOCK_FACTOR + 1:
-			pointers.append(-1)
+		# padded to BLOCK_FACTOR slots, the keys in use are sorted so they are searched with bisect
+		keys.extend([utils.get_empty_value(self.column)] * (self.BLOCK_FACTOR - len(keys)))
+		pointers.extend([-1] * (self.BLOCK_FACTOR + 1 - len(pointers)))
+		payloads.extend([b""] * (self.BLOCK_FACTOR - len(payloads)))
 		
 		self.keys = keys
 		self.pointers = pointers
+		self.payloads = payloads # leaf entries only, values of the included columns
 		self.isLeaf = isLeaf
 		self.size = size
 		self.nextNode = nextNode
-		self.logger = logger.CustomLogger("NODEBPLUS")
+		self.prevNode = prevNode # leaves are linked both ways
+
+	@staticmethod
+	def node_format(column: Column, payload_size:int = 0, block_factor:int = BLOCK_FACTOR, prev_link:bool = True) -> str:
+		# num keys + 1 = num pointers, + payload of every leaf entry, + isLeaf, size, nextNode (+ prevNode)
+		payload_fmt = f"{payload_size}s" * block_factor if payload_size else ""
+		return "<" + utils.calculate_column_format(column) * block_factor + "i" * (block_factor + 1) + payload_fmt + ("iiii" if prev_link else "iii")
+
+	@staticmethod
+	@functools.lru_cache(maxsize=None)
+	def node_struct(data_type:DataType, varchar_length:int, payload_size:int, block_factor:int, prev_link:bool = True) -> struct.Struct:
+		"""Compiled node_format, shared by the nodes of every index with the same layout"""
+		return struct.Struct(NodeBPlus.node_format(Column("", data_type=data_type, varchar_length=varchar_length), payload_size, block_factor, prev_link))
+
+	@staticmethod
+	def page_block_factor(column: Column, payload_size:int, page_size:int) -> int:
+		"""Most entries a node of page_size bytes can hold"""
+		fixed = struct.calcsize(NodeBPlus.node_format(column, payload_size, 0)) # the extra pointer, isLeaf, size, nextNode, prevNode
+		entry = struct.calcsize(NodeBPlus.node_format(column, payload_size, 1)) - struct.calcsize(NodeBPlus.node_format(column, payload_size, 0))
+		return max(NodeBPlus.BLOCK_FACTOR, (page_size - fixed) // entry)
 	
-	def addLeafId(self, key:any, pointer:int):
+	def addLeafId(self, key:any, pointer:int, payload:bytes = b""):
 		self.logger.debug(f"Adding id: {key} and pointer: {pointer} in bucket")
 		#if len(self.pointers) != len(self.keys):
 		#	raise Exception("In leaf node, number of keys and pointers must be equal")
@@ -48,9 +78,30 @@ class NodeBPlus:
 		if not self.isFull():
 			self.keys[self.size] = key
 			self.pointers[self.size] = pointer
+			self.payloads[self.size] = payload
 			self.size += 1
 		else:
 			raise Exception("Node is full")
+
+	def entries(self) -> tuple[list, list, list]:
+		"""Keys, pointers and payloads in use"""
+		return self.keys[:self.size], self.pointers[:self.size + (not self.isLeaf)], self.payloads[:self.size]
+
+	def setEntries(self, keys:list, pointers:list, payloads:list = None):
+		"""Replaces the entries in use, padding the unused slots"""
+		payloads = payloads if payloads is not None else []
+		self.size = len(keys)
+		self.keys = keys + [utils.get_empty_value(self.column)] * (self.BLOCK_FACTOR - len(keys))
+		self.pointers = pointers + [-1] * (self.BLOCK_FACTOR + 1 - len(pointers))
+		self.payloads = payloads + [b""] * (self.BLOCK_FACTOR - len(payloads))
+
+	def removeLeafId(self, i:int):
+		assert(self.isLeaf)
+		del self.keys[i], self.pointers[i], self.payloads[i]
+		self.keys.append(utils.get_empty_value(self.column))
+		self.pointers.append(-1)
+		self.payloads.append(b"")
+		self.size -= 1
 	
 	def addInternalId(self, key:any, pointer:int):
 		self.logger.debug(f"Adding id: {key} and pointer: {pointer} in bucket")
@@ -64,110 +115,176 @@ class NodeBPlus:
 		else:
 			raise Exception("Node is full")
 	
-	def insertInLeaf(self, key: any, pointer: int):
+	def insertInLeaf(self, key: any, pointer: int, payload: bytes = b""):
+		"""Adds the entry after the entries of equal keys"""
 		assert(self.isLeaf)
-		self.logger.debug(f"Inserting in leaf: key={key}, pointer={pointer}")
-		self.addLeafId(key, pointer)
+		if self.isFull():
+			raise Exception("Node is full")
+		i = bisect.bisect_right(self.keys, key, 0, self.size)
+		self.keys.insert(i, key)
+		self.keys.pop() # unused slot at the end
+		self.pointers.insert(i, pointer)
+		del self.pointers[-2] # the last pointer is not an entry
+		self.payloads.insert(i, payload)
+		self.payloads.pop()
+		self.size += 1
 
-		i = self.size - 1
-		while i > 0 and self.keys[i] < self.keys[i - 1]:
-			self.keys[i], self.keys[i - 1] = self.keys[i - 1], self.keys[i]
-			self.pointers[i], self.pointers[i - 1] = self.pointers[i - 1], self.pointers[i]
-			i -= 1
+	def find(self, key: any) -> int:
+		"""Index of the first key in use >= key"""
+		return bisect.bisect_left(self.keys, key, 0, self.size)
 
-	def insertInInternalNode(self, key: any, rightChildPtr: int):
-		assert(not self.isLeaf)
-		self.logger.debug(f"Inserting in internal self: key={key}, rightPtr={rightChildPtr}")
-		self.addInternalId(key, rightChildPtr)
+	def findAfter(self, key: any) -> int:
+		"""Index of the first key in use > key"""
+		return bisect.bisect_right(self.keys, key, 0, self.size)
+
+	def bounds(self, lo:any, hi:any, lo_inclusive:bool = True, hi_inclusive:bool = True) -> tuple[int, int]:
+		"""Slice of the keys in use between lo and hi (None is unbounded), end < size if a key is past hi"""
+		start = 0 if lo is None else self.find(lo) if lo_inclusive else self.findAfter(lo)
+		end = self.size if hi is None else self.findAfter(hi) if hi_inclusive else self.find(hi)
+		return start, end
 
-		i = self.size - 1
-		while i > 0 and self.keys[i] < self.keys[i - 1]:
-			self.keys[i], self.keys[i - 1] = self.keys[i - 1], self.keys[i]
-			self.pointers[i+1], self.pointers[i] = self.pointers[i], self.pointers[i + 1]
-			i -= 1
+	def insertInInternalNode(self, key: any, rightChildPtr: int, childIndex: int):
+		"""Adds the new right sibling of the child at childIndex right after it, separated by key.
+		With duplicates other separators may equal key, so its place is given by the split child"""
+		assert(not self.isLeaf)
+		if self.isFull():
+			raise Exception("Node is full")
+		self.keys.insert(childIndex, key)
+		self.keys.pop() # unused slot at the end
+		self.pointers.insert(childIndex + 1, rightChildPtr)
+		self.pointers.pop()
+		self.size += 1
 
 	def isFull(self) -> bool:
 		return self.size == len(self.keys)
 
 	def pack(self) -> bytes:
-		data_buf = b''
-		type = utils.calculate_column_format(self.column)
-		for key in self.keys:
-			data_buf += struct.pack(type, key.encode() if self.column.data_type == DataType.VARCHAR else key)
-		for pointer in self.pointers:
-			data_buf += struct.pack('i', pointer)
-		data_buf += struct.pack('iii', self.isLeaf, self.size, self.nextNode)
-		return data_buf
+		keys = [key.encode() for key in self.keys] if self.column.data_type == DataType.VARCHAR else self.keys
+		payloads = self.payloads if self.payload_size else []
+		links = [self.nextNode, self.prevNode] if self.prev_link else [self.nextNode]
+		return self.STRUCT.pack(*keys, *self.pointers, *payloads, self.isLeaf, self.size, *links)
 
 	def debug(self):
-		print(f"Node with keys: {self.keys}, pointers: {self.pointers}, isLeaf: {self.isLeaf}, size: {self.size}, nextNode: {self.nextNode}")
+		print(f"Node with keys: {self.keys}, pointers: {self.pointers}, isLeaf: {self.isLeaf}, size: {self.size}, nextNode: {self.nextNode}, prevNode: {self.prevNode}")
 
 	@staticmethod
-	def unpack(record:bytes, column: Column):
+	def unpack(record:bytes, column: Column, payload_size:int = 0, block_factor:int = BLOCK_FACTOR, prev_link:bool = True):
 		if(record == None):
 			raise Exception("record is None")
-		isLeaf, size, nextNode = struct.unpack('iii', record[-12:])
+		if prev_link:
+			isLeaf, size, nextNode, prevNode = struct.unpack_from('iiii', record, len(record) - 16)
+		else:
+			(isLeaf, size, nextNode), prevNode = struct.unpack_from('iii', record, len(record) - 12), -1
 
-		blockFactor = NodeBPlus.BLOCK_FACTOR
-		
+		# the keys and pointers in use are decoded at once
 		key_fmt = utils.calculate_column_format(column)
-		key_size = struct.calcsize(key_fmt)
-
-		keys = []
-		pointers = []
-
-		for i in range(size):
-			start = i * key_size
-			end = start + key_size
-			val = struct.unpack(key_fmt, record[start:end])[0]
-			if column.data_type == DataType.FLOAT:
-				val = round(val,6) #float precision
-			if column.data_type == DataType.VARCHAR:
-				val = val.decode().strip("\x00")
-			keys.append(val)
-
-		ptr_start = blockFactor * key_size
-		
-		for i in range(size + 1 - isLeaf):
-			start = ptr_start + i * 4
-			end = start + 4
-			ptr = struct.unpack('i', record[start:end])[0]
-			pointers.append(ptr)
+		keys = list(struct.unpack_from("<" + key_fmt * size if key_fmt.endswith("s") else f"<{size}{key_fmt}", record))
+		if column.data_type == DataType.FLOAT:
+			keys = [round(val, 6) for val in keys] #float precision
+		if column.data_type == DataType.VARCHAR:
+			keys = [val.decode().strip("\x00") for val in keys]
+
+		ptr_start = block_factor * struct.calcsize(key_fmt)
+		pointers = list(struct.unpack_from(f"<{size + 1 - isLeaf}i", record, ptr_start))
 
-		return NodeBPlus(column, keys, pointers, isLeaf, size, nextNode)
+		payloads = []
+		if payload_size and isLeaf:
+			payload_start = ptr_start + (block_factor + 1) * 4
+			payloads = [record[start:start + payload_size] for start in range(payload_start, payload_start + size * payload_size, payload_size)]
+
+		return NodeBPlus(column, keys, pointers, isLeaf, size, nextNode, payloads, payload_size, block_factor, prevNode, prev_link)
 
 class BPlusFile:
-	HEADER_SIZE = 4
+	PAGE_SIZE = 4096 # bytes of a node of a new index file, its block factor is the most entries that fit
+	MAGIC = -0x42504C4C # first int of a header with the block factor, the root of an older file is >= -1
+	HEADER_FORMAT = "iiii" # magic, root, block factor, first free node
+	NO_PREV_LINK_MAGIC = -0x42504C46 # same header, leaves only linked forward
+	NO_FREE_LIST_MAGIC = -0x42504C53 # header of magic, root and block factor; freed nodes are never reused
+	NO_FREE_LIST_HEADER_FORMAT = "iii"
+	LEGACY_HEADER_FORMAT = "i" # root, nodes of NodeBPlus.BLOCK_FACTOR entries
 
-	def __init__(self, schema:TableSchema, column:Column):
+	def __init__(self, schema:TableSchema, column:Column, payload_size:int = 0, page_size:int = None):
 		self.column = column
+		self.payload_size = payload_size
 		if(column.index_type != IndexType.BTREE):
 			raise Exception("column index type doesn't match with BTREE")
 		self.filename = utils.get_index_file_path(schema.table_name, column.name, IndexType.BTREE)
+		self.cache = IndexCache() # header ints and the root node, shared with the other trees on the file
 		self.logger = logger.CustomLogger(f"BPLUSFILE-{schema.table_name}-{column.name}".upper())
-		
-		self.NODE_SIZE = struct.calcsize("<" + (utils.calculate_column_format(column) * NodeBPlus.BLOCK_FACTOR) + ("i" * (NodeBPlus.BLOCK_FACTOR + 1)) + "iii")
 		#self.logger.logger.setLevel(logging.WARNING)
 
 		if not os.path.exists(self.filename):
 			self.logger.fileNotFound(self.filename)
-			self.initialize_file(self.filename) # if archive not exists
+			self.initialize_file(self.filename, page_size or self.PAGE_SIZE) # if archive not exists
 		else:
 			with open(self.filename, "rb+") as file:
 				file.seek(0,2)
 				if(file.tell() == 0):
 					self.logger.fileIsEmpty(self.filename)
-					self.initialize_file(self.filename) # if archive is empty
+					self.initialize_file(self.filename, page_size or self.PAGE_SIZE) # if archive is empty
+		self.readLayout() # files of an older layout are migrated by the tree, see BPlusTree.migrate
 
-	def initialize_file(self, filename):
+	def initialize_file(self, filename, page_size:int):
 		with open(filename, "wb") as file:
-			header = -1 # root
-			file.write(struct.pack("i", header))
+			block_factor = NodeBPlus.page_block_factor(self.column, self.payload_size, page_size)
+			file.write(struct.pack(self.HEADER_FORMAT, self.MAGIC, -1, block_factor, -1)) # no root nor free nodes yet
 			stats.count_write()
+
+	def readLayout(self):
+		"""Block factor, header size and free list of the file, files without a magic have the original 3 entries per node.
+		Files of an older layout are only read to be migrated, see BPlusTree.migrate. The header is (re)loaded into the index cache"""
+		with open(self.filename, "rb") as file:
+			data = file.read(struct.calcsize(self.HEADER_FORMAT))
+			stats.count_read()
+		magic = struct.unpack_from("i", data)[0] if len(data) >= 4 else None
+		self.FREE_OFFSET = None # files without a free list leave freed nodes unused
+		self.prev_link = magic == self.MAGIC # older files are migrated when opened
+		if magic in [self.MAGIC, self.NO_PREV_LINK_MAGIC]:
+			self.block_factor = struct.unpack(self.HEADER_FORMAT, data)[2]
+			self.HEADER_SIZE = struct.calcsize(self.HEADER_FORMAT)
+			self.ROOT_OFFSET = 4
+			self.FREE_OFFSET = 12
+		elif magic == self.NO_FREE_LIST_MAGIC:
+			self.block_factor = struct.unpack_from(self.NO_FREE_LIST_HEADER_FORMAT, data)[2]
+			self.HEADER_SIZE = struct.calcsize(self.NO_FREE_LIST_HEADER_FORMAT)
+			self.ROOT_OFFSET = 4
+		else:
+			self.block_factor = NodeBPlus.BLOCK_FACTOR
+			self.HEADER_SIZE = struct.calcsize(self.LEGACY_HEADER_FORMAT)
+			self.ROOT_OFFSET = 0
+		self.NODE_SIZE = struct.calcsize(NodeBPlus.node_format(self.column, self.payload_size, self.block_factor, self.prev_link))
+		self.cache.invalidate(self.filename)
+		for offset in [self.ROOT_OFFSET, self.FREE_OFFSET]:
+			if offset is not None:
+				self.cache.put(self.filename, f"int{offset}", struct.unpack_from("i", data, offset)[0])
 	
+	def migrate(self) -> list[tuple]:
+		"""Rewrites a file of an older layout empty in the current one, with the same block factor. Returns the
+		(key, pointer, payload) leaf entries it had, in leaf chain order, for the tree to be rebuilt from them"""
+		self.logger.info(f"Migrating {self.filename} to leaves linked both ways")
+		entries = []
+		if self.getHeader() != -1:
+			node = self.readBucket(self.getHeader())
+			while not node.isLeaf:
+				node = self.readBucket(node.pointers[0])
+			while True:
+				entries.extend(zip(*node.entries()))
+				if node.nextNode == -1: break
+				node = self.readBucket(node.nextNode)
+		temp = self.filename + ".migrating"
+		with open(temp, "wb") as file:
+			file.write(struct.pack(self.HEADER_FORMAT, self.MAGIC, -1, self.block_factor, -1))
+			stats.count_write()
+		os.replace(temp, self.filename)
+		self.readLayout()
+		return entries
+
 	def readBucket(self, pos: int) -> NodeBPlus:
 		if(pos == -1):
 			raise Exception(f"Error reading bucket at pos {pos}")
+		pinned = self.cache.get(self.filename, "root_node") # (position, packed node) of the root
+		if pinned is not None and pinned[0] == pos:
+			return NodeBPlus.unpack(pinned[1], self.column, self.payload_size, self.block_factor, self.prev_link)
 		with open(self.filename, "rb") as file:
 			offset = self.HEADER_SIZE + pos * self.NODE_SIZE
 			file.seek(offset)
@@ -176,12 +293,19 @@ class BPlusFile:
 			if not data or len(data) < self.NODE_SIZE:
 				self.logger.invalidPosition(self.filename, pos)
 				raise Exception(f"Invalid bucket position: {pos}")
-			node = NodeBPlus.unpack(data, self.column)
-			self.logger.readingBucket(self.filename, pos, node.keys)
-			return node
+		if pos == self.getHeader():
+			self.cache.put(self.filename, "root_node", (pos, data))
+		node = NodeBPlus.unpack(data, self.column, self.payload_size, self.block_factor, self.prev_link)
+		self.logger.readingBucket(self.filename, pos, node.keys)
+		return node
 
 	def writeBucket(self, pos: int, node: NodeBPlus) -> int:
 		data = node.pack()
+		if pos == -1 and self.FREE_OFFSET is not None: # a new node reuses the first free one
+			freePos = self.readInt(self.FREE_OFFSET)
+			if freePos != -1:
+				self.writeInt(self.FREE_OFFSET, self.readBucket(freePos).pointers[0])
+				pos = freePos
 		with open(self.filename, "rb+") as file:
 			if pos == -1:
 				file.seek(0, 2)  # ir al final
@@ -192,51 +316,345 @@ class BPlusFile:
 				file.seek(offset)
 			file.write(data)
 			stats.count_write()
-			self.logger.writingBucket(self.filename, pos, node.keys)
-			return pos		
+		pinned = self.cache.get(self.filename, "root_node")
+		if pinned is not None and pinned[0] == pos: # write-through
+			self.cache.put(self.filename, "root_node", (pos, data))
+		self.logger.writingBucket(self.filename, pos, node.keys)
+		return pos
+
+	def freeBucket(self, pos: int):
+		"""Puts the node at pos on the free list, its only pointer links the next free node"""
+		if self.FREE_OFFSET is None:
+			return
+		free = NodeBPlus(self.column, [], [self.readInt(self.FREE_OFFSET)], False, 0, -1, payload_size=self.payload_size, block_factor=self.block_factor)
+		self.writeBucket(pos, free)
+		self.writeInt(self.FREE_OFFSET, pos)
+
+	def truncate(self):
+		"""Drops every node, the header keeps its layout with no root and no free nodes"""
+		with open(self.filename, "rb+") as file:
+			file.truncate(self.HEADER_SIZE)
+		self.writeHeader(-1)
+		if self.FREE_OFFSET is not None:
+			self.writeInt(self.FREE_OFFSET, -1)
+
+	def readInt(self, offset: int) -> int:
+		"""Int of the header at offset, from the index cache once read"""
+		value = self.cache.get(self.filename, f"int{offset}")
+		if value is None:
+			with open(self.filename, "rb") as file:
+				file.seek(offset)
+				stats.count_read()
+				value = struct.unpack("i", file.read(4))[0]
+			self.cache.put(self.filename, f"int{offset}", value)
+		return value
+
+	def writeInt(self, offset: int, value: int):
+		with open(self.filename, "rb+") as file:
+			file.seek(offset)
+			file.write(struct.pack("i", value))
+			stats.count_write()
+		self.cache.put(self.filename, f"int{offset}", value)
+
+	def nodeCount(self) -> int:
+		return (os.path.getsize(self.filename) - self.HEADER_SIZE) // self.NODE_SIZE
+
+	def appendBuckets(self, nodes: list[NodeBPlus]) -> int:
+		"""Writes the nodes one after another at the end of the file in one write, returns the position of the first"""
+		with open(self.filename, "rb+") as file:
+			file.seek(0, 2)
+			pos = (file.tell() - self.HEADER_SIZE) // self.NODE_SIZE
+			file.write(b"".join(node.pack() for node in nodes))
+			for _ in nodes:
+				stats.count_write()
+			return pos
 
 	def getHeader(self) -> int:
+		return self.readInt(self.ROOT_OFFSET)
+
+	def writeHeader(self, rootPosition: int):
+		self.writeInt(self.ROOT_OFFSET, rootPosition)
+		self.cache.discard(self.filename, "root_node") # pinned again on its first read
+		self.logger.writingHeader(self.filename, rootPosition)
+
+
+class PostingFile:
+	"""Posting lists of the hot keys of a B+ tree: the record positions of one key in increasing order,
+	as varint encoded deltas in a chain of pages, the first position of every page is stored whole so a
+	page is decoded on its own. A leaf entry points to the first page of its list with the pointer
+	-2 - page, that page also keeps the last page, the last position and the count of the list"""
+	PAGE_SIZE = 4096
+	HEADER_FORMAT = "i" # first free page
+	PAGE_HEADER = struct.Struct("iiiii") # next page, bytes used; in the first page also last page, last position, count
+
+	def __init__(self, filename:str):
+		self.filename = filename
+		self.HEADER_SIZE = struct.calcsize(self.HEADER_FORMAT)
+		self.CAPACITY = self.PAGE_SIZE - self.PAGE_HEADER.size
+
+	@staticmethod
+	def isPosting(pointer:int) -> bool:
+		return pointer <= -2
+
+	@staticmethod
+	def pointer(page:int) -> int:
+		"""Leaf pointer of the list starting at page, -1 stays the unused pointer"""
+		return -2 - page
+
+	@staticmethod
+	def head(pointer:int) -> int:
+		return -2 - pointer
+
+	@staticmethod
+	def encode(positions:list[int], previous:int = 0) -> bytes:
+		"""Varints of the deltas of the positions, the first one from previous"""
+		deltas = [pos - last for pos, last in zip(positions, [previous] + positions[:-1])]
+		if not deltas or max(deltas) < 0x80: # dense lists are one byte per position
+			return bytes(deltas)
+		out = bytearray()
+		for value in deltas:
+			while value >= 0x80:
+				out.append((value & 0x7F) | 0x80)
+				value >>= 7
+			out.append(value)
+		return bytes(out)
+
+	@staticmethod
+	def decode(data:bytes) -> list[int]:
+		if not data or max(data) < 0x80:
+			return list(itertools.accumulate(data))
+		positions = []
+		value, delta, shift = 0, 0, 0
+		for byte in data:
+			delta |= (byte & 0x7F) << shift
+			shift += 7
+			if not byte & 0x80:
+				value += delta
+				positions.append(value)
+				delta, shift = 0, 0
+		return positions
+
+	@staticmethod
+	def first(data:bytes) -> int:
+		value, shift = 0, 0
+		for byte in data:
+			value |= (byte & 0x7F) << shift
+			if not byte & 0x80:
+				return value
+			shift += 7
+
+	def readPage(self, page:int) -> tuple[list, bytes]:
 		with open(self.filename, "rb") as file:
-			file.seek(0)
-			data = file.read(self.HEADER_SIZE)
+			file.seek(self.HEADER_SIZE + page * self.PAGE_SIZE)
+			data = file.read(self.PAGE_SIZE)
 			stats.count_read()
-			rootPosition = struct.unpack("i", data)[0]
-			self.logger.readingHeader(self.filename, rootPosition)
-			return rootPosition
+		header = list(self.PAGE_HEADER.unpack_from(data))
+		return header, data[self.PAGE_HEADER.size:self.PAGE_HEADER.size + header[1]]
 
-	def writeHeader(self, rootPosition: int):
+	def writePage(self, page:int, header:list, data:bytes):
+		header[1] = len(data)
+		with open(self.filename, "rb+") as file:
+			file.seek(self.HEADER_SIZE + page * self.PAGE_SIZE)
+			file.write(self.PAGE_HEADER.pack(*header) + data.ljust(self.CAPACITY, b"\x00"))
+			stats.count_write()
+
+	def allocate(self) -> int:
+		"""A page off the free list or a new one at the end of the file, reserved as an empty page"""
+		if not os.path.exists(self.filename):
+			with open(self.filename, "wb") as file:
+				file.write(struct.pack(self.HEADER_FORMAT, -1))
+				stats.count_write()
 		with open(self.filename, "rb+") as file:
+			free = struct.unpack(self.HEADER_FORMAT, file.read(self.HEADER_SIZE))[0]
+			stats.count_read()
+			if free == -1:
+				page = (file.seek(0, 2) - self.HEADER_SIZE) // self.PAGE_SIZE
+			else:
+				file.seek(self.HEADER_SIZE + free * self.PAGE_SIZE)
+				page, next = free, self.PAGE_HEADER.unpack(file.read(self.PAGE_HEADER.size))[0]
+				file.seek(0)
+				file.write(struct.pack(self.HEADER_FORMAT, next))
+				stats.count_read()
+				stats.count_write()
+		self.writePage(page, [-1, 0, -1, -1, 0], b"")
+		return page
+
+	def release(self, page:int):
+		with open(self.filename, "rb+") as file:
+			free = struct.unpack(self.HEADER_FORMAT, file.read(self.HEADER_SIZE))[0]
 			file.seek(0)
-			file.write(struct.pack("i", rootPosition))
+			file.write(struct.pack(self.HEADER_FORMAT, page))
+			stats.count_read()
 			stats.count_write()
-			self.logger.writingHeader(self.filename, rootPosition)
+		self.writePage(page, [free, 0, -1, -1, 0], b"")
+
+	def pages(self, head:int):
+		"""(page, header, data) of every page of a list, in order"""
+		page = head
+		while page != -1:
+			header, data = self.readPage(page)
+			yield page, header, data
+			page = header[0]
+
+	def positions(self, head:int):
+		"""Lazily decodes the positions of the list starting at page head"""
+		for _, _, data in self.pages(head):
+			yield from self.decode(data)
+
+	def read(self, head:int) -> list[int]:
+		return list(self.positions(head))
+
+	def create(self, positions:list[int]) -> int:
+		"""New list of the positions, returns its first page"""
+		positions = sorted(positions)
+		chunks, start, size = [], 0, 0
+		for i in range(len(positions)):
+			size += len(self.encode([positions[i] - (positions[i - 1] if i > start else 0)]))
+			if size > self.CAPACITY:
+				chunks.append(positions[start:i])
+				start, size = i, len(self.encode([positions[i]]))
+		chunks.append(positions[start:])
+		pages = [self.allocate() for _ in chunks]
+		for i, chunk in enumerate(chunks):
+			next = pages[i + 1] if i + 1 < len(chunks) else -1
+			header = [next, 0, pages[-1], positions[-1], len(positions)] if i == 0 else [next, 0, -1, -1, 0]
+			self.writePage(pages[i], header, self.encode(chunk))
+		return pages[0]
+
+	def locate(self, head:int, pos:int) -> tuple[tuple, tuple]:
+		"""(page, header, data) of the page where pos goes and of the one before it (None for the first page)"""
+		previous, target = None, None
+		for page in self.pages(head):
+			if target is not None and self.first(page[2]) > pos:
+				break
+			previous, target = target, page
+		return previous, target
+
+	def append(self, head:int, pos:int):
+		"""Adds pos to the list, a position after the last one goes to the last page"""
+		headHeader, headData = self.readPage(head)
+		last, lastPos = headHeader[2], headHeader[3]
+		headHeader[3], headHeader[4] = max(lastPos, pos), headHeader[4] + 1
+		if pos > lastPos: # the delta is appended to the last page, or starts a new one
+			page, header, data = (head, headHeader, headData) if last == head else (last, *self.readPage(last))
+			code = self.encode([pos], lastPos)
+			if len(data) + len(code) <= self.CAPACITY:
+				self.writePage(page, header, data + code)
+			else:
+				split = self.allocate()
+				self.writePage(split, [-1, 0, -1, -1, 0], self.encode([pos]))
+				header[0] = headHeader[2] = split
+				self.writePage(page, header, data)
+			if page != head:
+				self.writePage(head, headHeader, headData)
+			return
+		_, (page, header, data) = self.locate(head, pos)
+		if page == head:
+			header, data = headHeader, headData
+		positions = self.decode(data)
+		bisect.insort(positions, pos)
+		data = self.encode(positions)
+		if len(data) > self.CAPACITY: # split in two pages, the second after the first
+			mid = len(positions) // 2
+			split = self.allocate()
+			self.writePage(split, [header[0], 0, -1, -1, 0], self.encode(positions[mid:]))
+			header[0], data = split, self.encode(positions[:mid])
+			if page == last:
+				headHeader[2] = split
+		self.writePage(page, header, data)
+		if page != head:
+			self.writePage(head, headHeader, headData)
+
+	def remove(self, head:int, pos:int = None) -> tuple[bool, int]: # found?, positions left
+		"""Removes pos (the first position if None), a list left empty frees its pages"""
+		if pos is None:
+			pos = next(self.positions(head))
+		previous, (page, header, data) = self.locate(head, pos)
+		headHeader, headData = self.readPage(head) if page != head else (header, data)
+		positions = self.decode(data)
+		i = bisect.bisect_left(positions, pos)
+		if i == len(positions) or positions[i] != pos:
+			return False, headHeader[4]
+		del positions[i]
+		headHeader[4] -= 1
+		if headHeader[4] == 0:
+			self.release(head)
+			return True, 0
+		if positions:
+			if page == headHeader[2]:
+				headHeader[3] = positions[-1]
+			if page == head:
+				headData = self.encode(positions)
+			else:
+				self.writePage(page, header, self.encode(positions))
+		elif page == head: # the next page becomes the first one
+			nextPage = header[0]
+			nextHeader, headData = self.readPage(nextPage)
+			headHeader[0] = nextHeader[0]
+			if headHeader[2] == nextPage:
+				headHeader[2] = head
+			self.release(nextPage)
+		else: # the page is unlinked from the one before it
+			previousPage, previousHeader, previousData = previous
+			if previousPage == head:
+				previousHeader = headHeader
+			previousHeader[0] = header[0]
+			if page == headHeader[2]:
+				headHeader[2], headHeader[3] = previousPage, self.decode(previousData)[-1]
+			if previousPage != head:
+				self.writePage(previousPage, previousHeader, previousData)
+			self.release(page)
+		self.writePage(head, headHeader, headData)
+		return True, headHeader[4]
+
+	def clear(self):
+		if os.path.exists(self.filename):
+			os.remove(self.filename)
 
 
 class BPlusTree:
 	indexFile: BPlusFile
+	ORDERED = True # scan yields in key order
+	FILL_FACTOR = 0.9 # of the nodes of a bulk load, room is left for later inserts
+	BULK_BATCH = 256 # nodes of a bulk load written at once
+	POSTING_MIN = 16 # entries of one key in a leaf replaced by a single entry pointing to their posting list
 
-	def __init__(self, schema:TableSchema, column:Column):
+	def __init__(self, schema:TableSchema, column:Column, payload_size:int = 0, page_size:int = None):
 		self.column = column
+		self.payload_size = payload_size # bytes carried by every leaf entry, see insert
 		self.empty_key = utils.get_empty_value(self.column)
 		if column.index_type != IndexType.BTREE:
 			raise Exception("column index type doesn't match with BTREE")
-		self.indexFile = BPlusFile(schema, column)
-		self.BLOCK_FACTOR = NodeBPlus.BLOCK_FACTOR
+		self.indexFile = BPlusFile(schema, column, payload_size, page_size) # page_size only applies to a new file
+		self.BLOCK_FACTOR = self.indexFile.block_factor
+		self.MIN_KEYS = (self.BLOCK_FACTOR - 1) // 2 # of a node but the root, a full node holds BLOCK_FACTOR - 1
+		# entries with payloads are kept one per record, the others of hot keys go to posting lists
+		self.postings = PostingFile(self.indexFile.filename[:-len(".dat")] + "_postings.dat") if payload_size == 0 else None
 		self.logger = logger.CustomLogger(f"BPLUSTREE-{schema.table_name}-{column.name}".upper())
+		if not self.indexFile.prev_link: # a file of an older layout
+			self.migrate()
+
+	def migrate(self):
+		"""Rebuilds the tree of a file of an older layout from its leaf chain. Its nodes are not kept: older
+		splits of runs of equal keys left leaves in a different order in the tree than in the chain, and older
+		separators don't keep equal keys to their right as deleteAux and lastLeaf expect"""
+		entries = [entry for key, pointer, payload in self.indexFile.migrate() for entry in self.expand(key, pointer, payload)]
+		self.bulk_load(entries)
 	
-	def insert(self, pos:int, val:any):
+	def insert(self, pos:int, val:any, payload:bytes = b""):
+		"""Adds the entry of the record at pos, with payload_size bytes of payload returned by scan_entries"""
 		self.logger.warning(f"INSERTING: {val}")
 
 		rootPos = self.indexFile.getHeader()
 		if(rootPos == -1):
 			self.logger.info(f"Creating new root, first record with id: {val}")
-			root = NodeBPlus(column=self.column, isLeaf=True)
-			root.addLeafId(val, pos)
+			root = NodeBPlus(column=self.column, isLeaf=True, payload_size=self.payload_size, block_factor=self.BLOCK_FACTOR)
+			root.addLeafId(val, pos, payload)
 			rootPos = self.indexFile.writeBucket(-1, root) # new bucket
 			self.indexFile.writeHeader(rootPos)
 			return
 		
-		split, newKey, newPointer = self.insertAux(rootPos, val, pos)
+		split, newKey, newPointer = self.insertAux(rootPos, val, pos, payload)
 
 		if not split:
 			self.logger.successfulInsertion(self.indexFile.filename, val)
@@ -249,17 +667,21 @@ class BPlusTree:
 			keys=[newKey],
 			pointers=[rootPos, newPointer],
 			isLeaf=False,
-			size=1
+			size=1,
+			payload_size=self.payload_size,
+			block_factor=self.BLOCK_FACTOR
 		)
 		newRootPos = self.indexFile.writeBucket(-1, newRoot)
 		self.indexFile.writeHeader(newRootPos)
 		self.logger.info(f"New root created with keys: {newRoot.keys}")
 		self.logger.successfulInsertion(self.indexFile.filename, val)
 	
-	def insertAux(self, nodePos:int, key:any, pointer:int) -> tuple[bool, any, int]: # split?, key, pointer
+	def insertAux(self, nodePos:int, key:any, pointer:int, payload:bytes = b"") -> tuple[bool, any, int]: # split?, key, pointer
 		node:NodeBPlus = self.indexFile.readBucket(nodePos)
 		if(node.isLeaf): # if is leaf, insert
-			node.insertInLeaf(key, pointer)
+			if self.insertPosting(nodePos, node, key, pointer):
+				return False, self.empty_key, -1
+			node.insertInLeaf(key, pointer, payload)
 			if(not node.isFull()):
 				self.indexFile.writeBucket(nodePos, node)
 				self.logger.info(f"node leaf with keys: {node.keys} is not full, not splitting")
@@ -269,24 +691,25 @@ class BPlusTree:
 			mid = node.size // 2
 			leftKeys, rightKeys = node.keys[:mid], node.keys[mid:]
 			leftPointers, rightPointers = node.pointers[:mid], node.pointers[mid:-1]
-			newNode = NodeBPlus(self.column, rightKeys, rightPointers, True, len(rightKeys), node.nextNode)
+			leftPayloads, rightPayloads = node.payloads[:mid], node.payloads[mid:]
+			newNode = NodeBPlus(self.column, rightKeys, rightPointers, True, len(rightKeys), node.nextNode, rightPayloads, self.payload_size, self.BLOCK_FACTOR, nodePos)
 			pos = self.indexFile.writeBucket(-1, newNode)
-			node = NodeBPlus(self.column, leftKeys, leftPointers, True, len(leftKeys), pos)
+			self.relink(newNode.nextNode, pos)
+			node = NodeBPlus(self.column, leftKeys, leftPointers, True, len(leftKeys), pos, leftPayloads, self.payload_size, self.BLOCK_FACTOR, node.prevNode)
 			self.indexFile.writeBucket(nodePos, node)
 			self.logger.info(f"node leaf spplitted into left node with keys: {node.keys} and right node with keys: {newNode.keys}")
 
 			return True, newNode.keys[0], pos
 
 		else:
-			ite = 0
-			while(ite < node.size and node.keys[ite] < key): # finding where to insert id
-				ite += 1
-			split, newKey, newPointer = self.insertAux(node.pointers[ite], key, pointer)
+			# right of equal separators: the separator of a split then lands next to the split child, as in the leaf chain
+			ite = node.findAfter(key)
+			split, newKey, newPointer = self.insertAux(node.pointers[ite], key, pointer, payload)
 
 			if not split:
 				return False, self.empty_key, -1
 			
-			node.insertInInternalNode(newKey, newPointer)
+			node.insertInInternalNode(newKey, newPointer, ite)
 
 			if not node.isFull():
 				self.indexFile.writeBucket(nodePos, node)
@@ -299,14 +722,104 @@ class BPlusTree:
 			upKey = node.keys[mid]
 			leftPointers, rightPointers = node.pointers[:mid+1], node.pointers[mid+1:] # pointers split but maintain for them
 			
-			newNode = NodeBPlus(self.column, rightKeys, rightPointers, False, len(rightKeys), -1) # no next node
+			newNode = NodeBPlus(self.column, rightKeys, rightPointers, False, len(rightKeys), -1, payload_size=self.payload_size, block_factor=self.BLOCK_FACTOR) # no next node
 			upPointer = self.indexFile.writeBucket(-1, newNode)
-			node = NodeBPlus(self.column, leftKeys, leftPointers, False, len(leftKeys), -1)
+			node = NodeBPlus(self.column, leftKeys, leftPointers, False, len(leftKeys), -1, payload_size=self.payload_size, block_factor=self.BLOCK_FACTOR)
 			self.indexFile.writeBucket(nodePos, node)
 			self.logger.info(f"node intern spplitted into left node with keys: {node.keys} and right node with keys: {newNode.keys}")
 
 			return True, upKey, upPointer
 	
+	def relink(self, leafPos:int, prevPos:int):
+		"""Points the prev link of the leaf at leafPos (if any) to prevPos"""
+		if leafPos == -1:
+			return
+		leaf = self.indexFile.readBucket(leafPos)
+		leaf.prevNode = prevPos
+		self.indexFile.writeBucket(leafPos, leaf)
+
+	def insertPosting(self, nodePos:int, node:NodeBPlus, key:any, pointer:int) -> bool:
+		"""Adds pointer to the posting list of key in the leaf, creating it once the leaf holds
+		POSTING_MIN entries of key. False if the entry is to be inserted as is"""
+		if self.postings is None:
+			return False
+		first, last = node.find(key), node.findAfter(key)
+		for i in range(first, last):
+			if PostingFile.isPosting(node.pointers[i]):
+				self.postings.append(PostingFile.head(node.pointers[i]), pointer)
+				return True
+		if last - first + 1 < self.POSTING_MIN:
+			return False
+		head = self.postings.create(node.pointers[first:last] + [pointer])
+		keys, pointers, payloads = node.entries()
+		node.setEntries(keys[:first + 1] + keys[last:], pointers[:first] + [PostingFile.pointer(head)] + pointers[last:], payloads[:first + 1] + payloads[last:])
+		self.indexFile.writeBucket(nodePos, node)
+		self.logger.info(f"Moved {last - first + 1} entries of key {key} to a posting list")
+		return True
+
+	def postingEntries(self, entries):
+		"""Entries of a bulk load with the runs of POSTING_MIN or more equal keys as posting entries"""
+		for key, group in itertools.groupby(entries, key=lambda entry: entry[0]):
+			run = list(itertools.islice(group, self.POSTING_MIN))
+			if len(run) < self.POSTING_MIN:
+				yield from run
+				continue
+			positions = [pos for _, pos, _ in run] + [pos for _, pos, _ in group]
+			yield key, PostingFile.pointer(self.postings.create(positions)), b""
+
+	def expand(self, key:any, pointer:int, payload:bytes, reverse:bool = False):
+		"""(key, position, payload) of the records of a leaf entry"""
+		if not PostingFile.isPosting(pointer):
+			yield key, pointer, payload
+			return
+		head = PostingFile.head(pointer)
+		positions = reversed(self.postings.read(head)) if reverse else self.postings.positions(head)
+		for pos in positions:
+			yield key, pos, payload
+
+	def bulk_load(self, entries, fill_factor:float = FILL_FACTOR):
+		"""Builds an empty tree from (key, position, payload) entries sorted by key: leaves are packed to
+		fill_factor and linked in file order, then every internal level is built bottom-up from the first key
+		of each node of the level below. Nodes are appended sequentially, the root is written last"""
+		if self.indexFile.getHeader() != -1:
+			raise Exception("bulk load needs an empty index")
+		self.indexFile.truncate() # free nodes of an emptied tree
+		fill = max(1, min(self.BLOCK_FACTOR - 1, round(self.BLOCK_FACTOR * fill_factor))) # a full node splits
+		entries = iter(entries)
+		if self.postings is not None:
+			self.postings.clear() # the lists of an emptied tree are all free
+			entries = self.postingEntries(entries)
+		first = self.indexFile.nodeCount()
+		level = [] # (first key, position) of every node of the level
+		batch = []
+		chunk = list(itertools.islice(entries, fill))
+		while chunk:
+			following = list(itertools.islice(entries, fill))
+			pos = first + len(level)
+			keys, pointers, payloads = [list(values) for values in zip(*chunk)]
+			batch.append(NodeBPlus(self.column, keys, pointers, True, len(keys), pos + 1 if following else -1, payloads, self.payload_size, self.BLOCK_FACTOR, pos - 1 if level else -1))
+			level.append((keys[0], pos))
+			if len(batch) == self.BULK_BATCH:
+				self.indexFile.appendBuckets(batch)
+				batch = []
+			chunk = following
+		if batch:
+			self.indexFile.appendBuckets(batch)
+		if not level:
+			return
+		children = max(fill, 2) + 1
+		while len(level) > 1:
+			groups = [level[i:i + children] for i in range(0, len(level), children)]
+			if len(groups[-1]) == 1: # an internal node needs two children
+				groups[-1].insert(0, groups[-2].pop())
+			first = self.indexFile.nodeCount()
+			nodes = [NodeBPlus(self.column, [key for key, _ in group[1:]], [pos for _, pos in group], False, len(group) - 1, -1, payload_size=self.payload_size, block_factor=self.BLOCK_FACTOR) for group in groups]
+			for i in range(0, len(nodes), self.BULK_BATCH):
+				self.indexFile.appendBuckets(nodes[i:i + self.BULK_BATCH])
+			level = [(group[0][0], first + i) for i, group in enumerate(groups)]
+		self.indexFile.writeHeader(level[0][1])
+		self.logger.info(f"Bulk loaded {self.indexFile.filename}")
+
 	def getAll(self) -> list[int]:
 		self.logger.warning(f"GET ALL RECORDS")
 		firstPos:int = self.indexFile.getHeader()
@@ -314,16 +827,13 @@ class BPlusTree:
 			self.logger.info(f"File: {self.indexFile.filename} is empty: []")
 			return []
 		
-		node:NodeBPlus = self.indexFile.readBucket(firstPos)
-		while(not node.isLeaf):
-			firstPos = node.pointers[0]
-			node = self.indexFile.readBucket(firstPos)
+		node:NodeBPlus = self.firstLeaf(firstPos)
 
 		pointers: list[int] = []
 		while(True):
 			assert(node.isLeaf)
 			for i in range(node.size):
-				pointers.append(node.pointers[i])
+				pointers.extend(pos for _, pos, _ in self.expand(node.keys[i], node.pointers[i], b""))
 			if(node.nextNode == -1): break
 			node = self.indexFile.readBucket(node.nextNode)
 
@@ -333,73 +843,188 @@ class BPlusTree:
 	
 	def search(self, key:any) -> list[int]:
 		self.logger.warning(f"SEARCHING: {key}")
+		return list(self.scan(key, key))
+
+	def rangeSearch(self, ini:any, end:any) -> list[int]:
+		self.logger.warning(f"RANGE-SEARCH: {ini}, {end}")
+		return list(self.scan(ini, end))
+
+	def delete(self, key:any, pointer:int = None) -> bool:
+		"""Removes the entry of key, the one of the record at pointer if given. A node left with less than
+		MIN_KEYS borrows an entry from a sibling or is merged with one, a root left empty is replaced by its
+		only child, and freed nodes go to the free list of the file. False if there was no such entry"""
+		self.logger.warning(f"DELETING: {key}")
 		rootPos = self.indexFile.getHeader()
 		if(rootPos == -1):
-			self.logger.fileIsEmpty(self.indexFile.filename)
-			self.logger.info(f"NOT FOUND record with id: {key}")
-			return []
+			return False
+		found, size = self.deleteAux(rootPos, key, pointer)
+		if found and size == 0:
+			root = self.indexFile.readBucket(rootPos)
+			self.indexFile.writeHeader(-1 if root.isLeaf else root.pointers[0])
+			self.indexFile.freeBucket(rootPos)
+		return found
 
-		return self.rangeSearchAux(key, key)
+	def deleteAux(self, nodePos:int, key:any, pointer:int) -> tuple[bool, int]: # found?, size of the node after it
+		node:NodeBPlus = self.indexFile.readBucket(nodePos)
+		if(node.isLeaf):
+			for i in range(node.find(key), node.findAfter(key)):
+				if PostingFile.isPosting(node.pointers[i]):
+					found, remaining = self.postings.remove(PostingFile.head(node.pointers[i]), pointer)
+					if not found:
+						continue
+					if remaining: # the leaf is unchanged
+						return True, node.size
+					node.removeLeafId(i)
+					self.indexFile.writeBucket(nodePos, node)
+					return True, node.size
+				if pointer is None or node.pointers[i] == pointer:
+					node.removeLeafId(i)
+					self.indexFile.writeBucket(nodePos, node)
+					return True, node.size
+			return False, node.size
+		# child i holds keys between keys[i - 1] and keys[i], both included (duplicates)
+		for i in range(node.find(key), node.findAfter(key) + 1):
+			found, size = self.deleteAux(node.pointers[i], key, pointer)
+			if found:
+				if size < self.MIN_KEYS:
+					self.rebalance(node, i)
+					self.indexFile.writeBucket(nodePos, node)
+				return True, node.size
+		return False, node.size
 
-	def rangeSearch(self, ini:any, end:any) -> list[int]:
-		if(ini == None):
-			ini = utils.get_min_value(self.column)
-		if(end == None):
-			end = utils.get_max_value(self.column)
-		self.logger.warning(f"RANGE-SEARCH: {ini}, {end}")
+	def rebalance(self, parent:NodeBPlus, i:int):
+		"""Refills child i of parent, left with less than MIN_KEYS, from a sibling or merges it with one"""
+		child = self.indexFile.readBucket(parent.pointers[i])
+		left = self.indexFile.readBucket(parent.pointers[i - 1]) if i > 0 else None
+		if left is not None and left.size > self.MIN_KEYS:
+			self.borrowLeft(parent, i, left, child)
+			return
+		right = self.indexFile.readBucket(parent.pointers[i + 1]) if i < parent.size else None
+		if right is not None and right.size > self.MIN_KEYS:
+			self.borrowRight(parent, i, child, right)
+			return
+		if left is not None:
+			self.merge(parent, i - 1, left, child)
+		else:
+			self.merge(parent, i, child, right)
 
-		return self.rangeSearchAux(ini, end)
+	def borrowLeft(self, parent:NodeBPlus, i:int, left:NodeBPlus, child:NodeBPlus):
+		leftKeys, leftPointers, leftPayloads = left.entries()
+		keys, pointers, payloads = child.entries()
+		if child.isLeaf:
+			child.setEntries(leftKeys[-1:] + keys, leftPointers[-1:] + pointers, leftPayloads[-1:] + payloads)
+			parent.keys[i - 1] = leftKeys[-1]
+		else: # the separator comes down, the last key of left goes up
+			child.setEntries([parent.keys[i - 1]] + keys, leftPointers[-1:] + pointers)
+			parent.keys[i - 1] = leftKeys[-1]
+		left.setEntries(leftKeys[:-1], leftPointers[:-1], leftPayloads[:-1])
+		self.indexFile.writeBucket(parent.pointers[i - 1], left)
+		self.indexFile.writeBucket(parent.pointers[i], child)
 
-	def delete(self, key:any):
-		self.logger.warning(f"DELETING: {key}")
-		pass
+	def borrowRight(self, parent:NodeBPlus, i:int, child:NodeBPlus, right:NodeBPlus):
+		rightKeys, rightPointers, rightPayloads = right.entries()
+		keys, pointers, payloads = child.entries()
+		if child.isLeaf:
+			child.setEntries(keys + rightKeys[:1], pointers + rightPointers[:1], payloads + rightPayloads[:1])
+			parent.keys[i] = rightKeys[1]
+		else:
+			child.setEntries(keys + [parent.keys[i]], pointers + rightPointers[:1])
+			parent.keys[i] = rightKeys[0]
+		right.setEntries(rightKeys[1:], rightPointers[1:], rightPayloads[1:])
+		self.indexFile.writeBucket(parent.pointers[i], child)
+		self.indexFile.writeBucket(parent.pointers[i + 1], right)
+
+	def merge(self, parent:NodeBPlus, j:int, left:NodeBPlus, right:NodeBPlus):
+		"""Moves right, the child after separator j, into left and frees it"""
+		leftKeys, leftPointers, leftPayloads = left.entries()
+		rightKeys, rightPointers, rightPayloads = right.entries()
+		if left.isLeaf:
+			left.setEntries(leftKeys + rightKeys, leftPointers + rightPointers, leftPayloads + rightPayloads)
+			left.nextNode = right.nextNode
+			self.relink(right.nextNode, parent.pointers[j])
+		else:
+			left.setEntries(leftKeys + [parent.keys[j]] + rightKeys, leftPointers + rightPointers)
+		rightPos = parent.pointers[j + 1]
+		self.indexFile.writeBucket(parent.pointers[j], left)
+		self.indexFile.freeBucket(rightPos)
+		parentKeys, parentPointers, _ = parent.entries()
+		parent.setEntries(parentKeys[:j] + parentKeys[j + 1:], parentPointers[:j + 1] + parentPointers[j + 2:])
+
+	def scan(self, lo:any = None, hi:any = None, lo_inclusive:bool = True, hi_inclusive:bool = True, reverse:bool = False, limit:int = None):
+		"""Lazily yields the record positions with keys between lo and hi (None is unbounded) in key order"""
+		for _, pointer in self.scan_items(lo, hi, lo_inclusive, hi_inclusive, reverse, limit):
+			yield pointer
+
+	def scan_items(self, lo:any = None, hi:any = None, lo_inclusive:bool = True, hi_inclusive:bool = True, reverse:bool = False, limit:int = None):
+		"""Like scan, yielding (key, position) pairs"""
+		for key, pointer, _ in self.scan_entries(lo, hi, lo_inclusive, hi_inclusive, reverse, limit):
+			yield key, pointer
 
-	def rangeSearchAux(self, ini, end) -> list[int]:
+	def scan_entries(self, lo:any = None, hi:any = None, lo_inclusive:bool = True, hi_inclusive:bool = True, reverse:bool = False, limit:int = None):
+		"""Like scan, yielding (key, position, payload) of every entry"""
+		if limit is not None and limit <= 0:
+			return
 		rootPos = self.indexFile.getHeader()
 		if(rootPos == -1):
 			self.logger.fileIsEmpty(self.indexFile.filename)
-			self.logger.info(f"NOT FOUND records in range start: {ini} and end: {end}")
-			return []
-		
-		leafPos = self.searchAux(rootPos, ini)
-		
-		ite = 0
-		result = []
-		leafNode = self.indexFile.readBucket(leafPos)
-		while(ite < leafNode.size and leafNode.keys[ite] < ini):
-			ite += 1
+			return
+		entries = self.scanDesc(rootPos, lo, hi, lo_inclusive, hi_inclusive) if reverse else self.scanAsc(rootPos, lo, hi, lo_inclusive, hi_inclusive)
+		for count, entry in enumerate(entries, 1):
+			yield entry
+			if count == limit:
+				return
 
-		if(leafNode.nextNode != -1 and ite == leafNode.size):
+	def scanAsc(self, rootPos:int, lo, hi, lo_inclusive:bool, hi_inclusive:bool):
+		leafNode = self.searchAux(rootPos, lo) if lo is not None else self.firstLeaf(rootPos)
+		while(True):
+			start, end = leafNode.bounds(lo, hi, lo_inclusive, hi_inclusive)
+			for i in range(start, end):
+				yield from self.expand(leafNode.keys[i], leafNode.pointers[i], leafNode.payloads[i])
+			if(end < leafNode.size or leafNode.nextNode == -1): # past hi
+				return
 			leafNode = self.indexFile.readBucket(leafNode.nextNode)
-			ite = 0
-			
-		while(leafNode.keys[ite] <= end):
-			result.append(leafNode.pointers[ite])
-			ite += 1
-			if(ite == leafNode.size):
-				if(leafNode.nextNode == -1):
-					break
-				leafNode = self.indexFile.readBucket(leafNode.nextNode)
-				ite = 0
-		return result
+
+	def scanDesc(self, rootPos:int, lo, hi, lo_inclusive:bool, hi_inclusive:bool):
+		# from the last leaf that may hold hi, right to left along the prev links
+		leafNode = self.lastLeaf(rootPos, hi, hi_inclusive)
+		while(True):
+			start, end = leafNode.bounds(lo, hi, lo_inclusive, hi_inclusive)
+			for i in range(end - 1, start - 1, -1):
+				yield from self.expand(leafNode.keys[i], leafNode.pointers[i], leafNode.payloads[i], reverse=True)
+			if(start > 0 or leafNode.prevNode == -1): # past lo
+				return
+			leafNode = self.indexFile.readBucket(leafNode.prevNode)
+
+	def firstLeaf(self, nodePos:int) -> NodeBPlus:
+		node:NodeBPlus = self.indexFile.readBucket(nodePos)
+		while(not node.isLeaf):
+			node = self.indexFile.readBucket(node.pointers[0])
+		return node
 	
-	def searchAux(self, nodePos:int, key) -> int:
+	def lastLeaf(self, nodePos:int, key = None, inclusive:bool = True) -> NodeBPlus:
+		"""Rightmost leaf that may hold keys <= key (< key if not inclusive), the last leaf if key is None"""
+		node:NodeBPlus = self.indexFile.readBucket(nodePos)
+		while(not node.isLeaf):
+			# child i holds keys between keys[i - 1] and keys[i], both included (duplicates)
+			ite = node.size if key is None else node.findAfter(key) if inclusive else node.find(key)
+			node = self.indexFile.readBucket(node.pointers[ite])
+		return node
+
+	def searchAux(self, nodePos:int, key) -> NodeBPlus:
+		"""Leaf where the first key >= key is, equal keys may be left of a separator"""
 		node:NodeBPlus = self.indexFile.readBucket(nodePos)
 		if(node.isLeaf):
-			return nodePos
+			return node
 		else:
-			self.logger.info(f"Searching in internal node: key={key}")
-			ite = 0
-			while(ite < node.size and node.keys[ite] < key):
-				ite += 1
-			if(ite < node.size and node.keys[ite] == key):
-				ite += 1
-			self.logger.info(f"Going to pointer: {node.pointers[ite]}")
+			ite = node.find(key)
 			return self.searchAux(node.pointers[ite], key)
 	
 	def clear(self):
 		self.logger.info("Cleaning data, removing files")
 		os.remove(self.indexFile.filename)
+		IndexCache().invalidate(self.indexFile.filename)
+		if self.postings is not None:
+			self.postings.clear()
 
 	def printBuckets(self):
 		rootPos = self.indexFile.getHeader()
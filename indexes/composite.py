@@ -0,0 +1,156 @@
+import os, sys, struct
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.schema import TableSchema, Column, DataType, IndexType, IndexSchema
+from indexes.bplustree import BPlusTree
+from indexes.EHtree import ExtendibleHashTree
+
+
+class TupleKey:
+    """Order-preserving encoding of a tuple of column values as one fixed-size byte string: comparing two
+    encoded keys as bytes gives the order of their tuples. Every value takes the width of its column,
+    INT and FLOAT are big-endian with the sign bit flipped (all bits of negative floats), VARCHAR is
+    its utf-8 bytes padded with zeros."""
+
+    def __init__(self, columns : list[Column]):
+        self.columns = columns
+        for column in columns:
+            if column.data_type not in [DataType.INT, DataType.FLOAT, DataType.VARCHAR, DataType.BOOL]:
+                raise Exception(f"{column.data_type} columns can't be part of a composite key")
+        self.widths = [column.varchar_length if column.data_type == DataType.VARCHAR else 1 if column.data_type == DataType.BOOL else 4 for column in columns]
+        self.size = sum(self.widths)
+
+    def encode(self, values) -> bytes:
+        """Key of the values of the first len(values) columns, a prefix of the key of the whole tuple"""
+        return b"".join(self.encode_value(column, value) for column, value in zip(self.columns, values))
+
+    @staticmethod
+    def encode_value(column : Column, value) -> bytes:
+        match column.data_type:
+            case DataType.INT:
+                return struct.pack(">I", (value + 2**31) & 0xFFFFFFFF)
+            case DataType.FLOAT:
+                bits = struct.unpack(">I", struct.pack(">f", value + 0.0))[0] # -0.0 + 0.0 is 0.0
+                return struct.pack(">I", bits ^ 0xFFFFFFFF if bits & 0x80000000 else bits | 0x80000000)
+            case DataType.VARCHAR:
+                return value.encode()[:column.varchar_length].ljust(column.varchar_length, b"\x00")
+            case DataType.BOOL:
+                return b"\x01" if value else b"\x00"
+
+    def decode(self, key : bytes) -> tuple:
+        values = []
+        offset = 0
+        for column, width in zip(self.columns, self.widths):
+            raw = key[offset:offset + width]
+            offset += width
+            match column.data_type:
+                case DataType.INT:
+                    values.append(struct.unpack(">I", raw)[0] - 2**31)
+                case DataType.FLOAT:
+                    bits = struct.unpack(">I", raw)[0]
+                    values.append(round(struct.unpack(">f", struct.pack(">I", bits & 0x7FFFFFFF if bits & 0x80000000 else bits ^ 0xFFFFFFFF))[0], 6))
+                case DataType.VARCHAR:
+                    values.append(raw.decode().strip("\x00"))
+                case DataType.BOOL:
+                    values.append(raw != b"\x00")
+        return tuple(values)
+
+    @staticmethod
+    def successor(prefix : bytes) -> bytes | None:
+        """Smallest byte string above every key starting with prefix, None if there is none"""
+        prefix = prefix.rstrip(b"\xff")
+        if not prefix:
+            return None
+        return prefix[:-1] + bytes([prefix[-1] + 1])
+
+    def bounds(self, prefix : list, lo = None, lo_inclusive : bool = True, hi = None, hi_inclusive : bool = True):
+        """(lo, lo_inclusive, hi, hi_inclusive) byte bounds of the keys equal to prefix on its columns and
+        between lo and hi (None is unbounded) on the next one, None if no key can be in them"""
+        start = self.encode(prefix)
+        key_lo, key_lo_inclusive = start if start else None, True
+        key_hi, key_hi_inclusive = self.successor(start), False
+        column = self.columns[len(prefix)] if len(prefix) < len(self.columns) else None
+        if lo != None:
+            key_lo = start + self.encode_value(column, lo)
+            if not lo_inclusive:
+                key_lo = self.successor(key_lo)
+                if key_lo == None:
+                    return None
+        if hi != None:
+            key_hi = start + self.encode_value(column, hi)
+            key_hi_inclusive = False
+            if hi_inclusive:
+                key_hi = self.successor(key_hi)
+        return key_lo, key_lo_inclusive, key_hi, key_hi_inclusive
+
+
+class CompositeIndex:
+    """Index on a tuple of columns: a B+ tree or extendible hash over the TupleKey of their values.
+    A B+ tree answers equality on a prefix of the columns and a range on the next one with one scan,
+    a hash only equality on all of them. The INCLUDE columns of a B+ tree are stored in its leaf
+    entries, so queries on covered columns are answered by entries without reading the records."""
+
+    def __init__(self, table_schema : TableSchema, index_schema : IndexSchema):
+        self.index_schema = index_schema
+        columns = [table_schema.get_column_by_name(name) for name in index_schema.column_names]
+        included = [table_schema.get_column_by_name(name) for name in getattr(index_schema, "include", [])]
+        self.positions = [table_schema.columns.index(column) for column in columns + included]
+        self.key = TupleKey(columns)
+        self.payload = TupleKey(included)
+        key_column = Column(index_schema.key_name(), DataType.KEY, index_type=index_schema.index_type, varchar_length=self.key.size)
+        if included and index_schema.index_type != IndexType.BTREE:
+            raise Exception("INCLUDE columns are only supported by BTREE indexes")
+        match index_schema.index_type:
+            case IndexType.BTREE:
+                self.index = BPlusTree(table_schema, key_column, self.payload.size)
+            case IndexType.HASH:
+                self.index = ExtendibleHashTree(table_schema, key_column)
+            case _:
+                raise Exception(f"{index_schema.index_type} index not supported on more than one column")
+        self.ORDERED = self.index.ORDERED
+
+    def values(self, record_values : list) -> tuple:
+        """Values of the index columns in a record, followed by those of the INCLUDE columns"""
+        return tuple(record_values[i] for i in self.positions)
+
+    def entry(self, pos : int, values) -> tuple:
+        """(key, position, payload) of a B+ tree entry, as bulk_load takes them"""
+        width = len(self.key.columns)
+        return self.key.encode(values[:width]), pos, self.payload.encode(values[width:])
+
+    def insert(self, pos : int, values):
+        key, _, payload = self.entry(pos, values)
+        if self.payload.columns:
+            self.index.insert(pos, key, payload)
+        else:
+            self.index.insert(pos, key)
+
+    def delete(self, values, pos : int = None):
+        """Removes the entry of values, the one of the record at pos if given"""
+        key = self.key.encode(values[:len(self.key.columns)])
+        self.index.delete(key, pos)
+
+    def search(self, values) -> list[int]:
+        return list(self.scan(values))
+
+    def scan(self, prefix : list, lo = None, hi = None, lo_inclusive : bool = True, hi_inclusive : bool = True, reverse : bool = False, limit : int = None):
+        """Record positions with prefix on the first columns and the next one between lo and hi, in key order"""
+        bounds = self.key.bounds(list(prefix), lo, lo_inclusive, hi, hi_inclusive)
+        if bounds == None:
+            return iter(())
+        key_lo, key_lo_inclusive, key_hi, key_hi_inclusive = bounds
+        if len(prefix) == len(self.positions) and not self.ORDERED: # whole key, a single bucket of the hash
+            return self.index.scan(key_lo, key_lo, limit=limit)
+        return self.index.scan(key_lo, key_hi, key_lo_inclusive, key_hi_inclusive, reverse=reverse, limit=limit)
+
+    def entries(self, prefix : list, lo = None, hi = None, lo_inclusive : bool = True, hi_inclusive : bool = True, reverse : bool = False, limit : int = None):
+        """(position, values) of the entries of scan, values as returned by values(); B+ tree only"""
+        bounds = self.key.bounds(list(prefix), lo, lo_inclusive, hi, hi_inclusive)
+        if bounds == None:
+            return
+        key_lo, key_lo_inclusive, key_hi, key_hi_inclusive = bounds
+        for key, pos, payload in self.index.scan_entries(key_lo, key_hi, key_lo_inclusive, key_hi_inclusive, reverse=reverse, limit=limit):
+            yield pos, self.key.decode(key) + self.payload.decode(payload)
+
+    def clear(self):
+        self.index.clear()
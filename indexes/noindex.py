@@ -5,9 +5,11 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from core.schema import TableSchema, Column
 from core import utils
-from core.record_file import RecordFile
+from core.conditionschema import BinaryCondition, BetweenCondition, RangeCondition, ConditionColumn, ConditionValue, BinaryOp
+from core.scan import VectorScan
 
 class NoIndex:
+	ORDERED = False # scan sorts the matching positions
 	def __init__(self, schema:TableSchema, column:Column):
 		self.column = column
 		self.schema = schema
@@ -22,36 +24,28 @@ class NoIndex:
 	def getAll(self) -> list[int]:
 		pass
 	
+	def _filter(self, condition) -> list[int]:
+		return VectorScan(self.schema).filter(condition) # deleted records are skipped
+
 	def search(self, key) -> list[int]:
-		record_file = RecordFile(self.schema)
-		pos = 0
-		max_pos = record_file.max_id()
-		res = []
-		
-		while pos < max_pos:
-			record = record_file.read(pos)
-			if record.values[self.value_pos] == key:
-				res.append(pos)
-			pos += 1
-		return res
+		return self._filter(BinaryCondition(ConditionColumn(self.column.name), BinaryOp.EQ, ConditionValue(key)))
 
 	def rangeSearch(self, ini, end) -> list[int]:
 		if(ini == None):
 			ini = utils.get_min_value(self.column)
 		if(end == None):
 			end = utils.get_max_value(self.column)
-		
-		record_file = RecordFile(self.schema)
-		pos = 0
-		max_pos = record_file.max_id()
-		res = []
-		
-		while pos < max_pos:
-			record = record_file.read(pos)
-			if record.values[self.value_pos] >= ini and record.values[self.value_pos] <= end:
-				res.append(pos)
-			pos += 1
-		return res
+		return self._filter(BetweenCondition(ConditionColumn(self.column.name), ConditionValue(ini), ConditionValue(end)))
 	
+	def scan(self, lo = None, hi = None, lo_inclusive : bool = True, hi_inclusive : bool = True, reverse : bool = False, limit : int = None):
+		"""Positions with values between lo and hi (None is unbounded) in value order"""
+		vector_scan = VectorScan(self.schema)
+		positions = vector_scan.filter(RangeCondition(ConditionColumn(self.column.name),
+			ConditionValue(lo) if lo is not None else None, ConditionValue(hi) if hi is not None else None, lo_inclusive, hi_inclusive))
+		yield from vector_scan.sort_positions(self.column.name, positions, reverse)[:limit]
+
+	def delete(self, key):
+		pass
+
 	def clear(self):
 		pass
\ No newline at end of file
@@ -38,10 +38,14 @@ class CustomLogger:
 		self.logger.warning(f"File: {file} doesn't exists, initializing it")
 
 	def writingBucket(self, file, pos, keys):
+		if not self.logger.isEnabledFor(logging.INFO): # page-sized buckets hold hundreds of keys
+			return
 		file = file.split("\\")[-1]
 		self.logger.info(f"Writing bucket in file: {file} at position: {pos} with keys: {keys}")
 
 	def readingBucket(self, file, pos, keys):
+		if not self.logger.isEnabledFor(logging.INFO):
+			return
 		file = file.split("\\")[-1]
 		self.logger.info(f"Reading bucket from file: {file} at position: {pos} with keys: {keys}")
 
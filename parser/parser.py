@@ -4,7 +4,7 @@ if root_path not in sys.path:
     sys.path.append(root_path)
 from parser.scanner import Token, Scanner
 from core.conditionschema import BinaryOp, Condition, ConditionColumn, ConditionValue, NotCondition, BinaryCondition, BetweenCondition, BooleanColumn
-from core.schema import TableSchema, DataType, IndexType, SelectSchema, DeleteSchema, ConditionSchema, Column
+from core.schema import TableSchema, DataType, IndexType, SelectSchema, DeleteSchema, ConditionSchema, Column, Aggregate, AggregateFunction, JoinSchema
 from core.dbmanager import DBManager
 
 class Stmt:
@@ -12,18 +12,20 @@ class Stmt:
         pass
 
 class SelectStmt(Stmt):
-    def __init__(self, table_name : str = None, condition : Condition = None, all : bool = False, column_list : list[str] = None, order_by : str = None, asc : bool = True, limit : int = None):
+    def __init__(self, table_name : str = None, condition : Condition = None, all : bool = False, column_list : list = None, order_by : str = None, asc : bool = True, limit : int = None, group_by : list[str] = None, join : JoinSchema = None):
         super().__init__()
         self.table_name = table_name
+        self.join = join
         self.condition = condition
+        self.group_by = group_by if group_by else []
         self.all = all
         self.column_list = column_list if column_list else []
         self.order_by = order_by
         self.asc = asc
         self.limit = limit
 
-    def add_column(self, column_name : str) -> None:
-        self.column_list.append(column_name)
+    def add_column(self, column) -> None: # column name or Aggregate
+        self.column_list.append(column)
 
 class InsertStmt(Stmt):
     def __init__(self, table_name : str = None, column_list : list[str] = None, value_list : list = None):
@@ -70,14 +72,15 @@ class DropTableStmt(Stmt):
         self.table_name = table_name
         self.if_exists = if_exists
 
-# <create-index-stmt> ::= "CREATE" "INDEX" <index-name> "ON" <table-name> [ "USING" <index-type> ] "(" <column-list> ")"
+# <create-index-stmt> ::= "CREATE" "INDEX" <index-name> "ON" <table-name> [ "USING" <index-type> ] "(" <column-list> ")" [ "INCLUDE" "(" <column-list> ")" ]
 class CreateIndexStmt(Stmt):
-    def __init__(self, index_name : str = None, table_name : str = None, index_type : IndexType = None, column_list : list[str] = None):
+    def __init__(self, index_name : str = None, table_name : str = None, index_type : IndexType = None, column_list : list[str] = None, include : list[str] = None):
         super().__init__()
         self.index_name = index_name
         self.table_name = table_name
         self.index_type = index_type
         self.column_list = column_list if column_list else []
+        self.include = include if include else []
 
     def add_column(self, column_name : str) -> None:
         self.column_list.append(column_name)
@@ -89,6 +92,12 @@ class DropIndexStmt(Stmt):
         self.index_name = index_name
         self.table_name = table_name
 
+# <analyze-stmt> ::= "ANALYZE" [ "TABLE" ] <table-name>
+class AnalyzeStmt(Stmt):
+    def __init__(self, table_name : str = None):
+        super().__init__()
+        self.table_name = table_name
+
 class SQL:
     def __init__(self, stmt_list : list[Stmt] = None):
         self.stmt_list = stmt_list if stmt_list else []
@@ -174,6 +183,7 @@ class Parser:
     #         | <delete-stmt>
     #         | <create-index-stmt>
     #         | <drop-index-stmt>
+    #         | <analyze-stmt>
     def parse_stmt(self) -> Stmt:
         if self.match(Token.Type.SELECT):
             return self.parse_select_stmt()
@@ -197,37 +207,63 @@ class Parser:
             return self.parse_delete_stmt()
         elif self.match(Token.Type.SELECT):
             return self.parse_select_stmt()
+        elif self.match(Token.Type.ANALYZE):
+            return self.parse_analyze_stmt()
         else:
             self.error("unexpected start of an instruction")
 
-    # <select-stmt> ::= "SELECT" <select-list> "FROM" <table-name> [ "WHERE" <condition> ]
-    # <select-list> ::= "*" | <column-name> { "," <column-name> }
+    # <select-stmt> ::= "SELECT" <select-list> "FROM" <table-name> [ "JOIN" <table-name> "ON" <column-ref> "=" <column-ref> ] [ "WHERE" <condition> ] [ "GROUP" "BY" <column-list> ]
+    # <select-list> ::= "*" | <select-item> { "," <select-item> }
     def parse_select_stmt(self) -> SelectStmt:
         select_stmt = SelectStmt()
         if self.match(Token.Type.STAR):
             select_stmt.all = True
-        elif self.match(Token.Type.ID):
-            select_stmt.add_column(self.previous.lexema)
+        elif self.check(Token.Type.ID):
+            select_stmt.add_column(self.parse_select_item())
             while(self.match(Token.Type.COMMA)):
-                if self.match(Token.Type.ID):
-                    select_stmt.add_column(self.previous.lexema)
+                if self.check(Token.Type.ID):
+                    select_stmt.add_column(self.parse_select_item())
                 else:
-                    self.error("expected column name after comma")
+                    self.error("expected column name or aggregate after comma")
         else:
-            self.error("expected '*' or column name after SELECT keyword")
+            self.error("expected '*', column name or aggregate after SELECT keyword")
         if not self.match(Token.Type.FROM):
             self.error("expected FROM clause in SELECT statement")
         if not self.match(Token.Type.ID):
             self.error("expected table name after FROM keyword")
         select_stmt.table_name = self.previous.lexema
+        if self.match(Token.Type.JOIN):
+            if not self.match(Token.Type.ID):
+                self.error("expected table name after JOIN keyword")
+            select_stmt.join = JoinSchema(self.previous.lexema)
+            if not self.match(Token.Type.ON):
+                self.error("expected ON clause after joined table")
+            if not self.match(Token.Type.ID):
+                self.error("expected column name in ON clause")
+            select_stmt.join.left_column = self.parse_column_ref()
+            if not self.match(Token.Type.EQ):
+                self.error("expected '=' in ON clause, only equi-joins are supported")
+            if not self.match(Token.Type.ID):
+                self.error("expected column name after '=' in ON clause")
+            select_stmt.join.right_column = self.parse_column_ref()
         if self.match(Token.Type.WHERE):
             select_stmt.condition = self.parse_or_condition()
+        if self.match(Token.Type.GROUP):
+            if not self.match(Token.Type.BY):
+                self.error("expected BY keyword after GROUP keyword")
+            if not self.match(Token.Type.ID):
+                self.error("expected column name in GROUP BY clause")
+            select_stmt.group_by.append(self.previous.lexema)
+            while self.match(Token.Type.COMMA):
+                if not self.match(Token.Type.ID):
+                    self.error("expected column name after comma in GROUP BY clause")
+                select_stmt.group_by.append(self.previous.lexema)
         if self.match(Token.Type.ORDER):
             if not self.match(Token.Type.BY):
                 self.error("expected BY keyword after ORDER keyword")
             if not self.match(Token.Type.ID):
                 self.error("expected column name in ORDER BY clause")
-            select_stmt.order_by = self.previous.lexema
+            select_stmt.order_by = self.parse_column_ref()
             if self.match(Token.Type.ASC):
                 select_stmt.asc = True
             elif self.match(Token.Type.DESC):
@@ -238,6 +274,38 @@ class Parser:
             select_stmt.limit = self.str_into_type(self.previous.lexema, self.previous)
         return select_stmt
 
+    # <column-ref> ::= [ <table-name> "." ] <column-name>, its first identifier already matched
+    def parse_column_ref(self) -> str:
+        name = self.previous.lexema
+        if self.match(Token.Type.DOT):
+            if not self.match(Token.Type.ID):
+                self.error(f"expected column name after '{name}.'")
+            name = f"{name}.{self.previous.lexema}"
+        return name
+
+    # <select-item> ::= <column-ref> | <aggregate-function> "(" ( "*" | <column-name> ) ")"
+    # aggregate names are not reserved, a column may be called count: it's an aggregate only before "("
+    def parse_select_item(self):
+        self.match(Token.Type.ID)
+        if not self.check(Token.Type.LPAR):
+            return self.parse_column_ref()
+        name = self.previous.lexema.upper()
+        if name not in AggregateFunction.__members__:
+            self.error(f"unknown aggregate function {self.previous.lexema}")
+        function = AggregateFunction[name]
+        self.match(Token.Type.LPAR)
+        if self.match(Token.Type.STAR):
+            if function != AggregateFunction.COUNT:
+                self.error(f"'*' is only valid in COUNT, not in {function}")
+            column_name = None
+        elif self.match(Token.Type.ID):
+            column_name = self.previous.lexema
+        else:
+            self.error(f"expected '*' or column name in {function}")
+        if not self.match(Token.Type.RPAR):
+            self.error(f"expected ')' after {function} argument")
+        return Aggregate(function, column_name)
+
     # <create-table-stmt> ::= "CREATE" "TABLE" <table-name> "(" <column-def-list> ")"
     # <column-def-list> ::= <column-def> { "," <column-def> }
     
@@ -447,6 +515,18 @@ class Parser:
             create_index_stmt.add_column(self.previous.lexema)
         if not self.match(Token.Type.RPAR):
             self.error("expected ')' after column names")
+        if self.match(Token.Type.INCLUDE):
+            if not self.match(Token.Type.LPAR):
+                self.error("expected '(' after INCLUDE keyword")
+            if not self.match(Token.Type.ID):
+                self.error("expected column name after '('")
+            create_index_stmt.include.append(self.previous.lexema)
+            while self.match(Token.Type.COMMA):
+                if not self.match(Token.Type.ID):
+                    self.error("expected column name after comma")
+                create_index_stmt.include.append(self.previous.lexema)
+            if not self.match(Token.Type.RPAR):
+                self.error("expected ')' after included column names")
         return create_index_stmt
 
     # <drop-index-stmt> ::= "DROP" "INDEX" <index-name> [ "ON" <table-name> ]
@@ -462,6 +542,15 @@ class Parser:
         drop_index_stmt.table_name = self.previous.lexema
         return drop_index_stmt
     
+    # <analyze-stmt> ::= "ANALYZE" [ "TABLE" ] <table-name>
+    def parse_analyze_stmt(self) -> AnalyzeStmt:
+        analyze_stmt = AnalyzeStmt()
+        self.match(Token.Type.TABLE)
+        if not self.match(Token.Type.ID):
+            self.error("expected table name after ANALYZE keyword")
+        analyze_stmt.table_name = self.previous.lexema
+        return analyze_stmt
+
     # <or-condition> ::= <and-condition> { "OR" <and-condition> }
     def parse_or_condition(self) -> Condition:
         left = self.parse_and_condition()
@@ -497,7 +586,7 @@ class Parser:
     def parse_simple_condition(self) -> Condition:
         if not self.match(Token.Type.ID):
             self.error("expected column name in condition")
-        column_name = self.previous.lexema
+        column_name = self.parse_column_ref()
         if self.match(Token.Type.BETWEEN):
             between_condition = BetweenCondition()
             between_condition.left = ConditionColumn(column_name)
@@ -664,6 +753,8 @@ class Printer:
             self.print_create_index_stmt(stmt)
         elif stmt_type == DropIndexStmt:
             self.print_drop_index_stmt(stmt)
+        elif stmt_type == AnalyzeStmt:
+            self.print_analyze_stmt(stmt)
         else:
             self.error("unknown statement type")
 
@@ -674,6 +765,11 @@ class Printer:
         self.indent += 2
         self.print_line(f"-> {stmt.table_name}")
         self.indent -= 2
+        if stmt.join:
+            self.print_line("-> Joined with:")
+            self.indent += 2
+            self.print_line(f"-> {stmt.join.table_name} ON {stmt.join.left_column} = {stmt.join.right_column}")
+            self.indent -= 2
         self.print_line("-> Selected columns:")
         self.indent += 2
         if stmt.all:
@@ -682,6 +778,11 @@ class Printer:
             self.print_line(f"-> {', '.join(str(column) for column in stmt.column_list)}")
         self.indent -= 2
         self.print_condition_main(stmt.condition)
+        if stmt.group_by:
+            self.print_line("-> Grouped by:")
+            self.indent += 2
+            self.print_line(f"-> {', '.join(stmt.group_by)}")
+            self.indent -= 2
         self.indent -= 2
     
     def binary_condition_to_str(self, condition : BinaryCondition):
@@ -889,6 +990,11 @@ class Printer:
         self.print_line("-> On columns:")
         self.indent += 2
         self.print_line(f"-> {', '.join(str(column) for column in stmt.column_list)}")
+        if stmt.include:
+            self.indent -= 2
+            self.print_line("-> Including columns:")
+            self.indent += 2
+            self.print_line(f"-> {', '.join(stmt.include)}")
         self.indent -= 4
 
     def print_drop_index_stmt(self, stmt : DropIndexStmt):
@@ -905,6 +1011,14 @@ class Printer:
             self.indent -= 2
         self.indent -= 2
 
+    def print_analyze_stmt(self, stmt : AnalyzeStmt):
+        self.print_line("ANALYZE statement:")
+        self.indent += 2
+        self.print_line("-> Table name:")
+        self.indent += 2
+        self.print_line(f"-> {stmt.table_name}")
+        self.indent -= 4
+
 
 class RuntimeError(Exception):
     def __init__(self, error : str):
@@ -955,11 +1069,14 @@ class Interpreter:
         elif stmt_type == DropIndexStmt:
             self.interpret_drop_index_stmt(stmt)
             return None, "Index dropped successfully"
+        elif stmt_type == AnalyzeStmt:
+            self.interpret_analyze_stmt(stmt)
+            return None, "Table analyzed successfully"
         else:
             self.error("unknown statement type")
 
     def interpret_select_stmt(self, stmt : SelectStmt):
-        select_schema = SelectSchema(stmt.table_name, ConditionSchema(stmt.condition), stmt.all, stmt.column_list, stmt.order_by, stmt.asc, stmt.limit)
+        select_schema = SelectSchema(stmt.table_name, ConditionSchema(stmt.condition), stmt.all, stmt.column_list, stmt.order_by, stmt.asc, stmt.limit, stmt.group_by, stmt.join)
         return self.dbmanager.select(select_schema)
 
     def interpret_create_table_stmt(self, stmt : CreateTableStmt):
@@ -978,12 +1095,15 @@ class Interpreter:
         self.dbmanager.delete(delete_schema)
 
     def interpret_create_index_stmt(self, stmt : CreateIndexStmt):
-        self.dbmanager.create_index(stmt.table_name, stmt.index_name, stmt.column_list, stmt.index_type)
+        self.dbmanager.create_index(stmt.table_name, stmt.index_name, stmt.column_list, stmt.index_type, stmt.include)
 
     def interpret_drop_index_stmt(self, stmt : DropIndexStmt):
         self.dbmanager.drop_index(stmt.table_name, stmt.index_name)
 
 
+    def interpret_analyze_stmt(self, stmt : AnalyzeStmt):
+        self.dbmanager.analyze(stmt.table_name)
+
 def execute_sql(sql:str):
     scanner = Scanner(sql)
     try:
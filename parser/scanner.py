@@ -7,8 +7,8 @@ class Token:
             CREATE, TABLE, DROP, AND, OR, NOT, AS, ORDER, BY, LIMIT, ID, STAR, BETWEEN,
             EQ, NEQ, LT, GT, LE, GE, COMMA, DOT, SEMICOLON, NUMVAL, FLOATVAL, STRINGVAL,
             BOOLVAL, PRIMARY, KEY, DATATYPE, INDEX, ON, USING, INDEXTYPE, ERR, END, 
-            WITHIN, RECTANGLE, CIRCLE, KNN, ASC, DESC, IF, EXISTS
-        ) = range(54)
+            WITHIN, RECTANGLE, CIRCLE, KNN, ASC, DESC, IF, EXISTS, ANALYZE, GROUP, JOIN, INCLUDE
+        ) = range(58)
 
     token_names = [
         "LPAR", "RPAR", "SELECT", "FROM", "WHERE", "INSERT", "INTO", "VALUES",
@@ -17,7 +17,7 @@ class Token:
         "GT", "LE", "GE", "COMMA", "DOT", "SEMICOLON", "NUMVAL", "FLOATVAL", "STRINGVAL",
         "BOOLVAL", "PRIMARY", "KEY", "DATATYPE", "INDEX", "ON", "USING", "INDEXTYPE",
         "ERR", "END", "WITHIN", "RECTANGLE", "CIRCLE", "KNN", "ASC", "DESC", "IF",
-        "EXISTS"
+        "EXISTS", "ANALYZE", "GROUP", "JOIN", "INCLUDE"
     ]
 
     def __init__(self, token_type, lexema=""):
@@ -241,6 +241,8 @@ class Scanner:
                     "NOT": Token.Type.NOT,
                     "AS": Token.Type.AS,
                     "ORDER": Token.Type.ORDER,
+                    "GROUP": Token.Type.GROUP,
+                    "JOIN": Token.Type.JOIN,
                     "BY": Token.Type.BY,
                     "LIMIT": Token.Type.LIMIT,
                     "BETWEEN": Token.Type.BETWEEN,
@@ -257,6 +259,7 @@ class Scanner:
                     "INDEX": Token.Type.INDEX,
                     "ON": Token.Type.ON,
                     "USING": Token.Type.USING,
+                    "INCLUDE": Token.Type.INCLUDE,
                     "AVL": Token.Type.INDEXTYPE,
                     "ISAM": Token.Type.INDEXTYPE,
                     "HASH": Token.Type.INDEXTYPE,
@@ -270,7 +273,8 @@ class Scanner:
                     "ASC": Token.Type.ASC,
                     "DESC": Token.Type.DESC,
                     "IF": Token.Type.IF,
-                    "EXISTS": Token.Type.EXISTS
+                    "EXISTS": Token.Type.EXISTS,
+                    "ANALYZE": Token.Type.ANALYZE,
                 }
                 if lexema in keywords:
                     return Token(keywords[lexema], lexema if keywords[lexema] in [Token.Type.BOOLVAL, Token.Type.INDEXTYPE, Token.Type.DATATYPE] else "")
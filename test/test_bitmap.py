@@ -0,0 +1,35 @@
+import os, sys, random
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+from core.bitmap import RoaringBitmap, ARRAY_MAX
+
+class TestRoaringBitmap(unittest.TestCase):
+    UNIVERSE = 200000
+
+    def test_set_operations(self):
+        rng = random.Random(3)
+        for _ in range(10):
+            # sparse (array containers), dense (bitmap containers) and a full container
+            a = set(rng.sample(range(self.UNIVERSE), rng.choice([0, 50, 70000])))
+            b = set(rng.sample(range(self.UNIVERSE), rng.choice([0, 3000, 150000]))) | set(range(65536, 131072))
+            bitmap_a = RoaringBitmap.from_positions(list(a), self.UNIVERSE)
+            bitmap_b = RoaringBitmap.from_positions(list(b), self.UNIVERSE)
+            self.assertEqual(list(bitmap_a), sorted(a))
+            self.assertEqual((bitmap_a & bitmap_b).tolist(), sorted(a & b))
+            self.assertEqual((bitmap_a | bitmap_b).tolist(), sorted(a | b))
+            self.assertEqual((bitmap_a - bitmap_b).tolist(), sorted(a - b))
+            self.assertEqual((~bitmap_a).tolist(), sorted(set(range(self.UNIVERSE)) - a))
+            self.assertEqual(len(bitmap_b), len(b))
+            for position in rng.sample(range(self.UNIVERSE), 100):
+                self.assertEqual(position in bitmap_a, position in a)
+
+    def test_containers(self):
+        bitmap = RoaringBitmap.from_positions(range(0, 2 * ARRAY_MAX, 2), self.UNIVERSE)
+        self.assertEqual(bitmap.containers[0].dtype.name, "uint16") # sparse stays an array
+        bitmap = ~bitmap
+        self.assertEqual(bitmap.containers[0].dtype.name, "uint64")
+        self.assertEqual(len(RoaringBitmap.full(self.UNIVERSE) - bitmap), ARRAY_MAX)
+        self.assertEqual(len(~RoaringBitmap.full(self.UNIVERSE)), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import os, sys, shutil, random
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+from core.schema import Column, TableSchema, DataType, IndexType, IndexSchema
+from core.conditionschema import BinaryCondition, ConditionColumn, ConditionValue, BinaryOp
+from core.record_file import Record, RecordFile
+from core.buffer_pool import BufferPool
+from core.planner import Planner, AccessPath
+from indexes.composite import TupleKey, CompositeIndex
+from core import utils
+
+def cond(column, op, value):
+    return BinaryCondition(ConditionColumn(column), op, ConditionValue(value))
+
+class TestCompositeIndex(unittest.TestCase):
+    def setUp(self):
+        self.schema = TableSchema("test_composite_index", [
+            Column("id", data_type=DataType.INT, is_primary=True, index_type=IndexType.BTREE),
+            Column("brand", data_type=DataType.INT),
+            Column("model", data_type=DataType.VARCHAR, varchar_length=6),
+            Column("price", data_type=DataType.FLOAT),
+        ])
+        self.path = os.path.join(utils.DATA_DIR, self.schema.table_name)
+        BufferPool().discard(utils.get_record_file_path(self.schema.table_name))
+        shutil.rmtree(self.path, ignore_errors=True)
+        rng = random.Random(7)
+        self.records = [Record(self.schema, [i, rng.randint(-5, 15), f"m{rng.randint(0, 9)}", rng.randint(-400, 400) / 4]) for i in range(600)]
+        rf = RecordFile(self.schema)
+        for record in self.records:
+            rf.append(record)
+        rf.flush()
+
+    def tearDown(self):
+        BufferPool().discard(utils.get_record_file_path(self.schema.table_name))
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_key_order(self):
+        key = TupleKey(self.schema.columns[1:] + [Column("flag", data_type=DataType.BOOL)])
+        tuples = [tuple(record.values[1:]) + (record.values[0] % 2 == 0,) for record in self.records]
+        self.assertEqual(sorted(tuples, key=key.encode), sorted(tuples))
+        self.assertEqual([key.decode(key.encode(values)) for values in tuples], tuples)
+        self.assertEqual(TupleKey.successor(b"a\xff\xff"), b"b")
+        self.assertIsNone(TupleKey.successor(b"\xff"))
+
+    def index(self, index_type):
+        index = CompositeIndex(self.schema, IndexSchema("idx_brand_model", ["brand", "model", "price"], index_type))
+        for pos, record in enumerate(self.records):
+            index.insert(pos, index.values(record.values))
+        return index
+
+    def test_btree_prefix_scan(self):
+        index = self.index(IndexType.BTREE)
+        def matches(predicate):
+            return sorted((tuple(r.values[1:]), r.values[0]) for r in self.records if predicate(r.values))
+        self.assertEqual(list(index.scan([3])), [pos for _, pos in matches(lambda v: v[1] == 3)])
+        self.assertEqual(list(index.scan([3, "m4"])), [pos for _, pos in matches(lambda v: v[1] == 3 and v[2] == "m4")])
+        self.assertEqual(list(index.scan([-2], "m2", "m5", lo_inclusive=False)), [pos for _, pos in matches(lambda v: v[1] == -2 and "m2" < v[2] <= "m5")])
+        self.assertEqual(list(index.scan([7, "m1"], hi=0.0, hi_inclusive=False, reverse=True)), [pos for _, pos in reversed(matches(lambda v: v[1] == 7 and v[2] == "m1" and v[3] < 0.0))])
+        self.assertEqual(list(index.scan([], 14)), [pos for _, pos in matches(lambda v: v[1] >= 14)])
+        record = self.records[42]
+        self.assertIn(42, index.search(index.values(record.values)))
+
+    def test_hash_lookup(self):
+        index = self.index(IndexType.HASH)
+        record = self.records[42]
+        expected = [r.values[0] for r in self.records if r.values[1:] == record.values[1:]]
+        self.assertEqual(sorted(index.search(index.values(record.values))), expected)
+
+    def test_covering_entries(self):
+        index = CompositeIndex(self.schema, IndexSchema("idx_model", ["model"], IndexType.BTREE, ["price", "brand"]))
+        for pos, record in enumerate(self.records):
+            index.insert(pos, index.values(record.values))
+        expected = sorted((r.values[2], r.values[0]) for r in self.records if r.values[2] == "m3")
+        entries = list(index.entries(["m3"]))
+        self.assertEqual([pos for pos, _ in entries], [pos for _, pos in expected])
+        self.assertEqual([values for _, values in entries], [tuple(self.records[pos].values[i] for i in [2, 3, 1]) for _, pos in expected])
+        # a delete removes the entry of its record only, not those of equal keys
+        removed = expected[1][1]
+        index.delete(index.values(self.records[removed].values), removed)
+        self.assertEqual(list(index.scan(["m3"])), [pos for _, pos in expected if pos != removed])
+
+    def test_planner_probe(self):
+        self.schema.composite_indexes = [IndexSchema("idx_brand_model", ["brand", "model"], IndexType.BTREE)]
+        brand, model, price = cond("brand", BinaryOp.EQ, 3), cond("model", BinaryOp.GE, "m4"), cond("price", BinaryOp.LT, 10.0)
+        planner = Planner(self.schema)
+        planner.plan(BinaryCondition(BinaryCondition(price, BinaryOp.AND, model), BinaryOp.AND, brand))
+        probe = planner.probes[id(brand)]
+        self.assertEqual((probe.leaves, probe.values, probe.bounds), ([brand, model], [3], ("m4", True, None, True)))
+        self.assertEqual(planner.paths[id(model)], AccessPath.INDEX_COMPOSITE)
+        self.assertEqual(planner.paths[id(price)], AccessPath.SCAN)
+        # a range on the leading column doesn't let the next column narrow the scan
+        planner = Planner(self.schema)
+        planner.plan(BinaryCondition(cond("brand", BinaryOp.GT, 3), BinaryOp.AND, cond("model", BinaryOp.EQ, "m4")))
+        self.assertEqual(len(next(iter(planner.probes.values())).leaves), 1)
+        # a hash index needs all of its columns
+        self.schema.composite_indexes[0].index_type = IndexType.HASH
+        planner = Planner(self.schema)
+        planner.plan(BinaryCondition(brand, BinaryOp.AND, model))
+        self.assertEqual(planner.probes, {})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os, sys, shutil, random
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+from core.schema import Column, TableSchema, DataType, IndexType
+from core.record_file import Record
+from core.external_sort import ExternalSort
+from core import utils
+
+class TestExternalSort(unittest.TestCase):
+    def setUp(self):
+        self.schema = TableSchema("test_external_sort", [
+            Column("id", data_type=DataType.INT, is_primary=True, index_type=IndexType.BTREE),
+            Column("price", data_type=DataType.FLOAT),
+            Column("name", data_type=DataType.VARCHAR, varchar_length=8),
+        ])
+        self.path = os.path.join(utils.DATA_DIR, self.schema.table_name)
+        shutil.rmtree(self.path, ignore_errors=True)
+        rng = random.Random(7)
+        self.records = [Record(self.schema, [i, rng.randint(0, 400) / 4, f"n{rng.randint(0, 999)}"]) for i in range(3000)]
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_spilled_runs(self):
+        # runs of ~100 rows merged two at a time, several merge passes
+        external_sort = ExternalSort(self.schema, "name", memory_budget=100 * 300)
+        self.assertEqual(external_sort.fan_in, 2)
+        result = [record.values for record in external_sort.sort(self.records)]
+        self.assertEqual([values[2] for values in result], sorted(record.values[2] for record in self.records))
+        self.assertEqual(sorted(values[0] for values in result), list(range(3000)))
+        self.assertEqual(os.listdir(self.path), []) # runs are removed
+
+    def test_reverse_and_limit(self):
+        expected = sorted((record.values[1] for record in self.records), reverse=True)
+        for budget, limit in [(100 * 300, None), (100 * 300, 250), (100 * 300, 20), (None, 20), (None, None)]:
+            external_sort = ExternalSort(self.schema, "price", reverse=True, memory_budget=budget)
+            prices = [record.values[1] for record in external_sort.sort(iter(self.records), limit)]
+            self.assertEqual(prices, expected[:limit])
+
+if __name__ == "__main__":
+    unittest.main()
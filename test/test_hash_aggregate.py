@@ -0,0 +1,57 @@
+import os, sys, shutil, random
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+from core.schema import Column, TableSchema, DataType, IndexType, Aggregate, AggregateFunction
+from core.record_file import Record
+from core.hash_aggregate import HashAggregate
+from core import utils
+
+class TestHashAggregate(unittest.TestCase):
+    def setUp(self):
+        self.schema = TableSchema("test_hash_aggregate", [
+            Column("id", data_type=DataType.INT, is_primary=True, index_type=IndexType.BTREE),
+            Column("category", data_type=DataType.VARCHAR, varchar_length=8),
+            Column("brand", data_type=DataType.INT),
+            Column("price", data_type=DataType.FLOAT),
+        ])
+        self.path = os.path.join(utils.DATA_DIR, self.schema.table_name)
+        shutil.rmtree(self.path, ignore_errors=True)
+        rng = random.Random(3)
+        self.records = [Record(self.schema, [i, f"c{rng.randint(0, 40)}", rng.randint(0, 20), rng.randint(0, 400) / 4]) for i in range(5000)]
+        self.aggregates = [Aggregate(AggregateFunction.COUNT), Aggregate(AggregateFunction.SUM, "price"), Aggregate(AggregateFunction.AVG, "price"),
+                           Aggregate(AggregateFunction.MIN, "id"), Aggregate(AggregateFunction.MAX, "id")]
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def expected(self):
+        groups = {}
+        for record in self.records:
+            groups.setdefault((record.values[1], record.values[2]), []).append(record.values)
+        return {key: [len(rows), sum(r[3] for r in rows), sum(r[3] for r in rows) / len(rows), min(r[0] for r in rows), max(r[0] for r in rows)]
+                for key, rows in groups.items()}
+
+    def check(self, memory_budget):
+        hash_aggregate = HashAggregate(self.schema, ["category", "brand"], self.aggregates, memory_budget=memory_budget)
+        result = list(hash_aggregate.aggregate(iter(self.records)))
+        self.assertEqual(len(result), len({key for key, _ in result})) # every group once
+        expected = self.expected()
+        self.assertEqual({key for key, _ in result}, set(expected))
+        for key, values in result:
+            self.assertEqual(values[0::3], expected[key][0::3])
+            self.assertEqual(values[4], expected[key][4])
+            self.assertAlmostEqual(values[1], expected[key][1])
+            self.assertAlmostEqual(values[2], expected[key][2])
+        return hash_aggregate
+
+    def test_in_memory(self):
+        self.check(None)
+
+    def test_spilled_partitions(self):
+        # ~50 groups in memory out of ~860, partitions are partitioned again
+        hash_aggregate = self.check(50 * (256 + 64 * 5))
+        self.assertEqual(hash_aggregate.max_groups, 50)
+        self.assertEqual(os.listdir(self.path), []) # partitions are removed
+
+if __name__ == "__main__":
+    unittest.main()
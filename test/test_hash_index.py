@@ -0,0 +1,49 @@
+import os, sys, shutil
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+from core.schema import Column, TableSchema, DataType, IndexType
+from indexes.EHtree import ExtendibleHashTree
+from parser.parser import execute_sql
+from core import utils
+
+class TestHashIndex(unittest.TestCase):
+    VALUES = ["w", "x", "y", "z"]
+
+    def setUp(self):
+        self.path = os.path.join(utils.DATA_DIR, "test_hash_index")
+        execute_sql("DROP TABLE IF EXISTS test_hash_index;")
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def tearDown(self):
+        execute_sql("DROP TABLE IF EXISTS test_hash_index;")
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_delete_duplicates(self):
+        # far more records of a key than fit in a bucket, so they go to overflow chains
+        column = Column("d", data_type=DataType.VARCHAR, varchar_length=4, index_type=IndexType.HASH)
+        index = ExtendibleHashTree(TableSchema("test_hash_index", [column]), column)
+        keys = {pos: self.VALUES[pos % 4] for pos in range(400)}
+        for pos, key in keys.items():
+            index.insert(pos, key)
+        for pos in range(242): # the entry of that record, not another one of its key
+            index.delete(keys.pop(pos), pos)
+        for key in self.VALUES:
+            self.assertEqual(sorted(index.search(key)), [pos for pos, k in keys.items() if k == key])
+
+    def count(self, condition):
+        result, message = execute_sql(f"SELECT * FROM test_hash_index WHERE {condition};")
+        self.assertIsNotNone(result, message)
+        return len(result["records"])
+
+    def test_sql_delete(self):
+        execute_sql("CREATE TABLE test_hash_index (id INT PRIMARY KEY INDEX BTREE, d VARCHAR(4) INDEX HASH);")
+        for i in range(1, 401):
+            execute_sql(f"INSERT INTO test_hash_index VALUES ({i}, '{self.VALUES[i % 4]}');")
+        execute_sql("DELETE FROM test_hash_index WHERE id <= 241;")
+        self.assertEqual(self.count("d = 'y'"), sum(1 for i in range(242, 401) if i % 4 == 2))
+        execute_sql("DELETE FROM test_hash_index WHERE d <> 'y';")
+        self.assertEqual(self.count("d = 'y'"), 40)
+        self.assertEqual(self.count("id >= 1"), 40)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+import os, sys, shutil, struct
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+from core.schema import Column, TableSchema, DataType, IndexType
+from indexes.bplustree import BPlusTree, BPlusFile, NodeBPlus
+from indexes.avltree import AVLTree
+from core import utils, stats
+
+class TestIndexScan(unittest.TestCase):
+    KEYS = [5, 1, 9, 3, 7, 3, 8, 2, 6, 4, 3, 0]
+    PAGE_SIZE = 40 # 3 INT entries per node, so the few keys of a test go through many splits
+
+    def setUp(self):
+        self.path = os.path.join(utils.DATA_DIR, "test_index_scan")
+        shutil.rmtree(self.path, ignore_errors=True)
+        btree = Column("k", data_type=DataType.INT, index_type=IndexType.BTREE)
+        self.btree = BPlusTree(TableSchema("test_index_scan", [btree]), btree, page_size=self.PAGE_SIZE)
+        avl = Column("k", data_type=DataType.INT, index_type=IndexType.AVL)
+        self.avl = AVLTree(TableSchema("test_index_scan", [avl]), avl)
+        for pos, key in enumerate(self.KEYS):
+            self.btree.insert(pos, key)
+            if key not in self.KEYS[:pos]: # AVL keys are unique
+                self.avl.insert(pos, key)
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def keys(self, positions):
+        return [self.KEYS[pos] for pos in positions]
+
+    def test_bounds(self):
+        self.assertEqual(self.keys(self.btree.scan(3, 7, lo_inclusive=False)), [4, 5, 6, 7])
+        self.assertEqual(self.keys(self.btree.scan(3, 7, hi_inclusive=False)), [3, 3, 3, 4, 5, 6])
+        self.assertEqual(self.keys(self.avl.scan(3, 7, hi_inclusive=False)), [3, 4, 5, 6])
+        for index in [self.btree, self.avl]:
+            self.assertEqual(self.keys(index.scan(hi=2)), [0, 1, 2])
+            self.assertEqual(self.keys(index.scan(8)), [8, 9])
+            self.assertEqual(list(index.scan(10)), [])
+        # every duplicate is found, also across leaf splits
+        self.assertEqual(sorted(self.btree.search(3)), [3, 5, 10])
+
+    def test_direction_and_limit(self):
+        for index in [self.btree, self.avl]:
+            self.assertEqual(self.keys(index.scan(reverse=True, limit=3)), [9, 8, 7])
+            self.assertEqual(self.keys(index.scan(2, 6, hi_inclusive=False, reverse=True, limit=2)), [5, 4])
+            self.assertEqual(self.keys(index.scan(limit=2)), [0, 1])
+            self.assertEqual(list(index.scan(limit=0)), [])
+        self.assertEqual(self.keys(self.btree.scan(2, 4, reverse=True)), [4, 3, 3, 3, 2])
+
+    def test_many_duplicates(self):
+        # runs of equal keys spanning many leaf and internal splits stay in leaf chain order
+        btree = Column("d", data_type=DataType.INT, index_type=IndexType.BTREE)
+        index = BPlusTree(TableSchema("test_index_scan", [btree]), btree, page_size=self.PAGE_SIZE)
+        keys = [(pos * 7) % 5 for pos in range(400)]
+        for pos, key in enumerate(keys):
+            index.insert(pos, key)
+        for key in range(5):
+            self.assertEqual(sorted(index.scan(key, key)), [pos for pos, k in enumerate(keys) if k == key])
+        self.assertEqual([keys[pos] for pos in index.scan()], sorted(keys))
+
+    def test_page_sized_nodes(self):
+        self.assertEqual(self.btree.BLOCK_FACTOR, 3)
+        schema = TableSchema("test_index_scan", [Column("p", data_type=DataType.INT, index_type=IndexType.BTREE)])
+        index = BPlusTree(schema, schema.columns[0])
+        self.assertTrue(4096 - 8 < index.indexFile.NODE_SIZE <= 4096) # as many 8 byte entries as fit in a page
+        for pos in range(2000):
+            index.insert(pos, (pos * 37) % 2000)
+        stats.reset_counters()
+        self.assertEqual(index.search(1234), [pos for pos in range(2000) if (pos * 37) % 2000 == 1234])
+        self.assertLessEqual(stats.get_counts()["reads"], 2) # the leaf and maybe the next one (the root is in memory), not ~10 levels of 3 keys
+        # the block factor is read back from the header, files without one keep 3 entries per node
+        self.assertEqual(BPlusTree(schema, schema.columns[0], page_size=8192).BLOCK_FACTOR, index.BLOCK_FACTOR)
+        legacy = Column("l", data_type=DataType.INT, index_type=IndexType.BTREE)
+        with open(utils.get_index_file_path("test_index_scan", "l", IndexType.BTREE), "wb") as file:
+            file.write(struct.pack("i", -1))
+        index = BPlusTree(TableSchema("test_index_scan", [legacy]), legacy)
+        self.assertEqual(index.BLOCK_FACTOR, 3)
+        for pos, key in enumerate(self.KEYS):
+            index.insert(pos, key)
+        self.assertEqual(self.keys(BPlusTree(TableSchema("test_index_scan", [legacy]), legacy).scan()), sorted(self.KEYS))
+
+    def test_pinned_metadata(self):
+        schema = TableSchema("test_index_scan", [Column("m", data_type=DataType.INT, index_type=IndexType.BTREE)])
+        index, other = BPlusTree(schema, schema.columns[0]), BPlusTree(schema, schema.columns[0])
+        for pos in range(3000):
+            index.insert(pos, pos % 1000)
+        stats.reset_counters()
+        self.assertEqual(sorted(other.search(7)), [7, 1007, 2007]) # the header and root written by the other tree
+        self.assertEqual(stats.get_counts()["reads"], 1) # only the leaf, the header and root are in memory
+        other.insert(3000, 7)
+        self.assertEqual(sorted(index.search(7)), [7, 1007, 2007, 3000])
+        index.clear()
+        self.assertEqual(list(BPlusTree(schema, schema.columns[0]).scan()), [])
+
+    def test_reverse_links(self):
+        schema = TableSchema("test_index_scan", [Column("r", data_type=DataType.INT, index_type=IndexType.BTREE)])
+        index = BPlusTree(schema, schema.columns[0])
+        for pos in range(3000):
+            index.insert(pos, pos)
+        stats.reset_counters()
+        self.assertEqual(list(index.scan(hi=2500, hi_inclusive=False, reverse=True, limit=5)), [2499, 2498, 2497, 2496, 2495])
+        self.assertEqual(stats.get_counts()["reads"], 1) # latest N only touch the last leaves
+        # a file of leaves linked forward only gets the prev links when opened
+        file = self.btree.indexFile
+        nodes = [file.readBucket(pos) for pos in range(file.nodeCount())]
+        with open(file.filename, "wb") as out:
+            out.write(struct.pack(BPlusFile.HEADER_FORMAT, BPlusFile.NO_PREV_LINK_MAGIC, file.getHeader(), file.block_factor, file.readInt(file.FREE_OFFSET)))
+            for node in nodes:
+                keys, pointers, _ = node.entries()
+                out.write(NodeBPlus(node.column, keys, pointers, node.isLeaf, node.size, node.nextNode, block_factor=node.BLOCK_FACTOR, prev_link=False).pack())
+        index = BPlusTree(TableSchema("test_index_scan", [self.btree.column]), self.btree.column)
+        self.assertTrue(index.indexFile.prev_link)
+        self.assertEqual(self.keys(index.scan(2, 8, lo_inclusive=False, reverse=True)), [8, 7, 6, 5, 4, 3, 3, 3])
+        self.assertEqual(self.keys(index.scan(reverse=True)), sorted(self.KEYS, reverse=True))
+
+    def test_legacy_duplicates(self):
+        # as the original code left five equal keys: the leaf split off last (3) is in the tree after the
+        # second one (1) but in the chain between it and the first (0)
+        column = Column("g", data_type=DataType.INT, index_type=IndexType.BTREE)
+        nodes = [([0], [0], True, 3), ([0, 0], [1, 2], True, -1), ([0, 0], [0, 1, 3], False, -1), ([0, 0], [3, 4], True, 1)]
+        with open(utils.get_index_file_path("test_index_scan", "g", IndexType.BTREE), "wb") as file:
+            file.write(struct.pack("i", 2))
+            for keys, pointers, isLeaf, nextNode in nodes:
+                file.write(NodeBPlus(column, keys, pointers, isLeaf, len(keys), nextNode, prev_link=False).pack())
+        index = BPlusTree(TableSchema("test_index_scan", [column]), column)
+        self.assertEqual(sorted(index.scan()), [0, 1, 2, 3, 4])
+        # the tree is rebuilt from the chain, so merges on delete keep every leaf linked
+        for pos in [0, 1]:
+            self.assertTrue(index.delete(0, pos))
+        self.assertEqual(sorted(index.scan()), [2, 3, 4])
+        self.assertEqual(sorted(index.scan(reverse=True)), [2, 3, 4])
+        self.assertEqual(sorted(BPlusTree(TableSchema("test_index_scan", [column]), column).search(0)), [2, 3, 4])
+
+    def test_bulk_load(self):
+        column = Column("b", data_type=DataType.INT, index_type=IndexType.BTREE)
+        index = BPlusTree(TableSchema("test_index_scan", [column]), column, page_size=self.PAGE_SIZE)
+        keys = [(pos * 11) % 97 for pos in range(500)]
+        index.bulk_load(sorted(((key, pos, b"") for pos, key in enumerate(keys)), key=lambda entry: entry[0]))
+        self.assertEqual([keys[pos] for pos in index.scan()], sorted(keys))
+        self.assertEqual(sorted(index.search(42)), [pos for pos, key in enumerate(keys) if key == 42])
+        self.assertEqual([keys[pos] for pos in index.scan(90, reverse=True, limit=4)], [96] * 4)
+        # the packed nodes leave room for inserts, which still split them as usual
+        for pos in range(500, 600):
+            keys.append(pos % 97)
+            index.insert(pos, pos % 97)
+        self.assertEqual([keys[pos] for pos in index.scan()], sorted(keys))
+        self.assertEqual(sorted(index.search(42)), [pos for pos, key in enumerate(keys) if key == 42])
+        with self.assertRaises(Exception):
+            index.bulk_load([(1, 0, b"")])
+
+    def test_delete(self):
+        column = Column("x", data_type=DataType.INT, index_type=IndexType.BTREE)
+        index = BPlusTree(TableSchema("test_index_scan", [column]), column, page_size=self.PAGE_SIZE)
+        keys = {pos: (pos * 7) % 13 for pos in range(300)}
+        for pos, key in keys.items():
+            index.insert(pos, key)
+        nodes = index.indexFile.nodeCount()
+        for pos in range(0, 300, 3): # the entry of that record, not another one of its key
+            self.assertTrue(index.delete(keys.pop(pos), pos))
+        self.assertFalse(index.delete(5, 0))
+        self.assertEqual([keys[pos] for pos in index.scan()], sorted(keys.values()))
+        self.assertEqual(sorted(index.search(4)), [pos for pos, key in keys.items() if key == 4])
+        for pos, key in list(keys.items()):
+            index.delete(key, pos)
+        self.assertEqual(list(index.scan()), [])
+        # every node went to the free list, new ones reuse them
+        for pos in range(40):
+            index.insert(pos, pos)
+        self.assertEqual(index.indexFile.nodeCount(), nodes)
+        self.assertEqual(list(index.scan()), list(range(40)))
+
+    def test_posting_lists(self):
+        column = Column("c", data_type=DataType.INT, index_type=IndexType.BTREE)
+        index = BPlusTree(TableSchema("test_index_scan", [column]), column)
+        keys = {pos: pos % 3 if pos % 100 else pos for pos in range(12000)} # 3 hot keys and a few unique ones
+        for pos, key in keys.items():
+            index.insert(pos, key)
+        self.assertEqual(index.indexFile.nodeCount(), 1) # a hot key is one leaf entry, its positions span posting pages
+        stats.reset_counters()
+        self.assertEqual(index.search(1), [pos for pos, key in keys.items() if key == 1])
+        self.assertLessEqual(stats.get_counts()["reads"], 6) # header, leaf and the pages of the list
+        self.assertEqual([keys[pos] for pos in index.scan()], sorted(keys.values()))
+        self.assertEqual(list(index.scan(1, 2, reverse=True, limit=3)), [11999, 11996, 11993])
+        for pos in range(1, 12000, 2):
+            self.assertTrue(index.delete(keys.pop(pos), pos))
+        self.assertFalse(index.delete(2, 3))
+        self.assertEqual(index.search(2), [pos for pos, key in keys.items() if key == 2])
+        for pos, key in list(keys.items()):
+            if key == 0:
+                index.delete(key, pos)
+                del keys[pos]
+        self.assertEqual(index.search(0), [])
+        self.assertEqual(sorted(index.getAll()), sorted(keys))
+        # a bulk load builds the lists at once
+        index.clear()
+        index = BPlusTree(TableSchema("test_index_scan", [column]), column)
+        index.bulk_load(sorted(((key, pos, b"") for pos, key in keys.items()), key=lambda entry: entry[0]))
+        self.assertEqual(index.search(2), [pos for pos, key in keys.items() if key == 2])
+        self.assertEqual([keys[pos] for pos in index.scan()], sorted(keys.values()))
+
+if __name__ == "__main__":
+    unittest.main()
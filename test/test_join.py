@@ -0,0 +1,75 @@
+import os, sys, shutil, random
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+from core.schema import Column, TableSchema, DataType, IndexType
+from core.conditionschema import BinaryCondition, ConditionColumn, ConditionValue, BinaryOp
+from core.record_file import Record, RecordFile
+from core.buffer_pool import BufferPool
+from core.join import IndexNestedLoopJoin, GraceHashJoin, SortMergeJoin
+from indexes.bplustree import BPlusTree
+from core import utils
+
+class TestJoin(unittest.TestCase):
+    def setUp(self):
+        self.orders = TableSchema("test_join_orders", [
+            Column("id", data_type=DataType.INT, is_primary=True, index_type=IndexType.BTREE),
+            Column("customer", data_type=DataType.INT, index_type=IndexType.BTREE),
+            Column("total", data_type=DataType.FLOAT),
+        ])
+        self.customers = TableSchema("test_join_customers", [
+            Column("id", data_type=DataType.INT, is_primary=True, index_type=IndexType.BTREE),
+            Column("name", data_type=DataType.VARCHAR, varchar_length=8),
+        ])
+        for schema in [self.orders, self.customers]:
+            BufferPool().discard(utils.get_record_file_path(schema.table_name))
+            shutil.rmtree(os.path.join(utils.DATA_DIR, schema.table_name), ignore_errors=True)
+        rng = random.Random(5)
+        self.order_records = [Record(self.orders, [i, rng.randint(0, 120), rng.randint(0, 400) / 4]) for i in range(1500)]
+        self.customer_records = [Record(self.customers, [i, f"c{i}"]) for i in range(0, 100)]
+        rf = RecordFile(self.orders)
+        self.index = BPlusTree(self.orders, self.orders.columns[1])
+        for record in self.order_records:
+            self.index.insert(rf.append(record), record.values[1])
+        rf.flush()
+
+    def tearDown(self):
+        for schema in [self.orders, self.customers]:
+            BufferPool().discard(utils.get_record_file_path(schema.table_name))
+            shutil.rmtree(os.path.join(utils.DATA_DIR, schema.table_name), ignore_errors=True)
+
+    def expected(self, orders=None):
+        orders = orders if orders != None else self.order_records
+        return sorted((c.values[0], o.values[0]) for c in self.customer_records for o in orders if o.values[1] == c.values[0])
+
+    def test_index_nested_loop(self):
+        join = IndexNestedLoopJoin(self.orders, "customer", self.index)
+        pairs = [(c.values[0], o.values[0]) for c, o in join.join(self.customer_records, 0)]
+        self.assertEqual(sorted(pairs), self.expected())
+        # the inner condition is checked on the candidates only
+        condition = BinaryCondition(ConditionColumn("total"), BinaryOp.GT, ConditionValue(50.0))
+        join = IndexNestedLoopJoin(self.orders, "customer", self.index, condition=condition)
+        pairs = [(c.values[0], o.values[0]) for c, o in join.join(self.customer_records, 0)]
+        self.assertEqual(sorted(pairs), self.expected([o for o in self.order_records if o.values[2] > 50.0]))
+
+    def test_grace_hash(self):
+        # the orders build side doesn't fit in ~100 rows, it is partitioned and partitioned again
+        join = GraceHashJoin(self.orders, "customer", self.customers, "id", memory_budget=100 * 300)
+        self.assertEqual(join.fan_out, 2)
+        pairs = [(c.values[0], o.values[0]) for c, o in join.join(iter(self.order_records), iter(self.customer_records))]
+        self.assertEqual(sorted(pairs), self.expected())
+        self.assertEqual([name for name in os.listdir(os.path.dirname(utils.get_record_file_path(self.customers.table_name))) if name.endswith(".part")], [])
+        join = GraceHashJoin(self.customers, "id", self.orders, "customer")
+        pairs = [(c.values[0], o.values[0]) for o, c in join.join(self.customer_records, self.order_records)]
+        self.assertEqual(sorted(pairs), self.expected())
+
+    def test_sort_merge(self):
+        orders = sorted(self.order_records, key=lambda record: record.values[1])
+        pairs = [(c.values[0], o.values[0]) for c, o in SortMergeJoin(0, 1).join(self.customer_records, orders)]
+        self.assertEqual(sorted(pairs), self.expected())
+        # runs of equal keys on both sides
+        left = [Record(self.customers, [k, "x"]) for k in [1, 1, 2, 4, 4, 4]]
+        right = [Record(self.customers, [k, "y"]) for k in [0, 1, 1, 3, 4, 4, 5]]
+        self.assertEqual([(l.values[0], r.values[0]) for l, r in SortMergeJoin(0, 0).join(left, right)], [(1, 1)] * 4 + [(4, 4)] * 6)
+
+if __name__ == "__main__":
+    unittest.main()
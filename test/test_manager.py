@@ -1,8 +1,11 @@
 import os, sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import unittest
-from core.schema import Column, TableSchema, DataType, IndexType
+from unittest import mock
+from core.schema import Column, TableSchema, DataType, IndexType, SelectSchema, DeleteSchema
+from core.conditionschema import BinaryCondition, ConditionColumn, ConditionValue, BinaryOp, ConditionSchema
 from core.dbmanager import DBManager
+from indexes.bplustree import BPlusFile
 
 class TestISAMSimpleString(unittest.TestCase):
     def setUp(self):
@@ -32,5 +35,66 @@ class TestISAMSimpleString(unittest.TestCase):
         print("Search for id_str='beta':", index.search("beta"))
         print("Range search id_str='alpha'..'gamma':", index.rangeSearch("alpha", "gamma"))
 
+def cond(column, op, value):
+    return BinaryCondition(ConditionColumn(column), op, ConditionValue(value))
+
+class TestSelectLimit(unittest.TestCase):
+    ROWS = 3000
+
+    def setUp(self):
+        self.db = DBManager()
+        self.schema = TableSchema("select_limit", [
+            Column("id", data_type=DataType.INT, is_primary=True, index_type=IndexType.BTREE),
+            Column("v", data_type=DataType.INT)
+        ])
+        try:
+            self.db.drop_table(self.schema.table_name)
+        except RuntimeError:
+            pass
+        self.db.create_table(self.schema)
+        for i in range(self.ROWS):
+            self.db.insert(self.schema.table_name, [i, i % 10], ["id", "v"])
+
+    def tearDown(self):
+        self.db.drop_table(self.schema.table_name)
+
+    def select(self, condition, limit = None) -> tuple[list, int]:
+        """Rows of the query and the B+ tree nodes it read"""
+        original = BPlusFile.readBucket
+        with mock.patch.object(BPlusFile, "readBucket", autospec=True, side_effect=original) as read:
+            result = self.db.select(SelectSchema(self.schema.table_name, ConditionSchema(condition), all=True, limit=limit))
+        return result["records"], read.call_count
+
+    def test_index_scan_stops(self):
+        rows, reads = self.select(cond("id", BinaryOp.GT, 2000), 5)
+        self.assertEqual(rows, [[i, i % 10] for i in range(2001, 2006)])
+        rows, all_reads = self.select(cond("id", BinaryOp.GT, 2000))
+        self.assertEqual(len(rows), 999)
+        self.assertLess(reads, all_reads) # the leaves after the first matches are never read
+        self.assertLessEqual(reads, 2) # the root and the first leaf
+
+    def test_residual_condition(self):
+        # candidates of the index range are checked against v in batches until 5 match
+        rows, reads = self.select(BinaryCondition(cond("id", BinaryOp.GT, 2000), BinaryOp.AND, cond("v", BinaryOp.EQ, 3)), 5)
+        self.assertEqual(rows, [[i, 3] for i in range(2003, 2050, 10)])
+        self.assertLessEqual(reads, 3)
+        rows, _ = self.select(BinaryCondition(cond("id", BinaryOp.GT, 2990), BinaryOp.AND, cond("v", BinaryOp.EQ, 3)), 5)
+        self.assertEqual(rows, [[2993, 3]]) # the index scan runs out first
+
+    def test_after_deletes(self):
+        index = self.db.get_index(self.schema, "id")
+        deleted = index.search(2001)[0]
+        self.db.delete(DeleteSchema(self.schema.table_name, ConditionSchema(BinaryCondition(cond("id", BinaryOp.GT, 2000), BinaryOp.AND, cond("id", BinaryOp.LE, 2300)))))
+        rows, reads = self.select(cond("id", BinaryOp.GT, 2000), 5)
+        self.assertEqual(rows, [[i, i % 10] for i in range(2301, 2306)])
+        self.assertLessEqual(reads, 3)
+        # entries left behind, of a deleted slot and repeating a live one, are skipped
+        index.insert(deleted, 2001)
+        index.insert(index.search(2301)[0], 2302)
+        rows, _ = self.select(cond("id", BinaryOp.GT, 2000), 5)
+        self.assertEqual(sorted(rows), [[i, i % 10] for i in range(2301, 2306)])
+        rows, _ = self.select(cond("id", BinaryOp.GT, 2000))
+        self.assertEqual(len(rows), self.ROWS - 2301)
+
 if __name__ == "__main__":
     unittest.main()
@@ -5,7 +5,9 @@ root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if root_path not in sys.path:
     sys.path.append(root_path)
 
-from parser.parser import print_sql, execute_sql
+from parser.parser import print_sql, execute_sql, Parser, SelectStmt
+from parser.scanner import Scanner
+from core.schema import Aggregate, AggregateFunction
 
 class MyTestCase(unittest.TestCase):
 
@@ -17,6 +19,27 @@ class MyTestCase(unittest.TestCase):
     def test_something(self):
         self.assertEqual(True, False)  # add assertion here
 
+    def test_aggregate_names_as_columns(self):
+        # COUNT, MAX, ... are aggregates only when followed by "(", otherwise column names
+        stmt = Parser(Scanner("SELECT count, Max(max), COUNT(*) FROM kw WHERE count = 2 ORDER BY max;")).parse().stmt_list[0]
+        self.assertIsInstance(stmt, SelectStmt)
+        self.assertEqual(stmt.column_list[0], "count")
+        self.assertEqual([(item.function, item.column_name) for item in stmt.column_list[1:]], [(AggregateFunction.MAX, "max"), (AggregateFunction.COUNT, None)])
+        execute_sql("DROP TABLE IF EXISTS kw;")
+        try:
+            _, message = execute_sql("CREATE TABLE kw (id INT PRIMARY KEY, count INT, max FLOAT);")
+            self.assertEqual(message, "Table created successfully")
+            for i in range(6):
+                execute_sql(f"INSERT INTO kw VALUES ({i}, {i % 3}, {i / 2});")
+            result, message = execute_sql("SELECT count, max FROM kw WHERE count = 2;")
+            self.assertIsNotNone(result, message)
+            self.assertEqual(sorted(result["records"]), [[2, 1.0], [2, 2.5]])
+            result, message = execute_sql("SELECT COUNT(*), MAX(max) FROM kw WHERE count = 2;")
+            self.assertIsNotNone(result, message)
+            self.assertEqual(list(result["records"][0]), [2, 2.5])
+        finally:
+            execute_sql("DROP TABLE IF EXISTS kw;")
+
 
 if __name__ == '__main__':
 
@@ -0,0 +1,101 @@
+import os, sys, shutil
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+from core.schema import Column, TableSchema, DataType, IndexType
+from core.conditionschema import BinaryCondition, BetweenCondition, ConditionColumn, ConditionValue, BinaryOp
+from core.record_file import Record, RecordFile
+from core.buffer_pool import BufferPool
+from core.planner import Planner, AccessPath, JoinPlanner, JoinMethod
+from core import statistics, utils
+
+def cond(column, op, value):
+    return BinaryCondition(ConditionColumn(column), op, ConditionValue(value))
+
+class TestPlanner(unittest.TestCase):
+    def setUp(self):
+        self.schema = TableSchema("test_planner", [
+            Column("id", data_type=DataType.INT, is_primary=True, index_type=IndexType.BTREE),
+            Column("grade", data_type=DataType.INT, index_type=IndexType.BTREE),
+            Column("name", data_type=DataType.VARCHAR, varchar_length=8),
+        ])
+        self.path = os.path.join(utils.DATA_DIR, self.schema.table_name)
+        BufferPool().discard(utils.get_record_file_path(self.schema.table_name))
+        shutil.rmtree(self.path, ignore_errors=True)
+        rf = RecordFile(self.schema)
+        for i in range(5000):
+            rf.append(Record(self.schema, [i, 7 if i % 10 else i % 100, f"n{i % 20}"]))
+
+    def tearDown(self):
+        BufferPool().discard(utils.get_record_file_path(self.schema.table_name))
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_statistics(self):
+        stats = statistics.analyze(self.schema)
+        self.assertEqual(stats.row_count, 5000)
+        self.assertEqual(stats.columns["id"].distinct, 5000)
+        self.assertEqual((stats.columns["id"].min, stats.columns["id"].max), (0, 4999))
+        self.assertEqual(stats.columns["name"].distinct, 20)
+        self.assertAlmostEqual(stats.selectivity("id", BinaryOp.LT, 1000), 0.2, delta=0.02)
+        self.assertAlmostEqual(stats.range_selectivity("id", 1000, 1999), 0.2, delta=0.02)
+        # 90% of the rows have grade 7, the histogram shows it
+        self.assertGreater(stats.selectivity("grade", BinaryOp.EQ, 7), 0.8)
+        self.assertEqual(stats.selectivity("grade", BinaryOp.EQ, 1000), 0.0)
+
+    def test_access_paths(self):
+        planner = Planner(self.schema)
+        wide, narrow = cond("id", BinaryOp.GE, 10), cond("id", BinaryOp.EQ, 10)
+        planner.plan(BinaryCondition(wide, BinaryOp.AND, narrow))
+        # without statistics indexes are always used
+        self.assertEqual(planner.paths[id(wide)], AccessPath.INDEX_RANGE)
+        self.assertEqual(planner.paths[id(narrow)], AccessPath.INDEX_LOOKUP)
+        self.schema.statistics = statistics.analyze(self.schema)
+        planner = Planner(self.schema)
+        between = BetweenCondition(ConditionColumn("id"), ConditionValue(100), ConditionValue(110))
+        condition = BinaryCondition(between, BinaryOp.AND, narrow)
+        planner.plan(condition)
+        self.assertEqual(planner.paths[id(narrow)], AccessPath.INDEX_LOOKUP)
+        self.assertEqual(planner.paths[id(between)], AccessPath.INDEX_RANGE)
+        self.assertEqual(planner.order(planner.conjuncts(condition)), [narrow, between])
+        # a predicate matching most of the table is cheaper to scan, and the others then share that scan
+        planner = Planner(self.schema)
+        frequent = cond("grade", BinaryOp.EQ, 7)
+        planner.plan(BinaryCondition(frequent, BinaryOp.AND, narrow))
+        self.assertEqual(planner.paths[id(frequent)], AccessPath.SCAN)
+        self.assertEqual(planner.paths[id(narrow)], AccessPath.SCAN)
+
+    def test_index_order(self):
+        self.schema.statistics = statistics.analyze(self.schema)
+        planner = Planner(self.schema)
+        id_column, name_column = self.schema.get_column_by_name("id"), self.schema.get_column_by_name("name")
+        self.assertTrue(planner.index_order(None, id_column))
+        self.assertFalse(planner.index_order(None, name_column)) # unindexed, has to be sorted
+        # a few matches are cheaper to sort, the first rows of a frequent value are found walking the index
+        narrow = BinaryCondition(cond("name", BinaryOp.EQ, "n3"), BinaryOp.AND, cond("id", BinaryOp.EQ, 30))
+        frequent = cond("grade", BinaryOp.EQ, 7)
+        for condition in [narrow, frequent]:
+            planner.plan(condition)
+        self.assertFalse(planner.index_order(narrow, id_column))
+        self.assertTrue(planner.index_order(frequent, id_column, limit=10))
+
+    def test_join_method(self):
+        # both sides are this table, sized through its statistics
+        def choose(rows, conditions, memory_budget, columns=("id", "grade")):
+            planners = []
+            for side_rows, condition in zip(rows, conditions):
+                self.schema.statistics = statistics.TableStatistics(row_count=side_rows)
+                planner = Planner(self.schema)
+                if condition != None:
+                    planner.plan(condition)
+                planners.append(planner)
+            return JoinPlanner(planners, [self.schema.get_column_by_name(name) for name in columns], conditions, memory_budget).choose()
+        budget = 64 * 1024 * 1024
+        self.assertEqual(choose([10 ** 6, 10 ** 6], [None, None], budget), (JoinMethod.HASH, 0))
+        self.assertEqual(choose([10 ** 6, 10 ** 5], [None, None], budget), (JoinMethod.HASH, 1))
+        # a few outer rows probe the primary key index of the other side
+        self.assertEqual(choose([10 ** 7, 10 ** 5], [None, cond("name", BinaryOp.EQ, "n3")], budget), (JoinMethod.INDEX_NESTED_LOOP, 0))
+        # a build side far over the budget would be partitioned twice, both sides can be read in key order instead
+        self.assertEqual(choose([10 ** 6, 10 ** 6], [None, None], 1024 * 1024), (JoinMethod.SORT_MERGE, 1))
+        self.assertEqual(choose([10 ** 6, 10 ** 6], [None, None], 1024 * 1024, ("id", "name"))[0], JoinMethod.HASH)
+
+if __name__ == "__main__":
+    unittest.main()
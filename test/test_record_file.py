@@ -0,0 +1,104 @@
+import os, sys, shutil
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+from core.schema import Column, TableSchema, DataType, IndexType
+from core.record_file import Record, RecordFile, RecordCodec
+from core.buffer_pool import BufferPool
+from core import utils
+
+class TestRecordFile(unittest.TestCase):
+    def setUp(self):
+        self.schema = TableSchema("test_record_file", [
+            Column("id", data_type=DataType.INT, is_primary=True, index_type=IndexType.HASH),
+            Column("price", data_type=DataType.FLOAT),
+            Column("name", data_type=DataType.VARCHAR, varchar_length=12),
+        ])
+        self.path = os.path.join(utils.DATA_DIR, self.schema.table_name)
+        BufferPool().discard(utils.get_record_file_path(self.schema.table_name))
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def tearDown(self):
+        BufferPool().discard(utils.get_record_file_path(self.schema.table_name))
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_append_read_delete(self):
+        rf = RecordFile(self.schema)
+        for i in range(50):
+            self.assertEqual(rf.append(Record(self.schema, [i, i * 1.5, f"name{i}"])), i)
+        self.assertEqual(rf.max_id(), 50)
+        self.assertEqual(rf.read(7).values, [7, 10.5, "name7"])
+        rf.delete(7)
+        self.assertIsNone(rf.read(7))
+        # the free slot is reused by the next append
+        self.assertEqual(rf.append(Record(self.schema, [99, 0.25, "reused"])), 7)
+        self.assertEqual(rf.read(7).values, [99, 0.25, "reused"])
+
+    def test_read_many(self):
+        rf = RecordFile(self.schema)
+        for i in range(1000):
+            rf.append(Record(self.schema, [i, 0.5, f"r{i}"]))
+        rf.delete(500)
+        wanted = [999, 3, 500, 4, 5, 3, 700]
+        records = rf.read_many(wanted)
+        self.assertEqual(list(records.keys()), [3, 4, 5, 700, 999])
+        self.assertEqual([r.values[0] for r in records.values()], [3, 4, 5, 700, 999])
+        self.assertEqual(len(rf.read_many(range(1000))), 999)
+        with self.assertRaises(Exception):
+            rf.read_many([1000])
+
+    def test_mmap_mode(self):
+        rf = RecordFile(self.schema)
+        for i in range(100):
+            rf.append(Record(self.schema, [i, 2.0, f"m{i}"]))
+        mapped = RecordFile(self.schema, use_mmap=True)
+        self.assertEqual(mapped.read(42).values, [42, 2.0, "m42"])
+        # appends past the end of the mapping are visible through a larger mapping
+        for i in range(100, 3000):
+            mapped.append(Record(self.schema, [i, 2.0, f"m{i}"]))
+        mapped.delete(1500)
+        scanned = [pos for pos, _ in mapped.scan()]
+        self.assertEqual(len(scanned), 2999)
+        self.assertNotIn(1500, scanned)
+        self.assertEqual(rf.read(2999).values, [2999, 2.0, "m2999"])
+        self.assertEqual([pos for pos, _ in mapped.scan(2990)], list(range(2990, 3000)))
+
+    def test_flush_and_reopen(self):
+        rf = RecordFile(self.schema)
+        for i in range(300):
+            rf.append(Record(self.schema, [i, float(i), f"n{i}"]))
+        rf.delete(10)
+        rf.close()
+        rf = RecordFile(self.schema)
+        self.assertEqual(rf.max_id(), 300)
+        self.assertIsNone(rf.read(10))
+        self.assertEqual(rf.read(299).values, [299, 299.0, "n299"])
+        self.assertEqual(os.path.getsize(rf.filename), RecordFile.HEADER_SIZE + 300 * rf.node_size)
+
+    def test_codec(self):
+        codec = RecordCodec.get(self.schema)
+        self.assertIs(RecordCodec.get(self.schema), codec)
+        # an equal schema loaded again shares the codec
+        copy = TableSchema(self.schema.table_name, list(self.schema.columns))
+        self.assertIs(RecordCodec.get(copy), codec)
+        rows = [[i, i / 3, f"c{i}"] for i in range(5)]
+        buffer = b"".join(codec.pack(row) for row in rows)
+        offsets = [i * codec.size for i in range(5)]
+        self.assertEqual(codec.unpack_many(buffer, offsets), [[i, round(i / 3, 6), f"c{i}"] for i in range(5)])
+        self.assertEqual(Record.unpack(self.schema, codec.pack(rows[2])).values, [2, round(2 / 3, 6), "c2"])
+
+    def test_small_pool_evicts_dirty_pages(self):
+        pool = BufferPool()
+        budget = pool.memory_budget
+        pool.resize(2 * BufferPool.PAGE_SIZE)
+        try:
+            rf = RecordFile(self.schema)
+            for i in range(500):
+                rf.append(Record(self.schema, [i, 1.0, "x"]))
+            for i in range(500):
+                self.assertEqual(rf.read(i).values[0], i)
+            self.assertLessEqual(len(pool.pages), 2)
+        finally:
+            pool.resize(budget)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+from core.schema import Column, TableSchema, DataType, IndexType
+from core.conditionschema import BinaryCondition, BetweenCondition, NotCondition, ConditionColumn, ConditionValue, BinaryOp, RangeCondition, InCondition, ConstantCondition
+from core.rewriter import Rewriter
+
+def cond(column, op, value):
+    return BinaryCondition(ConditionColumn(column), op, ConditionValue(value))
+
+def AND(left, right):
+    return BinaryCondition(left, BinaryOp.AND, right)
+
+def OR(left, right):
+    return BinaryCondition(left, BinaryOp.OR, right)
+
+class TestRewriter(unittest.TestCase):
+    def setUp(self):
+        self.rewriter = Rewriter(TableSchema("test_rewriter", [
+            Column("id", data_type=DataType.INT, is_primary=True, index_type=IndexType.BTREE),
+            Column("price", data_type=DataType.FLOAT),
+            Column("name", data_type=DataType.VARCHAR, varchar_length=8),
+        ]))
+
+    def test_not_pushdown(self):
+        result = self.rewriter.rewrite(NotCondition(cond("id", BinaryOp.LT, 5)))
+        self.assertEqual((type(result), result.op, result.right.value), (BinaryCondition, BinaryOp.GE, 5))
+        # De Morgan, then the NOT of each comparison
+        result = self.rewriter.rewrite(NotCondition(OR(cond("id", BinaryOp.EQ, 1), cond("price", BinaryOp.GT, 2.0))))
+        self.assertEqual(result.op, BinaryOp.AND)
+        self.assertEqual((result.left.op, result.right.op), (BinaryOp.NEQ, BinaryOp.LE))
+        result = self.rewriter.rewrite(NotCondition(BetweenCondition(ConditionColumn("id"), ConditionValue(3), ConditionValue(9))))
+        self.assertEqual((result.op, result.left.op, result.right.op), (BinaryOp.OR, BinaryOp.LT, BinaryOp.GT))
+        # unknown columns are left for select_condition to report
+        self.assertEqual(type(self.rewriter.rewrite(NotCondition(cond("missing", BinaryOp.LT, 5)))), NotCondition)
+
+    def test_range_merging(self):
+        result = self.rewriter.rewrite(AND(AND(cond("id", BinaryOp.GT, 5), cond("name", BinaryOp.EQ, "x")), AND(cond("id", BinaryOp.LT, 10), cond("id", BinaryOp.GE, 7))))
+        self.assertEqual(type(result.left), RangeCondition)
+        merged = result.left
+        self.assertEqual((merged.lo.value, merged.lo_inclusive, merged.hi.value, merged.hi_inclusive), (7, True, 10, False))
+        self.assertEqual(result.right.right.value, "x")
+        result = self.rewriter.rewrite(AND(cond("id", BinaryOp.GE, 4), cond("id", BinaryOp.LE, 4)))
+        self.assertEqual((type(result), result.op, result.right.value), (BinaryCondition, BinaryOp.EQ, 4))
+        # a <> outside of the range is dropped
+        result = self.rewriter.rewrite(AND(cond("id", BinaryOp.EQ, 4), cond("id", BinaryOp.NEQ, 8)))
+        self.assertEqual((result.op, result.right.value), (BinaryOp.EQ, 4))
+
+    def test_contradictions(self):
+        for condition in [
+            AND(cond("id", BinaryOp.GT, 5), cond("id", BinaryOp.LT, 3)),
+            AND(cond("id", BinaryOp.GT, 5), cond("id", BinaryOp.LT, 5)),
+            AND(cond("id", BinaryOp.EQ, 5), cond("id", BinaryOp.NEQ, 5)),
+            AND(cond("name", BinaryOp.EQ, "a"), cond("name", BinaryOp.EQ, "b")),
+        ]:
+            result = self.rewriter.rewrite(condition)
+            self.assertEqual((type(result), result.value), (ConstantCondition, False))
+        result = self.rewriter.rewrite(OR(AND(cond("id", BinaryOp.GT, 5), cond("id", BinaryOp.LT, 3)), cond("id", BinaryOp.EQ, 1)))
+        self.assertEqual((result.op, result.right.value), (BinaryOp.EQ, 1))
+
+    def test_in_lists(self):
+        result = self.rewriter.rewrite(OR(OR(cond("id", BinaryOp.EQ, 1), cond("price", BinaryOp.GT, 2.0)), OR(cond("id", BinaryOp.EQ, 7), cond("id", BinaryOp.EQ, 1))))
+        self.assertEqual(type(result.left), InCondition)
+        self.assertEqual([value.value for value in result.left.values], [1, 7])
+        self.assertEqual(result.right.op, BinaryOp.GT)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os, sys, shutil
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+from core.schema import Column, TableSchema, DataType, IndexType
+from core.conditionschema import BinaryCondition, BetweenCondition, NotCondition, BooleanColumn, ConditionColumn, ConditionValue, BinaryOp
+from core.record_file import Record, RecordFile
+from core.buffer_pool import BufferPool
+from core.scan import VectorScan
+from core import utils
+
+def cond(column, op, value):
+    return BinaryCondition(ConditionColumn(column), op, ConditionValue(value))
+
+class TestVectorScan(unittest.TestCase):
+    def setUp(self):
+        self.schema = TableSchema("test_scan", [
+            Column("id", data_type=DataType.INT, is_primary=True, index_type=IndexType.HASH),
+            Column("flag", data_type=DataType.BOOL),
+            Column("price", data_type=DataType.FLOAT),
+            Column("name", data_type=DataType.VARCHAR, varchar_length=10),
+            Column("location", data_type=DataType.POINT),
+        ])
+        self.path = os.path.join(utils.DATA_DIR, self.schema.table_name)
+        BufferPool().discard(utils.get_record_file_path(self.schema.table_name))
+        shutil.rmtree(self.path, ignore_errors=True)
+        rf = RecordFile(self.schema)
+        self.rows = {}
+        for i in range(2000):
+            values = [i, i % 3 == 0, i * 0.1, f"n{i % 50}", (float(i % 7), float(i % 11))]
+            rf.append(Record(self.schema, values))
+            self.rows[i] = rf.read(i).values
+        for i in range(0, 2000, 9):
+            rf.delete(i)
+            del self.rows[i]
+
+    def tearDown(self):
+        BufferPool().discard(utils.get_record_file_path(self.schema.table_name))
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def check(self, condition, predicate):
+        expected = [pos for pos, values in self.rows.items() if predicate(values)]
+        self.assertEqual(VectorScan(self.schema).filter(condition), expected)
+
+    def test_comparisons(self):
+        self.check(cond("id", BinaryOp.LT, 100), lambda v: v[0] < 100)
+        self.check(cond("price", BinaryOp.EQ, 12.3), lambda v: v[2] == 12.3)
+        self.check(cond("price", BinaryOp.GE, 50.5), lambda v: v[2] >= 50.5)
+        self.check(cond("name", BinaryOp.EQ, "n7"), lambda v: v[3] == "n7")
+        self.check(cond("name", BinaryOp.GT, "n3"), lambda v: v[3] > "n3")
+        self.check(cond("location", BinaryOp.EQ, (3.0, 4.0)), lambda v: v[4] == (3.0, 4.0))
+        self.check(BooleanColumn("flag"), lambda v: v[1])
+
+    def test_condition_trees(self):
+        tree = BinaryCondition(
+            BinaryCondition(cond("id", BinaryOp.GT, 500), BinaryOp.AND, cond("name", BinaryOp.NEQ, "n1")),
+            BinaryOp.OR,
+            NotCondition(BetweenCondition(ConditionColumn("price"), ConditionValue(1.0), ConditionValue(199.0))))
+        self.check(tree, lambda v: (v[0] > 500 and v[3] != "n1") or not (1.0 <= v[2] <= 199.0))
+
+    def test_filter_many(self):
+        conditions = [cond("id", BinaryOp.LE, 30), cond("name", BinaryOp.EQ, "n3"), NotCondition(BooleanColumn("flag"))]
+        expected = [
+            [pos for pos, v in self.rows.items() if v[0] <= 30],
+            [pos for pos, v in self.rows.items() if v[3] == "n3"],
+            [pos for pos, v in self.rows.items() if not v[1]],
+        ]
+        self.assertEqual(VectorScan(self.schema).filter_many(conditions), expected)
+        # with a limit each condition keeps its first matches
+        self.assertEqual(VectorScan(self.schema).filter_many(conditions, 5), [positions[:5] for positions in expected])
+        self.assertEqual(VectorScan(self.schema).filter(cond("id", BinaryOp.GT, 1990), 100), [pos for pos in self.rows if pos > 1990])
+
+    def test_count_and_aggregate(self):
+        scan = VectorScan(self.schema)
+        condition = cond("id", BinaryOp.LT, 1000)
+        matching = [v for v in self.rows.values() if v[0] < 1000]
+        self.assertEqual(scan.count(), len(self.rows))
+        self.assertEqual(scan.count(condition), len(matching))
+        self.assertEqual(scan.count(positions=list(range(0, 30))), len([pos for pos in self.rows if pos < 30]))
+        totals = scan.aggregate(["id", "price", "name"], condition)
+        count, total, low, high = totals["id"]
+        self.assertEqual((count, total, low, high), (len(matching), sum(v[0] for v in matching), 1, 998)) # 0 and 999 are deleted
+        self.assertAlmostEqual(totals["price"][1], sum(v[2] for v in matching), places=2)
+        self.assertEqual(totals["price"][2:], [min(v[2] for v in matching), max(v[2] for v in matching)])
+        self.assertEqual(totals["name"][2:], [min(v[3] for v in matching), max(v[3] for v in matching)])
+        self.assertEqual(scan.aggregate(["id"], positions=[0, 9, 18])["id"], [0, 0, None, None]) # deleted rows
+
+if __name__ == "__main__":
+    unittest.main()